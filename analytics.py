@@ -0,0 +1,314 @@
+"""Vectorized sales analytics over a columnar copy of the store.
+
+Orders, OrderDetails, Games, their genres and Users are streamed out of MySQL in chunks into NumPy
+column arrays, with times, dates and money encoded as integers. Each report is then a handful of
+vectorized group-bys (bincount, sorting and ufunc.at) over whole columns instead of a query per group.
+The columns can be saved to an .npz file so later runs skip the export.
+
+NumPy is only needed here, so it is an optional dependency: pip install numpy
+
+    python analytics.py --save store.npz
+    python analytics.py --load store.npz --only cohorts genre_share --output report.json
+"""
+
+from connection import connect_to_mysql
+import argparse
+import json
+import sys
+import time
+import logging
+
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+logger = logging.getLogger(__name__)
+
+# Each exported table's query and the names of the integer columns it returns. Order times are seconds
+# since the epoch, birth dates are days since the epoch, money is in cents and a missing user is -1.
+EXPORTS = {
+    'orders': ("""SELECT order_id, COALESCE(user_fk, -1), UNIX_TIMESTAMP(order_date),
+                      CAST(ROUND(COALESCE(total_cost, 0) * 100) AS SIGNED)
+                  FROM Orders;""", ['order_id', 'user_id', 'order_time', 'total_cents']),
+    'details': ("SELECT order_fk, game_fk, COALESCE(quantity, 0) FROM OrderDetails;", ['order_id', 'game_id', 'quantity']),
+    'games': ("""SELECT game_id, CAST(ROUND(price * 100) AS SIGNED),
+                     CAST(ROUND(price * (1 - COALESCE(discount_percent, 0)) * 100) AS SIGNED)
+                 FROM Games;""", ['game_id', 'price_cents', 'sale_cents']),
+    'users': ("SELECT user_id, DATEDIFF(date_of_birth, '1970-01-01') FROM Users;", ['user_id', 'birth_day']),
+}
+
+# Lower bounds of the price buckets, in dollars, for the price elasticity report.
+PRICE_BUCKETS = [0, 0.01, 5, 10, 20, 30, 40, 60]
+
+# Lower bounds of the buyer age brackets for the age bracket revenue report.
+AGE_BRACKETS = [0, 13, 18, 25, 35, 45, 55, 65]
+
+def main():
+    parser = argparse.ArgumentParser(description="Run vectorized sales analytics over the p1 database.")
+    parser.add_argument('--load', help="read the columns from this .npz file instead of the database")
+    parser.add_argument('--save', help="save the exported columns to this .npz file")
+    parser.add_argument('--chunk-size', type=int, default=100000, help="rows fetched per chunk while exporting")
+    parser.add_argument('--only', nargs='*', help="names of the reports to run, default all")
+    parser.add_argument('--output', help="file to write the JSON report to, default stdout")
+    args = parser.parse_args()
+
+    if np is None:
+        sys.exit("analytics.py needs NumPy. Install it with: pip install numpy")
+
+    start = time.perf_counter()
+    if args.load:
+        store = StoreColumns.load(args.load)
+    else:
+        cnx = connect_to_mysql()
+        if cnx is None:
+            sys.exit("Could not connect to the p1 database.")
+        store = StoreColumns.export(cnx, args.chunk_size)
+        cnx.close()
+    load_ms = (time.perf_counter() - start) * 1000
+    if args.save:
+        store.save(args.save)
+
+    report = run_analytics(store, args.only)
+    report['meta']['load_ms'] = round(load_ms, 3)
+    if args.output:
+        with open(args.output, 'w') as outfile:
+            json.dump(report, outfile, indent=2)
+    else:
+        print(json.dumps(report, indent=2))
+
+def dense_index(ids):
+    """Returns an array mapping each id to its position in ids, and to -1 for ids not in it."""
+    index = np.full(int(ids.max()) + 1 if len(ids) else 1, -1, dtype=np.int64)
+    index[ids] = np.arange(len(ids))
+    return index
+
+def lookup(index, ids):
+    """Returns the positions of ids through a dense_index, with -1 for ids that are negative or unknown."""
+    known = (ids >= 0) & (ids < len(index))
+    positions = np.full(len(ids), -1, dtype=np.int64)
+    positions[known] = index[ids[known]]
+    return positions
+
+def distinct(values):
+    """Returns the distinct values, sorted. A plain sort and neighbor compare, which beats np.unique on large int64 arrays."""
+    values = np.sort(values)
+    return values[np.concatenate(([True], values[1:] != values[:-1]))] if len(values) else values
+
+def month_index(seconds):
+    """Converts seconds since the epoch into months since January 1970."""
+    return seconds.astype('datetime64[s]').astype('datetime64[M]').astype(np.int64)
+
+def month_label(month):
+    return f"{1970 + month // 12}-{month % 12 + 1:02d}"
+
+class StoreColumns():
+    """The store's orders, order details, games, game genres and users as NumPy columns.
+    tables maps each table to its columns by name. genres holds the genre named by each code in game_genres.
+    """
+    def __init__(self, tables:dict[str, dict], genres:list[str]):
+        self.tables = tables
+        self.genres = genres
+        self.game_index = dense_index(tables['games']['game_id'])
+        self.user_index = dense_index(tables['users']['user_id'])
+
+        # An order with details is a game purchase, and one without is a wallet top-up.
+        orders = tables['orders']
+        order_index = dense_index(orders['order_id'])
+        self.is_sale = np.zeros(len(orders['order_id']), dtype=bool)
+        detail_orders = lookup(order_index, tables['details']['order_id'])
+        self.is_sale[detail_orders[detail_orders >= 0]] = True
+
+    def export(cnx, chunk_size=100000):
+        """Streams the store out of the database chunk_size rows at a time and returns its StoreColumns."""
+        tables = {name: StoreColumns.export_columns(cnx, query, columns, chunk_size)
+                  for name, (query, columns) in EXPORTS.items()}
+
+        with cnx.cursor() as cursor:
+            cursor.execute("SELECT genre FROM Genres ORDER BY genre;")
+            genres = [genre for (genre,) in cursor.fetchall()]
+        codes = {genre.lower(): code for code, genre in enumerate(genres)}
+        game_ids, genre_codes = [], []
+        with cnx.cursor() as cursor:
+            cursor.execute("SELECT game_fk, genre FROM Game_Genre;")
+            while True:
+                rows = cursor.fetchmany(chunk_size)
+                if not rows:
+                    break
+                for game_id, genre in rows:
+                    game_ids.append(game_id)
+                    genre_codes.append(codes[genre.lower()])
+        tables['game_genres'] = {'game_id': np.array(game_ids, dtype=np.int64), 'genre': np.array(genre_codes, dtype=np.int64)}
+        logger.info("Exported %s orders and %s order details for analytics",
+                    len(tables['orders']['order_id']), len(tables['details']['order_id']))
+        return StoreColumns(tables, genres)
+
+    def export_columns(cnx, query, columns, chunk_size=100000):
+        """Streams the integer rows of query chunk_size at a time into one int64 array per column."""
+        chunks = []
+        with cnx.cursor() as cursor:
+            cursor.execute(query)
+            while True:
+                rows = cursor.fetchmany(chunk_size)
+                if not rows:
+                    break
+                chunks.append(np.array(rows, dtype=np.int64).reshape(-1, len(columns)))
+        data = np.concatenate(chunks) if chunks else np.empty((0, len(columns)), dtype=np.int64)
+        return {column: np.ascontiguousarray(data[:, i]) for i, column in enumerate(columns)}
+
+    def save(self, path):
+        """Saves the columns to an .npz file."""
+        arrays = {f"{table}.{column}": values for table, columns in self.tables.items() for column, values in columns.items()}
+        np.savez(path, genres=np.array(self.genres, dtype=str), **arrays)
+        logger.info("Saved analytics columns to [%s]", path)
+
+    def load(path):
+        """Loads columns saved by save."""
+        with np.load(path) as data:
+            tables = {}
+            for key in data.files:
+                if key != 'genres':
+                    table, column = key.split('.', 1)
+                    tables.setdefault(table, {})[column] = data[key]
+            return StoreColumns(tables, [str(genre) for genre in data['genres']])
+
+    def game_sales(self):
+        """Returns the units sold and the revenue in cents of each game, in the order of the games table."""
+        details = self.tables['details']
+        rows = lookup(self.game_index, details['game_id'])
+        known = rows >= 0
+        rows, quantity = rows[known], details['quantity'][known]
+        n_games = len(self.tables['games']['game_id'])
+        units = np.bincount(rows, weights=quantity, minlength=n_games)
+        revenue = np.bincount(rows, weights=quantity * self.tables['games']['sale_cents'][rows], minlength=n_games)
+        return units, revenue
+
+def cohorts(store:StoreColumns):
+    """Groups buyers by the month of their first purchase, and reports for each cohort how many of its
+    buyers bought again and what they spent in each month since.
+    """
+    orders = store.tables['orders']
+    sale = store.is_sale & (orders['user_id'] >= 0)
+    users, cents = orders['user_id'][sale], orders['total_cents'][sale]
+    months = month_index(orders['order_time'][sale])
+    if len(users) == 0:
+        return {'cohorts': []}
+
+    first = np.full(int(users.max()) + 1, np.iinfo(np.int64).max, dtype=np.int64)
+    np.minimum.at(first, users, months)
+    cohort = first[users]
+    offset = months - cohort
+    first_month = int(cohort.min())
+    n_cohorts, n_offsets = int(cohort.max()) - first_month + 1, int(offset.max()) + 1
+    cells = (cohort - first_month) * n_offsets + offset
+
+    revenue = np.bincount(cells, weights=cents, minlength=n_cohorts * n_offsets).reshape(n_cohorts, n_offsets) / 100
+    # Each buyer counts once per month they bought in, however many orders they placed.
+    active_cells = distinct(users * (n_cohorts * n_offsets) + cells) % (n_cohorts * n_offsets)
+    active = np.bincount(active_cells, minlength=n_cohorts * n_offsets).reshape(n_cohorts, n_offsets)
+
+    report = []
+    for i in range(n_cohorts):
+        size = int(active[i, 0])
+        if size == 0:
+            continue
+        months_seen = n_cohorts - i
+        report.append({
+            'cohort': month_label(first_month + i),
+            'buyers': size,
+            'retention': [round(int(count) / size, 4) for count in active[i, :months_seen]],
+            'revenue': [round(float(amount), 2) for amount in revenue[i, :months_seen]]
+        })
+    return {'cohorts': report}
+
+def price_elasticity(store:StoreColumns):
+    """Estimates how units sold respond to price across the catalog, as the slope of log units against
+    log sale price over games that sold, and breaks units sold down by price bucket.
+    The Orders history records totals rather than unit prices, so this compares games at their current prices.
+    """
+    units, _ = store.game_sales()
+    price = store.tables['games']['sale_cents'] / 100
+    fit = (units > 0) & (price > 0)
+    elasticity = float(np.polyfit(np.log(price[fit]), np.log(units[fit]), 1)[0]) if fit.sum() > 1 else None
+
+    buckets = np.digitize(price, PRICE_BUCKETS) - 1
+    games = np.bincount(buckets, minlength=len(PRICE_BUCKETS))
+    sold = np.bincount(buckets, weights=units, minlength=len(PRICE_BUCKETS))
+    edges = PRICE_BUCKETS + [None]
+    return {
+        'elasticity': round(elasticity, 4) if elasticity is not None else None,
+        'games_fit': int(fit.sum()),
+        'buckets': [{'from': low, 'to': high, 'games': int(games[i]), 'units': int(sold[i]),
+                     'units_per_game': round(float(sold[i] / games[i]), 3) if games[i] else 0.0}
+                    for i, (low, high) in enumerate(zip(edges, edges[1:]))]
+    }
+
+def genre_share(store:StoreColumns):
+    """Reports each genre's share of units sold and of revenue. A game with several genres counts toward
+    each of them, so the shares can add up to more than one.
+    """
+    units, revenue = store.game_sales()
+    links = store.tables['game_genres']
+    rows = lookup(store.game_index, links['game_id'])
+    known = rows >= 0
+    genre, rows = links['genre'][known], rows[known]
+    genre_units = np.bincount(genre, weights=units[rows], minlength=len(store.genres))
+    genre_revenue = np.bincount(genre, weights=revenue[rows], minlength=len(store.genres))
+    total_units, total_revenue = max(units.sum(), 1), max(revenue.sum(), 1)
+    return {'genres': [{'genre': store.genres[i], 'units': int(genre_units[i]), 'revenue': round(float(genre_revenue[i]) / 100, 2),
+                        'unit_share': round(float(genre_units[i] / total_units), 4), 'revenue_share': round(float(genre_revenue[i] / total_revenue), 4)}
+                       for i in np.argsort(-genre_revenue) if genre_units[i]]}
+
+def age_brackets(store:StoreColumns):
+    """Reports game revenue and wallet top-up volume by the buyer's age bracket at the time of each order.
+    Ages are computed from days elapsed, so they can be off by a day around a birthday.
+    """
+    orders, users = store.tables['orders'], store.tables['users']
+    rows = lookup(store.user_index, orders['user_id'])
+    known = rows >= 0
+    # A Gregorian year averages 146097 / 400 days, so whole years stay in integer arithmetic.
+    age = (orders['order_time'][known] // 86400 - users['birth_day'][rows[known]]) * 400 // 146097
+    bracket = np.clip(np.searchsorted(AGE_BRACKETS, age, side='right') - 1, 0, len(AGE_BRACKETS) - 1)
+    sale, cents = store.is_sale[known], orders['total_cents'][known]
+
+    # Sales fill the first len(AGE_BRACKETS) cells and top-ups the rest, so each total is one bincount.
+    n = len(AGE_BRACKETS)
+    cells = bracket + n * ~sale
+    counts = np.bincount(cells, minlength=2 * n)
+    volume = np.bincount(cells, weights=cents, minlength=2 * n)
+    orders_count, top_ups = counts[:n], counts[n:]
+    revenue, top_up_volume = volume[:n], volume[n:]
+    edges = AGE_BRACKETS + [None]
+    return {'brackets': [{'bracket': f"{low}-{high - 1}" if high else f"{low}+", 'orders': int(orders_count[i]),
+                          'revenue': round(float(revenue[i]) / 100, 2), 'top_ups': int(top_ups[i]),
+                          'top_up_volume': round(float(top_up_volume[i]) / 100, 2)}
+                         for i, (low, high) in enumerate(zip(edges, edges[1:]))]}
+
+REPORTS = {
+    'cohorts': cohorts,
+    'price_elasticity': price_elasticity,
+    'genre_share': genre_share,
+    'age_brackets': age_brackets,
+}
+
+def run_analytics(store:StoreColumns, only=None):
+    """Runs each report, or those named in only, and returns their results with how long each took."""
+    report = {
+        'meta': {name: len(columns[next(iter(columns))]) for name, columns in store.tables.items()},
+        'timings_ms': {},
+        'reports': {}
+    }
+    for name, query in REPORTS.items():
+        if only and name not in only:
+            continue
+        start = time.perf_counter()
+        report['reports'][name] = query(store)
+        report['timings_ms'][name] = round((time.perf_counter() - start) * 1000, 3)
+    return report
+
+
+if __name__ == "__main__":
+    logging.basicConfig(filename="logs/p1.log",
+                level=logging.INFO,
+                format='%(asctime)s :: %(levelname)s :: %(message)s')
+    main()
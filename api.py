@@ -0,0 +1,509 @@
+"""A headless HTTP/JSON front end over the Service layer, for serving many shoppers from one process.
+
+Requests are handled on a bounded thread pool that shares one Service, and so one connection pool
+and one catalog cache. Shoppers log in for a bearer token that holds their session and cart.
+The admin logs in with the admin password for an admin token.
+
+    python api.py --port 8000 --workers 32
+
+User endpoints
+    POST   /users                  {username, password, date_of_birth}     create an account
+    POST   /login                  {username, password}                    -> {token, user}
+    POST   /admin/login            {password}                              -> {token}
+    POST   /logout
+    GET    /games                  ?sort=all|date|metacritic&after=gID&limit=&buyable=true
+    GET    /games/search           ?q=&offset=&limit=
+    GET    /games/filter           ?genre=&category=&max_rating=&max_price=&sort=&offset=&limit=
+    GET    /games/{gID}
+    GET    /games/{gID}/also-bought ?limit=                                customers also bought
+    GET    /cart
+    POST   /cart                   {game_id}
+    DELETE /cart/{gID}
+    POST   /checkout
+    GET    /inventory
+    POST   /gift                   {game_id, username}
+    GET    /wallet
+    POST   /wallet                 {amount}
+    GET    /orders                 ?after_date=&after_id=&limit=
+Admin endpoints
+    GET    /admin/users
+    PATCH  /admin/users/{username} {username}
+    DELETE /admin/users/{uID}
+    GET    /admin/users/{uID}/orders ?after_date=&after_id=&limit=
+    GET    /admin/orders           ?after_date=&after_id=&limit=
+    POST   /admin/games            {name, price, rating, description, developer, publisher, genres, categories}
+    GET    /admin/sales            ?limit=&days=
+    POST   /admin/recommendations                                          rebuild customers also bought
+    GET    /admin/query-stats
+"""
+
+from entities import (User, Game, Order, InventoryEntry)
+from service import Service
+from catalog_import import (FIELD_LENGTHS, TAG_LENGTH)
+import mysql_config as config
+from concurrent.futures import ThreadPoolExecutor
+from http.server import (HTTPServer, BaseHTTPRequestHandler)
+from urllib.parse import (urlsplit, parse_qs)
+from decimal import (Decimal, InvalidOperation)
+import datetime as dt
+import argparse
+import io
+import json
+import re
+import secrets
+import sys
+import threading
+import logging
+
+logger = logging.getLogger(__name__)
+
+ADMIN = object()
+
+class ThreadLocalStdout():
+    """Stands in for sys.stdout so the messages Service prints on one request thread can be captured
+    without mixing with other requests. Threads that are not capturing write through to the real stdout.
+    """
+    def __init__(self, stdout):
+        self.stdout = stdout
+        self.local = threading.local()
+
+    def capture(self):
+        self.local.buffer = io.StringIO()
+
+    def release(self):
+        buffer = getattr(self.local, 'buffer', None)
+        self.local.buffer = None
+        return buffer.getvalue().strip() if buffer else ""
+
+    def write(self, text):
+        buffer = getattr(self.local, 'buffer', None)
+        return (buffer or self.stdout).write(text)
+
+    def flush(self):
+        self.stdout.flush()
+
+class ApiError(Exception):
+    def __init__(self, status, message):
+        self.status = status
+        self.message = message
+
+class Session():
+    """A logged in shopper, or the admin. The lock serializes requests that share a cart."""
+    def __init__(self, user:User=None):
+        self.user = user
+        self.lock = threading.Lock()
+
+def to_json(value):
+    """Converts entities and database values into JSON-friendly values."""
+    if isinstance(value, Game):
+        return {'game_id': value.game_id, 'name': value.name, 'price': to_json(value.price), 'rating': value.rating,
+                'description': value.description, 'developer': value.developer, 'publisher': value.publisher,
+                'recommendations': value.recommendations, 'release_date': to_json(value.release_date),
+                'metacritic': value.metacritic, 'discount_percent': to_json(value.discount_percent),
+                'genres': list(value.genres), 'categories': list(value.categories)}
+    elif isinstance(value, User):
+        return {'user_id': value.user_id, 'username': value.username,
+                'date_of_birth': to_json(value.date_of_birth), 'wallet': to_json(value.wallet)}
+    elif isinstance(value, Order):
+        return {'order_id': value.order_id, 'user_id': value.user_id, 'order_date': to_json(value.order_date),
+                'total_cost': to_json(value.total_cost),
+                'lines': [{'name': name, 'quantity': quantity} for name, quantity in value.quantities_by_game or []]}
+    elif isinstance(value, InventoryEntry):
+        return {'game': to_json(value.game), 'quantity': value.quantity}
+    elif isinstance(value, Decimal):
+        return str(value)
+    elif isinstance(value, (dt.date, dt.datetime)):
+        return value.isoformat()
+    elif isinstance(value, (list, tuple)):
+        return [to_json(item) for item in value]
+    elif isinstance(value, dict):
+        return {key: to_json(item) for key, item in value.items()}
+    return value
+
+class StoreApi():
+    """Routes requests to Service calls. Each route returns a JSON-friendly value or raises ApiError."""
+    def __init__(self, service:Service, admin_password):
+        self.service = service
+        self.admin_password = admin_password
+        self.sessions = {}
+        self.sessions_lock = threading.Lock()
+        self.routes = [
+            ('POST', r"/users", self.create_user, None),
+            ('POST', r"/login", self.login, None),
+            ('POST', r"/admin/login", self.admin_login, None),
+            ('POST', r"/logout", self.logout, 'any'),
+            ('GET', r"/games", self.games, None),
+            ('GET', r"/games/search", self.search, None),
+            ('GET', r"/games/filter", self.filter, None),
+            ('GET', r"/games/(\d+)", self.game, None),
+            ('GET', r"/games/(\d+)/also-bought", self.also_bought, None),
+            ('GET', r"/cart", self.cart, 'user'),
+            ('POST', r"/cart", self.add_to_cart, 'user'),
+            ('DELETE', r"/cart/(\d+)", self.remove_from_cart, 'user'),
+            ('POST', r"/checkout", self.checkout, 'user'),
+            ('GET', r"/inventory", self.inventory, 'user'),
+            ('POST', r"/gift", self.gift, 'user'),
+            ('GET', r"/wallet", self.wallet, 'user'),
+            ('POST', r"/wallet", self.add_funds, 'user'),
+            ('GET', r"/orders", self.orders, 'user'),
+            ('GET', r"/admin/users", self.admin_users, 'admin'),
+            ('PATCH', r"/admin/users/([^/]+)", self.admin_rename_user, 'admin'),
+            ('DELETE', r"/admin/users/(\d+)", self.admin_delete_user, 'admin'),
+            ('GET', r"/admin/users/(\d+)/orders", self.admin_user_orders, 'admin'),
+            ('GET', r"/admin/orders", self.admin_orders, 'admin'),
+            ('POST', r"/admin/games", self.admin_add_game, 'admin'),
+            ('GET', r"/admin/sales", self.admin_sales, 'admin'),
+            ('POST', r"/admin/recommendations", self.admin_rebuild_recommendations, 'admin'),
+            ('GET', r"/admin/query-stats", self.admin_query_stats, 'admin'),
+        ]
+
+    def handle(self, method, path, query, body, token):
+        for route_method, pattern, handler, auth in self.routes:
+            match = re.fullmatch(pattern, path)
+            if match and route_method == method:
+                session = self.authorize(token, auth)
+                if session and session.user:
+                    with session.lock:
+                        return handler(session, query, body, *match.groups())
+                return handler(session, query, body, *match.groups())
+        raise ApiError(404, f"No route for {method} {path}")
+
+    def authorize(self, token, auth):
+        if auth is None:
+            return self.sessions.get(token)
+        session = self.sessions.get(token)
+        if session is None:
+            raise ApiError(401, "Log in first.")
+        if auth == 'admin' and session.user is not ADMIN:
+            raise ApiError(403, "Admins only.")
+        if auth == 'user' and session.user is ADMIN:
+            raise ApiError(403, "Log in as a user.")
+        return session
+
+    def new_session(self, user):
+        token = secrets.token_urlsafe(24)
+        with self.sessions_lock:
+            self.sessions[token] = Session(user)
+        return token
+
+    def require(self, body, *keys):
+        missing = [key for key in keys if body.get(key) in (None, "")]
+        if missing:
+            raise ApiError(400, "Missing " + ", ".join(missing))
+        return [body[key] for key in keys]
+
+    def page_args(self, query, default_limit=5):
+        try:
+            offset, limit = int(query.get('offset', 0)), min(int(query.get('limit', default_limit)), 100)
+        except ValueError:
+            raise ApiError(400, "offset and limit must be integers")
+        if offset < 0 or limit < 0:
+            raise ApiError(400, "offset and limit must not be negative")
+        return offset, limit
+
+    def sort_arg(self, query):
+        sort = query.get('sort', 'all')
+        if sort not in ('all', 'date', 'metacritic'):
+            raise ApiError(400, "sort must be all, date or metacritic")
+        return sort
+
+    def price_arg(self, query, key):
+        if key not in query:
+            return None
+        try:
+            price = Decimal(str(query[key]))
+        except InvalidOperation:
+            raise ApiError(400, f"{key} must be a number")
+        if not price.is_finite():
+            raise ApiError(400, f"{key} must be a number")
+        return price
+
+    def tags_arg(self, body, key):
+        tags = body.get(key, [])
+        if not isinstance(tags, list) or not all(isinstance(tag, str) and 0 < len(tag) <= TAG_LENGTH for tag in tags):
+            raise ApiError(400, f"{key} must be a list of names of 1 to {TAG_LENGTH} characters")
+        return tags
+
+    def order_cursor(self, query):
+        if 'after_date' in query and 'after_id' in query:
+            return (dt.datetime.fromisoformat(query['after_date']), int(query['after_id']))
+        return None
+
+    def failed(self, status=400, default="Request failed."):
+        raise ApiError(status, sys.stdout.release() or default)
+
+    """USERS"""
+    def create_user(self, session, query, body):
+        username, password, date_of_birth = self.require(body, 'username', 'password', 'date_of_birth')
+        if not self.service.create_user(username, password, date_of_birth):
+            self.failed()
+        return {'created': username}
+
+    def login(self, session, query, body):
+        username, password = self.require(body, 'username', 'password')
+        user = self.service.login(username, password)
+        if not user:
+            self.failed(401)
+        return {'token': self.new_session(user), 'user': user}
+
+    def admin_login(self, session, query, body):
+        if body.get('password') != self.admin_password:
+            raise ApiError(401, "Incorrect admin password.")
+        logger.info("Admin logged in over the API")
+        return {'token': self.new_session(ADMIN)}
+
+    def logout(self, session, query, body):
+        with self.sessions_lock:
+            for token, other in list(self.sessions.items()):
+                if other is session:
+                    del self.sessions[token]
+        return {'logged_out': True}
+
+    """GAMES"""
+    def games(self, session, query, body):
+        sort = self.sort_arg(query)
+        _, limit = self.page_args(query)
+        after = self.service.get_game_by_id(query['after']) if 'after' in query else None
+        games = self.service.get_games_page(sort, after, limit) or []
+        if query.get('buyable') == 'true' and session and session.user and session.user is not ADMIN:
+            games = self.service.eligible_games(session.user, games)
+        return {'games': games}
+
+    def search(self, session, query, body):
+        offset, limit = self.page_args(query)
+        total, games = self.service.search_games(query.get('q', ""), offset, limit)
+        return {'total': total, 'games': games}
+
+    def filter(self, session, query, body):
+        offset, limit = self.page_args(query)
+        result = self.service.filter_games(query.get('genre', "").split(',') if query.get('genre') else (),
+                                           query.get('category', "").split(',') if query.get('category') else (),
+                                           query.get('max_rating'), self.price_arg(query, 'max_price'),
+                                           self.sort_arg(query), offset, limit)
+        return {'total': result.total, 'games': result.games, 'facets': result.counts}
+
+    def game(self, session, query, body, game_id):
+        game = self.service.get_game_by_id(game_id)
+        if not game:
+            raise ApiError(404, "That game does not exist.")
+        return game
+
+    def also_bought(self, session, query, body, game_id):
+        if not self.service.get_game_by_id(game_id):
+            raise ApiError(404, "That game does not exist.")
+        _, limit = self.page_args(query)
+        games = self.service.get_recommendations(game_id, min(limit, 20))
+        if session and session.user and session.user is not ADMIN:
+            games = self.service.eligible_games(session.user, games)
+        return {'games': games}
+
+    """CART"""
+    def cart(self, session, query, body):
+        return {'games': session.user.cart.games, 'total': session.user.cart.total}
+
+    def add_to_cart(self, session, query, body):
+        game = self.game(session, query, body, self.require(body, 'game_id')[0])
+        session.user.cart.add(game, game.price)
+        return self.cart(session, query, body)
+
+    def remove_from_cart(self, session, query, body, game_id):
+        for game in session.user.cart.games:
+            if str(game.game_id) == game_id:
+                session.user.cart.remove(game, game.price)
+                return self.cart(session, query, body)
+        raise ApiError(404, "That game is not in your cart.")
+
+    def checkout(self, session, query, body):
+        user = session.user
+        games = list(user.cart.games)
+        if not self.service.purchase_games(user, games):
+            self.failed(409)
+        user.cart.empty()
+        return {'purchased': games, 'wallet': user.wallet}
+
+    """INVENTORY AND WALLET"""
+    def inventory(self, session, query, body):
+        return {'inventory': self.service.get_user_inventory(session.user) or []}
+
+    def gift(self, session, query, body):
+        game_id, username = self.require(body, 'game_id', 'username')
+        if not self.service.gift_game_to_user(game_id, session.user.user_id, username):
+            self.failed(409)
+        return {'gifted': game_id, 'to': username}
+
+    def wallet(self, session, query, body):
+        return {'wallet': session.user.wallet}
+
+    def add_funds(self, session, query, body):
+        amount = self.require(body, 'amount')[0]
+        if not self.service.purchase_wallet_funds(session.user, amount):
+            self.failed()
+        return {'wallet': session.user.wallet}
+
+    def orders(self, session, query, body):
+        _, limit = self.page_args(query)
+        return {'orders': self.service.get_orders_page(session.user.user_id, self.order_cursor(query), limit) or []}
+
+    """ADMIN"""
+    def admin_users(self, session, query, body):
+        return {'users': self.service.get_all_users() or []}
+
+    def admin_rename_user(self, session, query, body, username):
+        new_username = self.require(body, 'username')[0]
+        if not self.service.change_username(username, new_username):
+            self.failed(409)
+        return {'renamed': username, 'to': new_username}
+
+    def admin_delete_user(self, session, query, body, user_id):
+        if not self.service.remove_user(user_id):
+            self.failed(404)
+        return {'deleted': int(user_id)}
+
+    def admin_user_orders(self, session, query, body, user_id):
+        _, limit = self.page_args(query)
+        return {'orders': self.service.get_orders_page(user_id, self.order_cursor(query), limit) or []}
+
+    def admin_orders(self, session, query, body):
+        _, limit = self.page_args(query)
+        return {'orders': self.service.get_orders_page(None, self.order_cursor(query), limit) or []}
+
+    def admin_add_game(self, session, query, body):
+        name, price, rating, description, developer, publisher = self.require(
+            body, 'name', 'price', 'rating', 'description', 'developer', 'publisher')
+        for key, value in (('name', name), ('description', description), ('developer', developer), ('publisher', publisher)):
+            if not isinstance(value, str) or len(value) > FIELD_LENGTHS[key]:
+                raise ApiError(400, f"{key} must be text of at most {FIELD_LENGTHS[key]} characters")
+        price = self.price_arg(body, 'price')
+        if not Decimal(0) <= price < Decimal(10000) or price.as_tuple().exponent < -2:
+            raise ApiError(400, "price must be from 0 to 9999.99, with at most 2 decimal places")
+        ratings = self.service.get_ratings()
+        if ratings is None:
+            self.failed(500, "Could not load ratings.")
+        if not isinstance(rating, str) or rating.lower() not in ratings:
+            raise ApiError(400, "rating must be one of " + ", ".join(ratings))
+        game = Game(game_id=0, name=name, price=price, rating=rating.lower(), description=description,
+                    developer=developer, publisher=publisher, recommendations=0,
+                    release_date=dt.date.today(), metacritic=0,
+                    genres=self.tags_arg(body, 'genres'), categories=self.tags_arg(body, 'categories'))
+        if not self.service.add_game_to_store(game):
+            self.failed(409, "Failed to add game.")
+        return {'added': name}
+
+    def admin_sales(self, session, query, body):
+        _, limit = self.page_args(query, default_limit=10)
+        try:
+            days = min(int(query.get('days', 14)), 366)
+        except ValueError:
+            raise ApiError(400, "days must be an integer")
+        if days < 0:
+            raise ApiError(400, "days must not be negative")
+        report = self.service.get_sales_report(limit, days)
+        if report is None:
+            self.failed(500, "Could not load the sales report.")
+        return report
+
+    def admin_rebuild_recommendations(self, session, query, body):
+        index = self.service.rebuild_recommendations()
+        if index is None:
+            self.failed(500, "Could not rebuild recommendations.")
+        return index.stats()
+
+    def admin_query_stats(self, session, query, body):
+        return self.service.get_query_stats()
+
+class StoreRequestHandler(BaseHTTPRequestHandler):
+    api: StoreApi = None
+
+    def do_GET(self):
+        self.dispatch('GET')
+
+    def do_POST(self):
+        self.dispatch('POST')
+
+    def do_PATCH(self):
+        self.dispatch('PATCH')
+
+    def do_DELETE(self):
+        self.dispatch('DELETE')
+
+    def dispatch(self, method):
+        url = urlsplit(self.path)
+        query = {key: values[-1] for key, values in parse_qs(url.query).items()}
+        token = self.headers.get('Authorization', "").removeprefix("Bearer ").strip() or None
+        sys.stdout.capture()
+        try:
+            length = int(self.headers.get('Content-Length') or 0)
+            body = json.loads(self.rfile.read(length)) if length else {}
+            if not isinstance(body, dict):
+                raise ApiError(400, "Request body must be a JSON object.")
+            status, payload = 200, to_json(self.api.handle(method, url.path.rstrip('/') or '/', query, body, token))
+        except ApiError as e:
+            status, payload = e.status, {'error': e.message}
+        except (ValueError, json.JSONDecodeError) as e:
+            status, payload = 400, {'error': str(e)}
+        except Exception as e:
+            logger.exception("Unhandled error on %s %s", method, self.path)
+            status, payload = 500, {'error': "Internal server error."}
+        finally:
+            sys.stdout.release()
+
+        data = json.dumps(payload).encode()
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def log_message(self, format, *args):
+        logger.info("%s - %s", self.address_string(), format % args)
+
+class PooledHTTPServer(HTTPServer):
+    """An HTTPServer that handles each connection on a bounded thread pool."""
+    def __init__(self, address, handler, workers):
+        super().__init__(address, handler)
+        self.executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix='http')
+
+    def process_request(self, request, client_address):
+        self.executor.submit(self.process_request_thread, request, client_address)
+
+    def process_request_thread(self, request, client_address):
+        try:
+            self.finish_request(request, client_address)
+        except Exception:
+            self.handle_error(request, client_address)
+        finally:
+            self.shutdown_request(request)
+
+    def server_close(self):
+        super().server_close()
+        self.executor.shutdown(wait=True)
+
+def serve(host='127.0.0.1', port=8000, workers=32, service:Service=None):
+    """Serves the store API until interrupted."""
+    if not isinstance(sys.stdout, ThreadLocalStdout):
+        sys.stdout = ThreadLocalStdout(sys.stdout)
+    StoreRequestHandler.api = StoreApi(service if service else Service(), getattr(config, 'admin_password', 'password'))
+    server = PooledHTTPServer((host, port), StoreRequestHandler, workers)
+    logger.info("Serving store API on %s:%s with %s workers", host, port, workers)
+    print(f"Serving store API on http://{host}:{port}")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+
+def main():
+    parser = argparse.ArgumentParser(description="Serve the store as an HTTP/JSON API.")
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=8000)
+    parser.add_argument('--workers', type=int, default=32, help="requests handled at once")
+    args = parser.parse_args()
+    serve(args.host, args.port, args.workers)
+
+
+if __name__ == "__main__":
+    logging.basicConfig(filename="logs/p1.log",
+                level=logging.INFO,
+                format='%(asctime)s :: %(levelname)s :: %(message)s')
+    main()
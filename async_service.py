@@ -0,0 +1,70 @@
+"""Asyncio versions of the Dao and Service layers.
+
+Each method of AsyncDao and AsyncService awaits the matching Dao or Service method, run on a thread
+pool no larger than the connection pool. One event loop can then drive many store sessions at once,
+with queries waiting their turn for a free connection instead of blocking the loop.
+
+    service = AsyncService()
+    games = await service.get_all_games()
+    async for page in service.iter_order_pages(user_id):
+        ...
+"""
+
+from dao import Dao
+from service import Service
+from concurrent.futures import ThreadPoolExecutor
+import asyncio
+import functools
+
+class AsyncLayer():
+    """Mirrors every public method of a synchronous object as a coroutine run on a bounded executor.
+    Methods named iter_* return generators, and are mirrored as async generators instead.
+    """
+    def __init__(self, target, max_workers):
+        self._target = target
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix=type(target).__name__)
+
+    def __getattr__(self, name):
+        if name == '_target':
+            raise AttributeError(name)
+        attr = getattr(self._target, name)
+        if name.startswith('_') or not callable(attr):
+            return attr
+        if name.startswith('iter_'):
+            return functools.partial(self._iterate, attr)
+
+        @functools.wraps(attr)
+        async def call(*args, **kwargs):
+            return await self._run(attr, *args, **kwargs)
+        return call
+
+    def _run(self, function, *args, **kwargs):
+        loop = asyncio.get_running_loop()
+        return loop.run_in_executor(self._executor, functools.partial(function, *args, **kwargs))
+
+    async def _iterate(self, method, *args, **kwargs):
+        iterator = await self._run(method, *args, **kwargs)
+        done = object()
+        while True:
+            item = await self._run(next, iterator, done)
+            if item is done:
+                return
+            yield item
+
+    def close(self):
+        """Waits for running calls to finish and stops the executor."""
+        self._executor.shutdown(wait=True)
+
+class AsyncDao(AsyncLayer):
+    """Awaitable Dao. Runs at most as many queries at once as the Dao's connection pool has connections."""
+    def __init__(self, dao:Dao=None):
+        dao = Dao() if dao is None else dao
+        super().__init__(dao, dao.pool.size)
+        self.dao = dao
+
+class AsyncService(AsyncLayer):
+    """Awaitable Service. Runs at most as many calls at once as its Dao's connection pool has connections."""
+    def __init__(self, service:Service=None):
+        service = Service() if service is None else service
+        super().__init__(service, service.dao.pool.size)
+        self.service = service
@@ -0,0 +1,155 @@
+"""Benchmarks the Dao and Service layers against a seeded database and reports the results as JSON.
+
+Seed the database with generate_data.py first. The write benchmarks change the data they run against,
+so only run this against a database that can be reset.
+"""
+
+from dao import Dao
+from service import Service
+from decimal import Decimal
+import datetime as dt
+import argparse
+import contextlib
+import io
+import json
+import platform
+import random
+import time
+import logging
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark Dao and Service methods against the p1 database.")
+    parser.add_argument('--iterations', type=int, default=200, help="calls per point lookup or write")
+    parser.add_argument('--scan-iterations', type=int, default=10, help="calls per full-table read")
+    parser.add_argument('--seed', type=int, default=0, help="random seed, for repeatable runs")
+    parser.add_argument('--only', nargs='*', help="names of the benchmarks to run, default all")
+    parser.add_argument('--output', help="file to write the JSON report to, default stdout")
+    args = parser.parse_args()
+
+    report = run_benchmarks(args.iterations, args.scan_iterations, args.seed, args.only)
+    if args.output:
+        with open(args.output, 'w') as outfile:
+            json.dump(report, outfile, indent=2)
+    else:
+        print(json.dumps(report, indent=2))
+
+def run_benchmarks(iterations=200, scan_iterations=10, seed=0, only=None):
+    """Runs every benchmark case and returns a report of latency percentiles and throughput per case."""
+    rng = random.Random(seed)
+    dao = Dao()
+    service = Service(dao)
+    cases = benchmark_cases(dao, service, rng)
+
+    results = {}
+    for name, (call, is_scan) in cases.items():
+        if only and name not in only:
+            continue
+        results[name] = measure(call, scan_iterations if is_scan else iterations)
+
+    return {
+        'meta': {
+            'timestamp': dt.datetime.now().isoformat(timespec='seconds'),
+            'python': platform.python_version(),
+            'iterations': iterations,
+            'scan_iterations': scan_iterations,
+            'seed': seed
+        },
+        'results': results
+    }
+
+def benchmark_cases(dao:Dao, service:Service, rng:random.Random):
+    """Returns the benchmark cases by name, each a (call, is_scan) pair. Each call picks its own random arguments."""
+    users = dao.all_users()
+    games = dao.all_games()
+    user_ids = [user.user_id for user in users]
+    game_ids = [game.game_id for game in games]
+    run_id = int(time.time())
+    counter = iter(range(1, 10 ** 9))
+
+    def user():
+        return rng.choice(users)
+    def cart():
+        return rng.choices(games, k=rng.randint(1, 5))
+    def new_username():
+        return f"bench{run_id}_{next(counter)}"
+
+    return {
+        'dao.all_users': (lambda: dao.all_users(), True),
+        'dao.user_by_id': (lambda: dao.user_by_id(rng.choice(user_ids)), False),
+        'dao.user_by_username': (lambda: dao.user_by_username(user().username), False),
+        'dao.user_by_username_password': (lambda: dao.user_by_username_password(user().username, "password"), False),
+        'dao.user_game': (lambda: dao.user_game(rng.choice(user_ids), rng.choice(game_ids)), False),
+        'dao.recent_orders_by_user': (lambda: dao.recent_orders_by_user(rng.choice(user_ids)), False),
+        'dao.recent_orders': (lambda: dao.recent_orders(), True),
+        'dao.orders_page': (lambda: dao.orders_page(rng.choice(user_ids)), False),
+        'dao.all_games': (lambda: dao.all_games(), True),
+        'dao.games_page': (lambda: dao.games_page(rng.choice(['all', 'date', 'metacritic'])), False),
+        'dao.game_by_id': (lambda: dao.game_by_id(rng.choice(game_ids)), False),
+        'dao.game_genres': (lambda: dao.game_genres(rng.choice(game_ids)), False),
+        'dao.game_categories': (lambda: dao.game_categories(rng.choice(game_ids)), False),
+        'dao.game_if_of_age': (lambda: dao.game_if_of_age(rng.choice(game_ids), rng.randint(13, 70)), False),
+        'dao.games_in_user_inventory': (lambda: dao.games_in_user_inventory(rng.choice(user_ids)), False),
+        'dao.user_inventory': (lambda: dao.user_inventory(rng.choice(user_ids)), False),
+        'dao.games_ordered_by_date': (lambda: dao.games_ordered_by_date(), True),
+        'dao.games_ordered_by_metacritic': (lambda: dao.games_ordered_by_metacritic(), True),
+        'dao.insert_user': (lambda: dao.insert_user(new_username(), "password", "1990-01-01"), False),
+        'dao.update_user_wallet': (lambda: dao.update_user_wallet(rng.choice(user_ids), Decimal(rng.randrange(0, 20000)) / 100), False),
+        'dao.insert_order': (lambda: dao.insert_order(rng.choice(user_ids), dt.datetime.now(), Decimal(10), cart()), False),
+        'dao.insert_user_games': (lambda: dao.insert_user_games(rng.choice(user_ids), cart()), False),
+        'service.login': (lambda: service.login(user().username, "password"), False),
+        'service.get_all_games': (lambda: service.get_all_games(), False),
+        'service.get_games_page': (lambda: service.get_games_page(rng.choice(['all', 'date', 'metacritic'])), False),
+        'service.get_game_by_id': (lambda: service.get_game_by_id(rng.choice(game_ids)), False),
+        'service.get_games_ordered_by_date': (lambda: service.get_games_ordered_by_date(), False),
+        'service.get_games_ordered_by_metacritic': (lambda: service.get_games_ordered_by_metacritic(), False),
+        'service.get_games_in_user_inventory': (lambda: service.get_games_in_user_inventory(user()), False),
+        'service.get_user_inventory': (lambda: service.get_user_inventory(user()), False),
+        'service.get_recent_orders_by_user': (lambda: service.get_recent_orders_by_user(rng.choice(user_ids)), False),
+        'service.get_orders_page': (lambda: service.get_orders_page(rng.choice(user_ids)), False),
+        'service.create_user': (lambda: service.create_user(new_username(), "password", "1990-01-01"), False),
+        'service.purchase_wallet_funds': (lambda: service.purchase_wallet_funds(user(), 10), False),
+        'service.purchase_games': (lambda: service.purchase_games(user(), cart()), False),
+        'service.add_games_to_user': (lambda: service.add_games_to_user(user(), cart()), False),
+        'service.of_age_for_game': (lambda: service.of_age_for_game(user(), rng.choice(games)), False),
+    }
+
+def measure(call, iterations):
+    """Calls call iterations times and returns its latency percentiles in milliseconds and its throughput."""
+    latencies = []
+    errors = 0
+    start = time.perf_counter()
+    for _ in range(iterations):
+        before = time.perf_counter()
+        try:
+            # Service methods print user-facing messages, which would otherwise flood the report.
+            with contextlib.redirect_stdout(io.StringIO()):
+                call()
+        except Exception:
+            errors += 1
+        latencies.append(time.perf_counter() - before)
+    elapsed = time.perf_counter() - start
+
+    latencies.sort()
+    return {
+        'calls': iterations,
+        'errors': errors,
+        'p50_ms': percentile(latencies, 50) * 1000,
+        'p95_ms': percentile(latencies, 95) * 1000,
+        'p99_ms': percentile(latencies, 99) * 1000,
+        'mean_ms': sum(latencies) / len(latencies) * 1000 if latencies else 0.0,
+        'ops_per_sec': iterations / elapsed if elapsed else 0.0
+    }
+
+def percentile(sorted_values, p):
+    """Returns the nearest-rank p-th percentile of an already sorted list."""
+    if not sorted_values:
+        return 0.0
+    rank = max(1, -(-p * len(sorted_values) // 100))
+    return sorted_values[int(rank) - 1]
+
+
+if __name__ == "__main__":
+    logging.basicConfig(filename="logs/p1.log",
+                level=logging.INFO,
+                format='%(asctime)s :: %(levelname)s :: %(message)s')
+    main()
@@ -0,0 +1,125 @@
+"""In-process cache of the store catalog for the service layer."""
+
+from entities import Game
+from search import SearchIndex
+from facets import FacetIndex
+from eligibility import AgeEligibility
+import threading
+import time
+import logging
+
+logger = logging.getLogger(__name__)
+
+class Catalog():
+    """A snapshot of every game in the store, indexed by game_id and presorted for browsing."""
+    def __init__(self, games: list[Game]):
+        self.games = tuple(sorted(games, key=lambda game: game.game_id))
+        self.by_id = {game.game_id: game for game in games}
+        self.by_date = tuple(sorted(games, key=lambda game: (game.release_date, game.game_id), reverse=True))
+        self.by_metacritic = tuple(sorted([game for game in games if game.metacritic is not None],
+                                          key=lambda game: (game.metacritic, game.game_id), reverse=True))
+        self.orderings = {'all': self.games, 'date': self.by_date, 'metacritic': self.by_metacritic}
+        self.positions = {sort: {game.game_id: i for i, game in enumerate(ordering)}
+                          for sort, ordering in self.orderings.items()}
+        self._search_index = None
+        self._facet_index = None
+        self._eligibility = None
+
+    def search_index(self) -> SearchIndex:
+        """Returns the search index over this catalog, building it the first time it is needed."""
+        if self._search_index is None:
+            self._search_index = SearchIndex(self.games)
+        return self._search_index
+
+    def game(self, game_id):
+        """Returns the game with the given id, or None if the store has no such game."""
+        try:
+            return self.by_id.get(int(game_id))
+        except (TypeError, ValueError):
+            return None
+
+    def page(self, sort, after_id=None, limit=5):
+        """Returns up to limit games that follow the game with id after_id in the given sort order.
+        Returns None if that game is not in the ordering.
+        """
+        start = 0
+        if after_id is not None:
+            position = self.positions[sort].get(after_id)
+            if position is None:
+                return None
+            start = position + 1
+        return list(self.orderings[sort][start:start + limit])
+
+    def facet_index(self, ratings:dict[str, int]) -> FacetIndex:
+        """Returns the facet bitmaps over this catalog, building them the first time they are needed."""
+        if self._facet_index is None:
+            self._facet_index = FacetIndex(self.games, ratings)
+        return self._facet_index
+
+    def eligibility(self, ratings:dict[str, int]) -> AgeEligibility:
+        """Returns the age brackets over this catalog, building them the first time they are needed."""
+        if self._eligibility is None:
+            self._eligibility = AgeEligibility(self.games, ratings)
+        return self._eligibility
+
+    def sort_positions(self, sort, positions:list[int]) -> list[int]:
+        """Reorders positions in self.games into the given sort order, dropping games that are not in it."""
+        if sort == 'all':
+            return positions
+        ranks = self.positions[sort]
+        ranked = [(ranks[self.games[i].game_id], i) for i in positions if self.games[i].game_id in ranks]
+        return [i for _, i in sorted(ranked)]
+
+class CatalogCache():
+    """Holds a Catalog for up to ttl seconds, reloading it with loader once it is stale or invalidated.
+    loader is called with no arguments and must return every game in the store, or None on failure.
+    """
+    def __init__(self, loader, ttl=300):
+        self.loader = loader
+        self.ttl = ttl
+        self.hits = 0
+        self.misses = 0
+        self.peek_hits = 0
+        self.peek_misses = 0
+        self._catalog = None
+        self._loaded_at = 0.0
+        self._lock = threading.Lock()
+
+    def get(self) -> Catalog:
+        """Returns the cached Catalog, loading it first if it is missing or stale.
+        Returns None if the catalog could not be loaded.
+        """
+        with self._lock:
+            if self._catalog and time.monotonic() - self._loaded_at < self.ttl:
+                self.hits += 1
+                return self._catalog
+
+            self.misses += 1
+            games = self.loader()
+            if games is None:
+                return None
+            self._catalog = Catalog(games)
+            self._loaded_at = time.monotonic()
+            logger.info("Loaded %s games into the catalog cache", len(games))
+            return self._catalog
+
+    def peek(self) -> Catalog:
+        """Returns the cached Catalog if it is fresh, without loading it. Returns None otherwise.
+        Counted apart from get's hits and misses, since a cold peek loads nothing.
+        """
+        with self._lock:
+            if self._catalog and time.monotonic() - self._loaded_at < self.ttl:
+                self.peek_hits += 1
+                return self._catalog
+            self.peek_misses += 1
+            return None
+
+    def invalidate(self):
+        """Drops the cached Catalog so the next get reloads it."""
+        with self._lock:
+            self._catalog = None
+        logger.info("Catalog cache invalidated")
+
+    def stats(self):
+        return {'hits': self.hits, 'misses': self.misses, 'peek_hits': self.peek_hits, 'peek_misses': self.peek_misses,
+                'size': len(self._catalog.games) if self._catalog else 0}
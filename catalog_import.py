@@ -0,0 +1,127 @@
+"""Bulk imports games into the store from a JSON or CSV file.
+
+JSON files are shaped like init_data.json: a list of game objects. CSV files have a header row with the
+same field names, and list genres and categories separated by semicolons. Release dates may be written
+like "Nov 1, 2004" or as YYYY-MM-DD. Games already in the store, by name and developer, are skipped.
+
+    python catalog_import.py new_games.json
+    python catalog_import.py new_games.csv --batch-size 2000
+"""
+
+from entities import Game
+from service import Service
+from decimal import (Decimal, InvalidOperation)
+import datetime as dt
+import argparse
+import csv
+import json
+import os
+import sys
+import time
+import logging
+
+logger = logging.getLogger(__name__)
+
+# Longest values the Games columns hold.
+FIELD_LENGTHS = {'name': 256, 'description': 512, 'developer': 100, 'publisher': 100}
+
+# Longest genre or category the Genres and Categories tables hold.
+TAG_LENGTH = 50
+
+def main():
+    parser = argparse.ArgumentParser(description="Import games into the p1 store from a JSON or CSV file.")
+    parser.add_argument('path', help="JSON or CSV file of games")
+    parser.add_argument('--format', choices=['json', 'csv'], help="file format, default from the file extension")
+    parser.add_argument('--batch-size', type=int, default=1000, help="games per insert and commit")
+    args = parser.parse_args()
+
+    service = Service()
+    start = time.perf_counter()
+    games, rejected = read_games(args.path, service.get_ratings() or {}, args.format)
+    print(f"Read {len(games)} games from {args.path} in {time.perf_counter() - start:.2f}s ({rejected} rejected)")
+
+    start = time.perf_counter()
+    def progress(read, inserted, skipped):
+        rate = read / max(time.perf_counter() - start, 1e-9)
+        print(f"\rGames: {read}/{len(games)} read, {inserted} inserted, {skipped} skipped ({rate:,.0f} games/sec)",
+              end="", flush=True)
+
+    result = service.import_games(games, args.batch_size, progress)
+    print()
+    if result is None:
+        print("Import failed, see logs/p1.log")
+        sys.exit(1)
+    inserted, skipped, failed = result
+    print(f"Imported {inserted} games, skipped {skipped} already in the store, in {time.perf_counter() - start:.2f}s")
+    if failed:
+        print(f"Import stopped early: {failed} games were not imported, see logs/p1.log")
+        sys.exit(1)
+
+def read_games(path, ratings:dict[str, int], file_format=None):
+    """Reads the games in a JSON or CSV file, rejecting records that are incomplete, malformed,
+    too long for their columns or have a rating not in ratings.
+    Returns the games and the number of records rejected.
+    """
+    file_format = file_format or os.path.splitext(path)[1].lstrip('.').lower()
+    if file_format == 'json':
+        with open(path) as infile:
+            records = json.load(infile)
+    elif file_format == 'csv':
+        with open(path, newline='') as infile:
+            records = [dict(record, genres=split_tags(record.get('genres')), categories=split_tags(record.get('categories')))
+                       for record in csv.DictReader(infile)]
+    else:
+        raise ValueError(f"Cannot import games from a [{file_format}] file. Use json or csv.")
+
+    games, rejected = [], 0
+    for i, record in enumerate(records, start=1):
+        try:
+            games.append(game_from_record(record, ratings))
+        except (KeyError, TypeError, ValueError, InvalidOperation) as e:
+            rejected += 1
+            logger.warning("Rejected record %s of [%s] :: %r", i, path, e)
+    return games, rejected
+
+def split_tags(value):
+    return [tag.strip() for tag in value.split(';') if tag.strip()] if value else []
+
+def game_from_record(record:dict, ratings:dict[str, int]) -> Game:
+    """Builds a Game from an imported record. Raises KeyError, ValueError or InvalidOperation if the record is unusable."""
+    for field, length in FIELD_LENGTHS.items():
+        if not record[field] and field != 'description':
+            raise ValueError(f"{field} must not be empty")
+        if len(record[field]) > length:
+            raise ValueError(f"{field} is longer than {length} characters")
+    for field in ('genres', 'categories'):
+        tags = record.get(field) or []
+        if not isinstance(tags, list) or not all(isinstance(tag, str) for tag in tags):
+            raise ValueError(f"{field} must be a list of names")
+        if any(len(tag) > TAG_LENGTH for tag in tags):
+            raise ValueError(f"a name in {field} is longer than {TAG_LENGTH} characters")
+    rating = (record.get('rating') or 'rp').lower()
+    if rating not in ratings:
+        raise ValueError(f"unknown rating [{rating}]")
+    price = Decimal(str(record['price']))
+    if not Decimal(0) <= price < Decimal(10000):
+        raise ValueError("price must be from 0 to 9999.99")
+    metacritic = record.get('metacritic')
+    return Game(game_id=None, name=record['name'], price=price, rating=rating,
+                description=record['description'], developer=record['developer'], publisher=record['publisher'],
+                recommendations=int(record.get('recommendations') or 0),
+                release_date=parse_release_date(record['release_date']),
+                metacritic=int(metacritic) if metacritic not in (None, "") else None,
+                genres=record.get('genres'), categories=record.get('categories'))
+
+def parse_release_date(value) -> dt.date:
+    """Parses a release date written like "Nov 1, 2004" or as YYYY-MM-DD."""
+    try:
+        return dt.date.fromisoformat(value)
+    except ValueError:
+        return dt.datetime.strptime(value, '%b %d, %Y').date()
+
+
+if __name__ == "__main__":
+    logging.basicConfig(filename="logs/p1.log",
+                level=logging.INFO,
+                format='%(asctime)s :: %(levelname)s :: %(message)s')
+    main()
@@ -1,7 +1,12 @@
 """Sets up a connection to the MySQL database."""
 
 import mysql.connector
+from mysql.connector.constants import ClientFlag
 import mysql_config as config
+from collections import deque
+from contextlib import contextmanager
+import threading
+import time
 import logging
 
 logger = logging.getLogger(__name__)
@@ -9,9 +14,11 @@ logger = logging.getLogger(__name__)
 def connect_to_mysql():
     """Returns a connection to the p1 MySQL database."""
     try:
+        # FOUND_ROWS makes rowcount count matched rows, so an UPDATE that leaves a row unchanged still reports it.
         cnx = mysql.connector.connect(user=config.user, password=config.password,
                                     host=config.host,
-                                    database='p1')
+                                    database='p1',
+                                    client_flags=[ClientFlag.FOUND_ROWS])
 
         logger.info("Connected to MySQL database")
         return cnx
@@ -20,4 +27,144 @@ def connect_to_mysql():
         return
     except Exception as e:
         logger.error(f"General Error Connecting: {str(e)}")
-        return
\ No newline at end of file
+        return
+
+class PooledConnection():
+    """A connection owned by a ConnectionPool, along with when it was opened and last returned,
+    and the prepared statements cached on it.
+    """
+    def __init__(self, cnx):
+        self.cnx = cnx
+        self.created_at = time.monotonic()
+        self.last_used = self.created_at
+        self.statements = {}
+
+class ConnectionPool():
+    """A bounded pool of connections to the p1 MySQL database.
+
+    Settings default to the optional pool_size, pool_max_lifetime, pool_max_idle and pool_timeout
+    values in mysql_config. Connections are validated when borrowed, and are closed once they are
+    older than max_lifetime seconds or have sat unused in the pool for longer than max_idle seconds.
+    """
+    def __init__(self, size=None, max_lifetime=None, max_idle=None, timeout=None):
+        self.size = size if size else getattr(config, 'pool_size', 5)
+        self.max_lifetime = max_lifetime if max_lifetime else getattr(config, 'pool_max_lifetime', 1800)
+        self.max_idle = max_idle if max_idle else getattr(config, 'pool_max_idle', 300)
+        self.timeout = timeout if timeout else getattr(config, 'pool_timeout', 10)
+        self._idle = deque()
+        self._opened = 0
+        self._closed = False
+        self._lock = threading.Condition()
+        self._local = threading.local()
+
+    @contextmanager
+    def connection(self):
+        """Borrows a connection for the duration of the with-block, yielding None if none could be had.
+        A thread that already holds a connection is handed that same connection, so nested Dao calls
+        share one transaction and cannot starve the pool.
+        """
+        held = getattr(self._local, 'held', None)
+        if held:
+            yield held.cnx
+            return
+
+        pooled = self._acquire()
+        if pooled is None:
+            yield None
+            return
+
+        self._local.held = pooled
+        try:
+            yield pooled.cnx
+        finally:
+            self._local.held = None
+            self._release(pooled)
+
+    def statements(self) -> dict:
+        """Returns the prepared statement cache of the connection the calling thread has borrowed."""
+        return self._local.held.statements
+
+    def close(self):
+        """Closes every idle connection. Borrowed connections are closed as they are returned."""
+        with self._lock:
+            self._closed = True
+            while self._idle:
+                self._discard(self._idle.pop())
+            self._lock.notify_all()
+        logger.info("Connection pool closed")
+
+    def _acquire(self):
+        deadline = time.monotonic() + self.timeout
+        while True:
+            pooled = None
+            with self._lock:
+                self._evict_idle()
+                while not self._idle and self._opened >= self.size and not self._closed:
+                    remaining = deadline - time.monotonic()
+                    if remaining <= 0:
+                        logger.error("Timed out after %ss waiting for a pooled connection", self.timeout)
+                        return None
+                    self._lock.wait(remaining)
+                if self._closed:
+                    logger.error("Cannot borrow from a closed connection pool")
+                    return None
+                if self._idle:
+                    pooled = self._idle.pop()
+                else:
+                    self._opened += 1
+
+            if pooled is None:
+                cnx = connect_to_mysql()
+                if cnx is None:
+                    with self._lock:
+                        self._opened -= 1
+                        self._lock.notify()
+                    return None
+                return PooledConnection(cnx)
+
+            if not self._is_expired(pooled) and self._is_valid(pooled):
+                return pooled
+            with self._lock:
+                self._discard(pooled)
+
+    def _release(self, pooled):
+        try:
+            if pooled.cnx.in_transaction:
+                pooled.cnx.rollback()
+        except mysql.connector.Error as e:
+            logger.error("Failed to roll back returned connection :: %s", e.msg)
+            with self._lock:
+                self._discard(pooled)
+            return
+
+        with self._lock:
+            if self._closed or self._is_expired(pooled):
+                self._discard(pooled)
+            else:
+                pooled.last_used = time.monotonic()
+                self._idle.append(pooled)
+                self._lock.notify()
+
+    def _evict_idle(self):
+        # Connections are returned to the right, so the longest idle sit on the left.
+        now = time.monotonic()
+        while self._idle and now - self._idle[0].last_used > self.max_idle:
+            self._discard(self._idle.popleft())
+
+    def _is_expired(self, pooled):
+        return time.monotonic() - pooled.created_at > self.max_lifetime
+
+    def _is_valid(self, pooled):
+        try:
+            return pooled.cnx.is_connected()
+        except mysql.connector.Error:
+            return False
+
+    def _discard(self, pooled):
+        """Closes a connection and frees its slot. Caller must hold the pool lock."""
+        self._opened -= 1
+        self._lock.notify()
+        try:
+            pooled.cnx.close()
+        except mysql.connector.Error as e:
+            logger.error("Failed to close pooled connection :: %s", e.msg)
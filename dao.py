@@ -1,252 +1,542 @@
 """Data Access Layer for communicating directly with the MySQL database."""
 
-from entities import (User, Game, Order)
+from entities import (User, Game, Order, InventoryEntry)
+from exceptions import (UnderAgeError, ExistenceError, InsufficientFundsError)
 import mysql.connector.errors
-from connection import connect_to_mysql
+from mysql.connector import errorcode
+from connection import ConnectionPool
+from query_stats import (QueryStats, InstrumentedConnection)
+from collections import Counter
+from decimal import Decimal
+from contextlib import contextmanager
 import logging
 
 logger = logging.getLogger(__name__)
 
+def value_rows(count, width):
+    """Returns the VALUES placeholders for a multi-row statement of count rows with width columns each."""
+    row = "(" + ", ".join(["%s"] * width) + ")"
+    return ", ".join([row] * count)
+
 class Dao():
-    def __init__(self):
-        self.cnx = connect_to_mysql()
+    def __init__(self, pool:ConnectionPool=None, slow_query_ms=100):
+        """Every method borrows a connection from the pool for the length of the call.
+        Pass a pool to share it between several Daos, otherwise this Dao owns its own.
+        Every query is recorded in self.stats, and those slower than slow_query_ms are logged.
+        """
+        self._owns_pool = pool is None
+        self.pool = ConnectionPool() if pool is None else pool
+        self.stats = QueryStats(slow_query_ms)
 
     def __del__(self):
-        self.cnx.close()
-        logger.info("DB connection closed")
+        if self._owns_pool:
+            self.pool.close()
+
+    @contextmanager
+    def connection(self):
+        """Borrows a pooled connection whose cursors record their queries in self.stats."""
+        with self.pool.connection() as cnx:
+            yield InstrumentedConnection(cnx, self.stats) if cnx else None
+
+    def _prepared_query(self, cnx, query, params, dictionary=False):
+        """Runs a hot query through a server-side prepared statement, so MySQL parses it once per connection.
+        The prepared cursor is cached on the connection this thread holds. Returns every row, as dicts if dictionary is True.
+        """
+        statements = self.pool.statements()
+        cursor = statements.get(query)
+        self.stats.record_prepared(cursor is not None)
+        if cursor is None:
+            cursor = statements[query] = cnx.cursor(prepared=True)
+        try:
+            cursor.execute(query, params)
+            rows = cursor.fetchall()
+        except mysql.connector.Error:
+            # The statement may be left mid-result, so prepare it afresh next time.
+            statements.pop(query, None)
+            raise
+        if dictionary:
+            return [dict(zip(cursor.column_names, row)) for row in rows]
+        return rows
     
     """USERS"""
     def insert_user(self, username, password, date_of_birth):
-        if self.cnx and self.cnx.is_connected():
-            with self.cnx.cursor() as cursor:
-                try:
-                    insert_query = "INSERT INTO Users (username, password, date_of_birth) VALUES (%s, %s, %s)"
-                    cursor.execute(insert_query, (username, password, date_of_birth))
-                    self.cnx.commit()
-                    logger.info("Inserted user [%s] into db", username)
-                    return True
-                except mysql.connector.Error as e:
-                    logger.error("Failed to insert user [%s] :: %s", username, e.msg)
+        """Inserts a user, relying on the unique username to reject duplicates in the same statement.
+        Raises ExistenceError if the username is taken.
+        """
+        with self.connection() as cnx:
+            if cnx:
+                with cnx.cursor() as cursor:
+                    try:
+                        insert_query = "INSERT INTO Users (username, password, date_of_birth) VALUES (%s, %s, %s)"
+                        cursor.execute(insert_query, (username, password, date_of_birth))
+                        cnx.commit()
+                        logger.info("Inserted user [%s] into db", username)
+                        return True
+                    except mysql.connector.IntegrityError as e:
+                        cnx.rollback()
+                        if e.errno == errorcode.ER_DUP_ENTRY:
+                            raise ExistenceError("A user with that username already exists.")
+                        logger.error("Failed to insert user [%s] :: %s", username, e.msg)
+                    except mysql.connector.Error as e:
+                        logger.error("Failed to insert user [%s] :: %s", username, e.msg)
         return False
     
     def all_users(self):
-        if self.cnx and self.cnx.is_connected():
-            with self.cnx.cursor(dictionary=True) as cursor:
-                try:
-                    cursor.execute("SELECT user_id, username, date_of_birth, wallet FROM Users ORDER BY user_id DESC;")
-                    return [User(**user) for user in cursor.fetchall()]
-                except mysql.connector.Error as e:
-                    logger.error("Query to select all users failed :: %s", e.msg)
+        with self.connection() as cnx:
+            if cnx:
+                with cnx.cursor(dictionary=True) as cursor:
+                    try:
+                        cursor.execute("SELECT user_id, username, date_of_birth, wallet FROM Users ORDER BY user_id DESC;")
+                        return [User(**user) for user in cursor.fetchall()]
+                    except mysql.connector.Error as e:
+                        logger.error("Query to select all users failed :: %s", e.msg)
     
     def user_by_id(self, user_id):
-        if self.cnx and self.cnx.is_connected():
-            with self.cnx.cursor(dictionary=True) as cursor:
+        with self.connection() as cnx:
+            if cnx:
                 try:
-                    cursor.execute("SELECT user_id, username, date_of_birth, wallet FROM Users WHERE user_id=%s", [user_id])
-                    return User(**cursor.fetchone())
+                    rows = self._prepared_query(cnx, "SELECT user_id, username, date_of_birth, wallet FROM Users WHERE user_id=%s", [user_id], dictionary=True)
+                    return User(**rows[0]) if rows else None
                 except mysql.connector.Error as e:
                     logger.error("Query to select user by user_id [%s] failed :: %s", user_id, e.msg)
     
     def user_by_username(self, username):
-        if self.cnx and self.cnx.is_connected():
-            with self.cnx.cursor(dictionary=True) as cursor:
-                try:
-                    cursor.execute("SELECT user_id, username, date_of_birth, wallet FROM Users WHERE username=%s", [username])
-                    result = cursor.fetchone()
-                    if result:
-                        return User(**result)
-                    else:
-                        return None
-                except mysql.connector.Error as e:
-                    logger.error("Query to select user by username [%s] failed :: %s", username, e.msg)
+        with self.connection() as cnx:
+            if cnx:
+                with cnx.cursor(dictionary=True) as cursor:
+                    try:
+                        cursor.execute("SELECT user_id, username, date_of_birth, wallet FROM Users WHERE username=%s", [username])
+                        result = cursor.fetchone()
+                        if result:
+                            return User(**result)
+                        else:
+                            return None
+                    except mysql.connector.Error as e:
+                        logger.error("Query to select user by username [%s] failed :: %s", username, e.msg)
     
     def user_by_username_password(self, username, password):
-        if self.cnx and self.cnx.is_connected():
-            with self.cnx.cursor(dictionary=True) as cursor:
-                try:
-                    cursor.execute("SELECT * FROM Users WHERE username=%s AND password=%s;", [username, password])
-                    return cursor.fetchone()
-                except mysql.connector.Error as e:
-                    logger.error("Query to select user by username [%s] and password failed :: %s", username, e.msg)
+        with self.connection() as cnx:
+            if cnx:
+                with cnx.cursor(dictionary=True) as cursor:
+                    try:
+                        cursor.execute("SELECT * FROM Users WHERE username=%s AND password=%s;", [username, password])
+                        return cursor.fetchone()
+                    except mysql.connector.Error as e:
+                        logger.error("Query to select user by username [%s] and password failed :: %s", username, e.msg)
 
     def user_game(self, user_id, game_id):
-        if self.cnx and self.cnx.is_connected():
-            with self.cnx.cursor(dictionary=True) as cursor:
+        with self.connection() as cnx:
+            if cnx:
                 try:
-                    cursor.execute("SELECT * FROM User_Game WHERE user_fk=%s AND game_fk=%s;", [user_id, game_id])
-                    return cursor.fetchone()
+                    rows = self._prepared_query(cnx, "SELECT * FROM User_Game WHERE user_fk=%s AND game_fk=%s;", [user_id, game_id], dictionary=True)
+                    return rows[0] if rows else None
                 except mysql.connector.Error as e:
                     logger.error("Query to select user_id [%s] game by game_id [%s] :: %s", user_id, game_id, e.msg)
     
     def insert_user_games(self, user_id, games):
-        if self.cnx and self.cnx.is_connected():
-            with self.cnx.cursor() as cursor:
-                try:
-                    insert_query = "INSERT INTO User_Game (user_fk, game_fk, quantity_in_inventory) VALUES (%s, %s, %s);"
-                    game_ids = [game.game_id for game in games]
-                    for game_fk in set(game_ids):
-                        quantity = game_ids.count(game_fk)
-                        in_inventory = self.user_game(user_id, game_fk)
-                        if in_inventory:
-                            self.update_user_game(user_id, game_fk, in_inventory['quantity_in_inventory'] + quantity)
-                        else:
-                            cursor.execute(insert_query, (user_id, game_fk, quantity))
-
-                    self.cnx.commit()
-                    logger.info("Inserted games into user_id [%s] inventory :: %s", user_id, [game.name for game in games])
-                    return True
-                except mysql.connector.Error as e:
-                    logger.error("Failed to insert games into user_id [%s] inventory :: %s", user_id, e.msg)
+        with self.connection() as cnx:
+            if cnx:
+                with cnx.cursor() as cursor:
+                    try:
+                        quantities = Counter(game.game_id for game in games)
+                        self._upsert_user_games(cursor, user_id, quantities)
+                        cnx.commit()
+                        logger.info("Inserted games into user_id [%s] inventory :: %s", user_id, [game.name for game in games])
+                        return True
+                    except mysql.connector.Error as e:
+                        logger.error("Failed to insert games into user_id [%s] inventory :: %s", user_id, e.msg)
         return False
+
+    def _upsert_user_games(self, cursor, user_id, quantities:Counter):
+        """Adds quantities of each game_id to a user's inventory in a single statement."""
+        params = []
+        for game_fk, quantity in quantities.items():
+            params.extend((user_id, game_fk, quantity))
+        cursor.execute(
+            f"""
+            INSERT INTO User_Game (user_fk, game_fk, quantity_in_inventory) VALUES {value_rows(len(quantities), 3)}
+            ON DUPLICATE KEY UPDATE quantity_in_inventory = quantity_in_inventory + VALUES(quantity_in_inventory);
+            """
+        , params)
     
     def update_user_game(self, user_id, game_id, quantity):
-        if self.cnx and self.cnx.is_connected():
-            with self.cnx.cursor() as cursor:
-                try:
-                    if quantity > 0:
-                        update_query = "UPDATE User_Game SET quantity_in_inventory=%s WHERE user_fk=%s AND game_fk=%s;"
-                        cursor.execute(update_query, (quantity, user_id, game_id))
-                    else:
-                        delete_query = "DELETE FROM User_Game WHERE user_fk = %s AND game_fk = %s;"
-                        cursor.execute(delete_query, (user_id, game_id))
+        with self.connection() as cnx:
+            if cnx:
+                with cnx.cursor() as cursor:
+                    try:
+                        if quantity > 0:
+                            update_query = "UPDATE User_Game SET quantity_in_inventory=%s WHERE user_fk=%s AND game_fk=%s;"
+                            cursor.execute(update_query, (quantity, user_id, game_id))
+                        else:
+                            delete_query = "DELETE FROM User_Game WHERE user_fk = %s AND game_fk = %s;"
+                            cursor.execute(delete_query, (user_id, game_id))
 
-                    self.cnx.commit()
-                    logger.info("Updated user_id [%s] inventory", user_id)
-                    return True
-                except mysql.connector.Error as e:
-                    logger.error("Failed to update user_id [%s] inventory :: %s", user_id, e.msg)
+                        cnx.commit()
+                        logger.info("Updated user_id [%s] inventory", user_id)
+                        return True
+                    except mysql.connector.Error as e:
+                        logger.error("Failed to update user_id [%s] inventory :: %s", user_id, e.msg)
         return False
     
     def update_user_wallet(self, user_id, amount):
-        if self.cnx and self.cnx.is_connected():
-            with self.cnx.cursor() as cursor:
-                try:
-                    update_query = "UPDATE Users SET wallet=%s WHERE user_id=%s;"
-                    cursor.execute(update_query, (amount, user_id))
-
-                    self.cnx.commit()
-                    logger.info("Updated user_id [%s] wallet balance to %.2f", user_id, amount)
-                    return True
-                except mysql.connector.Error as e:
-                    logger.error("Failed to update user_id [%s] wallet balance :: %s", user_id, e.msg)
+        with self.connection() as cnx:
+            if cnx:
+                with cnx.cursor() as cursor:
+                    try:
+                        update_query = "UPDATE Users SET wallet=%s WHERE user_id=%s;"
+                        cursor.execute(update_query, (amount, user_id))
+
+                        cnx.commit()
+                        logger.info("Updated user_id [%s] wallet balance to %.2f", user_id, amount)
+                        return True
+                    except mysql.connector.Error as e:
+                        logger.error("Failed to update user_id [%s] wallet balance :: %s", user_id, e.msg)
         return False
 
     def update_username(self, current_username, new_username):
-        if self.cnx and self.cnx.is_connected():
-            with self.cnx.cursor() as cursor:
-                try:
-                    cursor.execute("UPDATE Users SET username=%s WHERE username=%s;", [new_username, current_username])
-                    if cursor.rowcount == 1:
-                        self.cnx.commit()
-                        logger.info("Updated user [%s] to [%s]", current_username, new_username)
-                        return True
-                    else:
-                        return False
-                except mysql.connector.Error as e:
-                    logger.error("Could not update username of [%s] to [%s] :: %s", current_username, new_username, e.msg)
+        """Renames a user in one statement. Raises ExistenceError if there is no such user or new_username is taken."""
+        with self.connection() as cnx:
+            if cnx:
+                with cnx.cursor() as cursor:
+                    try:
+                        cursor.execute("UPDATE Users SET username=%s WHERE username=%s;", [new_username, current_username])
+                        if cursor.rowcount == 1:
+                            cnx.commit()
+                            logger.info("Updated user [%s] to [%s]", current_username, new_username)
+                            return True
+                        else:
+                            raise ExistenceError("User does not exist.")
+                    except mysql.connector.IntegrityError as e:
+                        cnx.rollback()
+                        if e.errno == errorcode.ER_DUP_ENTRY:
+                            raise ExistenceError("A user with that username already exists.")
+                        logger.error("Could not update username of [%s] to [%s] :: %s", current_username, new_username, e.msg)
+                    except mysql.connector.Error as e:
+                        logger.error("Could not update username of [%s] to [%s] :: %s", current_username, new_username, e.msg)
 
     def delete_user(self, user_id):
-        if self.cnx and self.cnx.is_connected():
-            with self.cnx.cursor() as cursor:
-                try:
-                    cursor.execute("DELETE FROM Users WHERE user_id=%s;", [user_id])
-                    if cursor.rowcount == 1:
-                        self.cnx.commit()
-                        logger.info("Deleted user with user_id [%s]", user_id)
-                        return True
-                    else:
-                        return False
-                except mysql.connector.Error as e:
-                    logger.error("Could not delete user with user_id [%s] :: %s", user_id, e.msg)
+        """Deletes a user in one statement. Raises ExistenceError if there is no such user."""
+        with self.connection() as cnx:
+            if cnx:
+                with cnx.cursor() as cursor:
+                    try:
+                        cursor.execute("DELETE FROM Users WHERE user_id=%s;", [user_id])
+                        if cursor.rowcount == 1:
+                            cnx.commit()
+                            logger.info("Deleted user with user_id [%s]", user_id)
+                            return True
+                        else:
+                            raise ExistenceError("User does not exist.")
+                    except mysql.connector.Error as e:
+                        logger.error("Could not delete user with user_id [%s] :: %s", user_id, e.msg)
 
     """ORDERS"""
     def insert_order(self, user_id, order_date, total_cost, games=None):
-        if self.cnx and self.cnx.is_connected():
-            with self.cnx.cursor() as cursor:
-                try:
-                    # Insert order into Orders table.
-                    insert_query = "INSERT INTO Orders (user_fk, order_date, total_cost) VALUES (%s, %s, %s);"
-                    cursor.execute(insert_query, (user_id, order_date, total_cost))
-
-                    # Insert order details into OrderDetails table if this purchse is for games.
-                    if games:
-                        insert_query = "INSERT INTO OrderDetails (order_fk, game_fk, quantity) VALUES (%s, %s, %s);"
-                        order_fk = cursor._last_insert_id
-                        for game_fk in set([game.game_id for game in games]):
-                            quantity = [game.game_id for game in games].count(game_fk)
-                            cursor.execute(insert_query, (order_fk, game_fk, quantity))
-
-                    self.cnx.commit()
-                    logger.info("Inserted order_id [%s] by user_id [%s] with total_cost [$%.2f] into db", cursor._last_insert_id, user_id, total_cost)
-                    return True
-                except mysql.connector.Error as e:
-                    logger.error("Failed to insert order by user_id [%s] :: %s", user_id, e.msg)
+        with self.connection() as cnx:
+            if cnx:
+                with cnx.cursor() as cursor:
+                    try:
+                        order_fk = self._insert_order(cursor, user_id, order_date, total_cost,
+                                                      Counter(game.game_id for game in games or []), Dao.unit_prices(games or []))
+                        cnx.commit()
+                        logger.info("Inserted order_id [%s] by user_id [%s] with total_cost [$%.2f] into db", order_fk, user_id, total_cost)
+                        return True
+                    except mysql.connector.Error as e:
+                        logger.error("Failed to insert order by user_id [%s] :: %s", user_id, e.msg)
         return False
+
+    def _insert_order(self, cursor, user_id, order_date, total_cost, quantities:Counter, prices:dict=None):
+        """Inserts an order and, if it is for games, all of its details in one statement,
+        then adds it to the sales summaries in the same transaction. Returns the new order_id.
+        prices maps each game_id to the price paid for one copy.
+        """
+        cursor.execute("INSERT INTO Orders (user_fk, order_date, total_cost) VALUES (%s, %s, %s);", (user_id, order_date, total_cost))
+        order_fk = cursor.lastrowid
+
+        # Insert order details into OrderDetails table if this purchase is for games.
+        if quantities:
+            params = []
+            for game_fk, quantity in quantities.items():
+                params.extend((order_fk, game_fk, quantity))
+            cursor.execute(f"INSERT INTO OrderDetails (order_fk, game_fk, quantity) VALUES {value_rows(len(quantities), 3)};", params)
+        self._record_sale(cursor, user_id, order_date, total_cost, quantities, prices or {})
+        return order_fk
+
+    def _record_sale(self, cursor, user_id, order_date, total_cost, quantities:Counter, prices:dict):
+        """Adds an order to the GameSales, DailySales, UserSpend and SalesTotals summaries, so sales reports never scan Orders.
+        An order for games counts as a sale, and one without as a wallet top-up.
+        """
+        sale, top_up = (1, 0) if quantities else (0, 1)
+        cursor.execute(
+            """
+            INSERT INTO DailySales (day, orders, revenue, top_ups, top_up_volume) VALUES (DATE(%s), %s, %s, %s, %s)
+            ON DUPLICATE KEY UPDATE orders = orders + VALUES(orders), revenue = revenue + VALUES(revenue),
+                top_ups = top_ups + VALUES(top_ups), top_up_volume = top_up_volume + VALUES(top_up_volume);
+            """
+        , (order_date, sale, total_cost * sale, top_up, total_cost * top_up))
+        cursor.execute(
+            """
+            INSERT INTO UserSpend (user_fk, orders, spend, top_ups, top_up_volume) VALUES (%s, %s, %s, %s, %s)
+            ON DUPLICATE KEY UPDATE orders = orders + VALUES(orders), spend = spend + VALUES(spend),
+                top_ups = top_ups + VALUES(top_ups), top_up_volume = top_up_volume + VALUES(top_up_volume);
+            """
+        , (user_id, sale, total_cost * sale, top_up, total_cost * top_up))
+        cursor.execute(
+            """
+            INSERT INTO SalesTotals (totals_id, orders, revenue, top_ups, top_up_volume) VALUES (1, %s, %s, %s, %s)
+            ON DUPLICATE KEY UPDATE orders = orders + VALUES(orders), revenue = revenue + VALUES(revenue),
+                top_ups = top_ups + VALUES(top_ups), top_up_volume = top_up_volume + VALUES(top_up_volume);
+            """
+        , (sale, total_cost * sale, top_up, total_cost * top_up))
+        if quantities:
+            params = []
+            for game_fk, quantity in quantities.items():
+                params.extend((game_fk, quantity, prices.get(game_fk, 0) * quantity))
+            cursor.execute(
+                f"""
+                INSERT INTO GameSales (game_fk, units, revenue) VALUES {value_rows(len(quantities), 3)}
+                ON DUPLICATE KEY UPDATE units = units + VALUES(units), revenue = revenue + VALUES(revenue);
+                """
+            , params)
+
+    def unit_prices(games:list[Game]) -> dict:
+        """Returns the discounted price of one copy of each of games, by game_id."""
+        return {game.game_id: game.price - game.price * Decimal(game.discount_percent) for game in games}
+
+    def checkout(self, user_id, age, order_date, total_cost, games:list[Game]):
+        """Buys games for a user in one transaction with a fixed number of statements, however large the cart.
+        Checks the user is old enough for every game, debits total_cost from their wallet,
+        records the order and adds the games to their inventory.
+        Raises UnderAgeError or InsufficientFundsError, rolling back, if the purchase is not allowed.
+        Returns the user's wallet balance after the purchase, or None if it was not committed.
+        """
+        quantities = Counter(game.game_id for game in games)
+        with self.connection() as cnx:
+            if cnx:
+                with cnx.cursor() as cursor:
+                    try:
+                        cursor.execute(
+                            f"""
+                            SELECT g.game_id
+                            FROM Games g INNER JOIN Ratings r ON g.rating = r.rating
+                            WHERE g.game_id IN ({", ".join(["%s"] * len(quantities))}) AND r.required_age <= %s;
+                            """
+                        , list(quantities) + [age])
+                        allowed = {row[0] for row in cursor.fetchall()}
+                        for game in games:
+                            if game.game_id not in allowed:
+                                cnx.rollback()
+                                raise UnderAgeError(f"You are not of age to buy {game.name}.")
+
+                        cursor.execute("UPDATE Users SET wallet = wallet - %s WHERE user_id=%s AND wallet >= %s;", (total_cost, user_id, total_cost))
+                        if cursor.rowcount != 1:
+                            cnx.rollback()
+                            raise InsufficientFundsError("You don't have enough funds!")
+
+                        order_fk = self._insert_order(cursor, user_id, order_date, total_cost, quantities, Dao.unit_prices(games))
+                        self._upsert_user_games(cursor, user_id, quantities)
+                        cursor.execute("SELECT wallet FROM Users WHERE user_id=%s;", (user_id,))
+                        (balance,) = cursor.fetchone()
+                        cnx.commit()
+                        logger.info("Checked out order_id [%s] by user_id [%s] with total_cost [$%.2f]", order_fk, user_id, total_cost)
+                        return balance
+                    except mysql.connector.Error as e:
+                        cnx.rollback()
+                        logger.error("Failed to check out order by user_id [%s] :: %s", user_id, e.msg)
     
-    def recent_orders_by_user(self, user_id):
-        if self.cnx and self.cnx.is_connected():
-            with self.cnx.cursor(dictionary=True) as cursor:
-                try:
-                    cursor.execute("SELECT * FROM Orders WHERE user_fk=%s ORDER BY order_date DESC;", [user_id])
-                    orders = cursor.fetchall()
+    def top_up_wallet(self, user_id, order_date, amount):
+        """Adds amount to a user's wallet and records the top-up order in one transaction.
+        The balance is incremented in place, so it cannot overwrite a concurrent checkout's debit.
+        Raises ExistenceError, rolling back, if there is no such user.
+        Returns the new balance, or None if the top-up failed.
+        """
+        with self.connection() as cnx:
+            if cnx:
+                with cnx.cursor() as cursor:
+                    try:
+                        cursor.execute("UPDATE Users SET wallet = wallet + %s WHERE user_id=%s;", (amount, user_id))
+                        if cursor.rowcount != 1:
+                            cnx.rollback()
+                            raise ExistenceError("User does not exist.")
+                        order_fk = self._insert_order(cursor, user_id, order_date, amount, Counter())
+                        cursor.execute("SELECT wallet FROM Users WHERE user_id=%s;", (user_id,))
+                        (balance,) = cursor.fetchone()
+                        cnx.commit()
+                        logger.info("Topped up user_id [%s] wallet by [$%.2f] in order_id [%s]", user_id, amount, order_fk)
+                        return balance
+                    except mysql.connector.Error as e:
+                        cnx.rollback()
+                        logger.error("Failed to top up user_id [%s] wallet :: %s", user_id, e.msg)
 
-                    cursor.execute(
-                        """
-                        SELECT g.name, od.quantity, od.order_fk
-                        FROM Games g INNER JOIN OrderDetails od ON g.game_id = od.game_fk;
-                        """
-                    )
-                    details = cursor.fetchall()
-                    for order in orders:
-                        order['quantities_by_game'] = [{detail['name']:detail['quantity']} for detail in details if detail['order_fk'] == order['order_id']]
-                    return [Order(**order) for order in orders]
-                except mysql.connector.Error as e:
-                    logger.error("Query to select orders by user_id [%s] failed :: %s", user_id, e.msg)
+    def recent_orders_by_user(self, user_id):
+        """Returns a user's orders, newest first. Raises ExistenceError if there is no such user.
+        Joining from Users tells a missing user (no rows) from one without orders (one all-NULL row) in the same query.
+        """
+        with self.connection() as cnx:
+            if cnx:
+                with cnx.cursor(dictionary=True) as cursor:
+                    try:
+                        cursor.execute(
+                            """
+                            SELECT o.*
+                            FROM Users u LEFT JOIN Orders o ON o.user_fk = u.user_id
+                            WHERE u.user_id=%s
+                            ORDER BY o.order_date DESC, o.order_id DESC;
+                            """
+                        , [user_id])
+                        rows = cursor.fetchall()
+                        if not rows:
+                            raise ExistenceError("User does not exist.")
+                        return self._orders_with_details(cursor, [row for row in rows if row['order_id'] is not None])
+                    except mysql.connector.Error as e:
+                        logger.error("Query to select orders by user_id [%s] failed :: %s", user_id, e.msg)
 
     def recent_orders(self):
-        if self.cnx and self.cnx.is_connected():
-            with self.cnx.cursor(dictionary=True) as cursor:
-                try:
-                    cursor.execute("SELECT * FROM Orders ORDER BY order_date DESC;")
-                    orders = cursor.fetchall()
-
-                    cursor.execute(
-                        """
-                        SELECT g.name, od.quantity, od.order_fk
-                        FROM Games g INNER JOIN OrderDetails od ON g.game_id = od.game_fk;
-                        """
-                    )
-                    details = cursor.fetchall()
-                    for order in orders:
-                        order['quantities_by_game'] = [{detail['name']:detail['quantity']} for detail in details if detail['order_fk'] == order['order_id']]
-                    return [Order(**order) for order in orders]
-                except mysql.connector.Error as e:
-                    logger.error("Query to select all recent orders failed :: %s", e.msg)
+        with self.connection() as cnx:
+            if cnx:
+                with cnx.cursor(dictionary=True) as cursor:
+                    try:
+                        cursor.execute("SELECT * FROM Orders ORDER BY order_date DESC, order_id DESC;")
+                        return self._orders_with_details(cursor, cursor.fetchall())
+                    except mysql.connector.Error as e:
+                        logger.error("Query to select all recent orders failed :: %s", e.msg)
+
+    def orders_page(self, user_id=None, after=None, limit=5):
+        """Returns up to limit orders, newest first, along with their details.
+        after is the (order_date, order_id) of the last order on the previous page, or None for the first page.
+        Orders by every user are paged when user_id is None.
+        """
+        with self.connection() as cnx:
+            if cnx:
+                with cnx.cursor(dictionary=True) as cursor:
+                    try:
+                        conditions, params = [], []
+                        if user_id is not None:
+                            conditions.append("user_fk=%s")
+                            params.append(user_id)
+                        if after:
+                            conditions.append("(order_date, order_id) < (%s, %s)")
+                            params.extend(after)
+                        where = f"WHERE {' AND '.join(conditions)} " if conditions else ""
+                        cursor.execute(f"SELECT * FROM Orders {where}ORDER BY order_date DESC, order_id DESC LIMIT %s;", params + [limit])
+                        return self._orders_with_details(cursor, cursor.fetchall())
+                    except mysql.connector.Error as e:
+                        logger.error("Query to select page of orders by user_id [%s] after [%s] failed :: %s", user_id, after, e.msg)
+
+    def _orders_with_details(self, cursor, orders:list[dict]) -> list[Order]:
+        """Builds Orders from rows of the Orders table, fetching only the detail rows of those orders."""
+        details_by_order = {order['order_id']: [] for order in orders}
+        if details_by_order:
+            placeholders = ", ".join(["%s"] * len(details_by_order))
+            cursor.execute(
+                f"""
+                SELECT g.name, od.quantity, od.order_fk
+                FROM OrderDetails od INNER JOIN Games g ON g.game_id = od.game_fk
+                WHERE od.order_fk IN ({placeholders});
+                """
+            , list(details_by_order))
+            for detail in cursor.fetchall():
+                details_by_order[detail['order_fk']].append((detail['name'], detail['quantity']))
+
+        for order in orders:
+            order['quantities_by_game'] = details_by_order[order['order_id']]
+        return [Order(**order) for order in orders]
     
+    def sales_report(self, limit=10, days=14):
+        """Returns the top limit games by units sold, the last days days of sales, the top limit users by lifetime
+        spend and the all-time totals. Everything is read from the summary tables kept by _record_sale,
+        so the report costs the same however many orders there are.
+        """
+        with self.connection() as cnx:
+            if cnx:
+                with cnx.cursor(dictionary=True) as cursor:
+                    try:
+                        cursor.execute(
+                            """
+                            SELECT g.game_id, g.name, s.units, s.revenue
+                            FROM GameSales s INNER JOIN Games g ON g.game_id = s.game_fk
+                            ORDER BY s.units DESC, s.game_fk DESC LIMIT %s;
+                            """
+                        , [limit])
+                        top_games = cursor.fetchall()
+                        cursor.execute("SELECT * FROM DailySales ORDER BY day DESC LIMIT %s;", [days])
+                        daily = cursor.fetchall()
+                        cursor.execute(
+                            """
+                            SELECT u.user_id, u.username, s.orders, s.spend, s.top_ups, s.top_up_volume
+                            FROM UserSpend s INNER JOIN Users u ON u.user_id = s.user_fk
+                            ORDER BY s.spend DESC, s.user_fk DESC LIMIT %s;
+                            """
+                        , [limit])
+                        top_spenders = cursor.fetchall()
+                        cursor.execute("SELECT orders, revenue, top_ups, top_up_volume FROM SalesTotals WHERE totals_id = 1;")
+                        totals = cursor.fetchone() or {'orders': 0, 'revenue': Decimal(0), 'top_ups': 0, 'top_up_volume': Decimal(0)}
+                        return {'top_games': top_games, 'daily': daily, 'top_spenders': top_spenders, 'totals': totals}
+                    except mysql.connector.Error as e:
+                        logger.error("Query to select sales report failed :: %s", e.msg)
+
     """GAMES"""
     def all_games(self):
-        if self.cnx and self.cnx.is_connected():
-            with self.cnx.cursor(dictionary=True) as cursor:
-                try:
-                    cursor.execute("SELECT * FROM Games;")
-                    games = cursor.fetchall()
-                    genres = self.all_game_genres()
-                    categories = self.all_game_categories()
-                    for game in games:
-                        game['genres'] = [genre['genre'] for genre in genres if genre['game_id'] == game['game_id']]
-                        game['categories'] = [category['category'] for category in categories if category['game_id'] == game['game_id']]
-
-                    return [Game(**game) for game in games]
-                except mysql.connector.Error as e:
-                    logger.error("Query to select all games failed :: %s", (e.msg))
+        with self.connection() as cnx:
+            if cnx:
+                with cnx.cursor(dictionary=True) as cursor:
+                    try:
+                        cursor.execute("SELECT * FROM Games ORDER BY game_id;")
+                        return self.assemble_games(cursor.fetchall())
+                    except mysql.connector.Error as e:
+                        logger.error("Query to select all games failed :: %s", (e.msg))
+
+    # Keyset orderings for games_page, as (WHERE condition, cursor condition, ORDER BY).
+    GAME_SORTS = {
+        'all': ("TRUE", "game_id > %s", "game_id"),
+        'date': ("TRUE", "(release_date, game_id) < (%s, %s)", "release_date DESC, game_id DESC"),
+        'metacritic': ("metacritic IS NOT null", "(metacritic, game_id) < (%s, %s)", "metacritic DESC, game_id DESC"),
+    }
+
+    def game_sort_key(sort, game:Game):
+        """Returns the games_page cursor for a game in the given sort order."""
+        if sort == 'date':
+            return (game.release_date, game.game_id)
+        elif sort == 'metacritic':
+            return (game.metacritic, game.game_id)
+        return (game.game_id,)
+
+    def games_page(self, sort='all', after=None, limit=5):
+        """Returns up to limit games in the given sort order ('all', 'date' or 'metacritic'), with their genres and categories.
+        after is the sort key of the last game on the previous page, or None for the first page:
+        (game_id,) for 'all', (release_date, game_id) for 'date' and (metacritic, game_id) for 'metacritic'.
+        """
+        where, after_condition, order_by = Dao.GAME_SORTS[sort]
+        with self.connection() as cnx:
+            if cnx:
+                with cnx.cursor(dictionary=True) as cursor:
+                    try:
+                        params = []
+                        if after:
+                            where += " AND " + after_condition
+                            params.extend(after)
+                        cursor.execute(f"SELECT * FROM Games WHERE {where} ORDER BY {order_by} LIMIT %s;", params + [limit])
+                        games = cursor.fetchall()
+                        if not games:
+                            return []
+
+                        game_ids = [game['game_id'] for game in games]
+                        placeholders = ", ".join(["%s"] * len(game_ids))
+                        cursor.execute(f"SELECT game_fk AS game_id, genre FROM Game_Genre WHERE game_fk IN ({placeholders});", game_ids)
+                        genres = cursor.fetchall()
+                        cursor.execute(f"SELECT game_fk AS game_id, category FROM Game_Category WHERE game_fk IN ({placeholders});", game_ids)
+                        categories = cursor.fetchall()
+                        return self.assemble_games(games, genres, categories)
+                    except mysql.connector.Error as e:
+                        logger.error("Query to select page of games by [%s] after [%s] failed :: %s", sort, after, e.msg)
 
     def game_by_id(self, game_id):
-        if self.cnx and self.cnx.is_connected():
-            with self.cnx.cursor(dictionary=True) as cursor:
+        with self.connection() as cnx:
+            if cnx:
                 try:
-                    cursor.execute("SELECT * FROM Games WHERE game_id=%s;", [game_id])
-                    game = cursor.fetchone()
-                    if game:
+                    rows = self._prepared_query(cnx, "SELECT * FROM Games WHERE game_id=%s;", [game_id], dictionary=True)
+                    if rows:
+                        game = rows[0]
                         game['genres'] = [genre[0] for genre in self.game_genres(game['game_id'])]
                         game['categories'] = [category[0] for category in self.game_categories(game['game_id'])]
                         return Game(**game)
@@ -256,161 +546,331 @@ class Dao():
                     logger.error("Query to select game by game_id [%s] failed :: %s", game_id, e.msg)
 
     def game_genres(self, game_id):
-        if self.cnx and self.cnx.is_connected():
-            with self.cnx.cursor() as cursor:
+        with self.connection() as cnx:
+            if cnx:
                 try:
-                    cursor.execute(
+                    return self._prepared_query(cnx,
                         """
                         SELECT gen.genre
                         FROM Games gam INNER JOIN Game_Genre gen ON gam.game_id = gen.game_fk
                         WHERE gen.game_fk = %s;
                         """
                     , [game_id])
-                    return cursor.fetchall()
                 except mysql.connector.Error as e:
                     logger.error("Query to select game genres :: %s", (e.msg))
 
     def game_categories(self, game_id):
-        if self.cnx and self.cnx.is_connected():
-            with self.cnx.cursor() as cursor:
+        with self.connection() as cnx:
+            if cnx:
                 try:
-                    cursor.execute(
+                    return self._prepared_query(cnx,
                         """
                         SELECT cat.category
                         FROM Games gam INNER JOIN Game_Category cat ON gam.game_id = cat.game_fk
                         WHERE cat.game_fk = %s;
                         """
                     , [game_id])
-                    return cursor.fetchall()
                 except mysql.connector.Error as e:
                     logger.error("Query to select game categories :: %s", (e.msg))
 
     def all_game_genres(self):
-        if self.cnx and self.cnx.is_connected():
-            with self.cnx.cursor(dictionary=True) as cursor:
-                try:
-                    cursor.execute(
-                        """
-                        SELECT gam.game_id, gen.genre
-                        FROM Games gam INNER JOIN Game_Genre gen ON gam.game_id = gen.game_fk;
-                        """
-                    )
-                    return cursor.fetchall()
-                except mysql.connector.Error as e:
-                    logger.error("Query to select game genres failed :: %s", (e.msg))
+        with self.connection() as cnx:
+            if cnx:
+                with cnx.cursor(dictionary=True) as cursor:
+                    try:
+                        cursor.execute(
+                            """
+                            SELECT game_fk AS game_id, genre
+                            FROM Game_Genre;
+                            """
+                        )
+                        return cursor.fetchall()
+                    except mysql.connector.Error as e:
+                        logger.error("Query to select game genres failed :: %s", (e.msg))
 
     def all_game_categories(self):
-        if self.cnx and self.cnx.is_connected():
-            with self.cnx.cursor(dictionary=True) as cursor:
-                try:
-                    cursor.execute(
-                        """
-                        SELECT gam.game_id, cat.category
-                        FROM Games gam INNER JOIN Game_Category cat ON gam.game_id = cat.game_fk;
-                        """
-                    )
-                    return cursor.fetchall()
-                except mysql.connector.Error as e:
-                    logger.error("Query to select game categories failed :: %s", (e.msg))
+        with self.connection() as cnx:
+            if cnx:
+                with cnx.cursor(dictionary=True) as cursor:
+                    try:
+                        cursor.execute(
+                            """
+                            SELECT game_fk AS game_id, category
+                            FROM Game_Category;
+                            """
+                        )
+                        return cursor.fetchall()
+                    except mysql.connector.Error as e:
+                        logger.error("Query to select game categories failed :: %s", (e.msg))
                 
+    def assemble_games(self, games:list[dict], genres:list[dict]=None, categories:list[dict]=None) -> list[Game]:
+        """Builds Games from rows of the Games table, attaching their genres and categories.
+        genres and categories are rows of game_id and tag, and default to every tag in the store.
+        Tags are grouped by game_id in a single pass, so this runs in time linear in games plus tags.
+        """
+        genres_by_game = {game['game_id']: [] for game in games}
+        categories_by_game = {game['game_id']: [] for game in games}
+        for genre in (self.all_game_genres() or []) if genres is None else genres:
+            if genre['game_id'] in genres_by_game:
+                genres_by_game[genre['game_id']].append(genre['genre'])
+        for category in (self.all_game_categories() or []) if categories is None else categories:
+            if category['game_id'] in categories_by_game:
+                categories_by_game[category['game_id']].append(category['category'])
+
+        for game in games:
+            game['genres'] = genres_by_game[game['game_id']]
+            game['categories'] = categories_by_game[game['game_id']]
+        return [Game(**game) for game in games]
+
+    def ratings(self) -> dict[str, int]:
+        """Returns the age required for each maturity rating."""
+        with self.connection() as cnx:
+            if cnx:
+                with cnx.cursor() as cursor:
+                    try:
+                        cursor.execute("SELECT rating, required_age FROM Ratings;")
+                        return {rating: required_age for rating, required_age in cursor.fetchall()}
+                    except mysql.connector.Error as e:
+                        logger.error("Query to select ratings failed :: %s", e.msg)
+
     def game_if_of_age(self, game_id, age):
-        if self.cnx and self.cnx.is_connected():
-            with self.cnx.cursor(dictionary=True) as cursor:
+        with self.connection() as cnx:
+            if cnx:
                 try:
-                    cursor.execute(
+                    rows = self._prepared_query(cnx,
                         """
                         SELECT g.*
                         FROM Games g INNER JOIN Ratings r ON g.rating = r.rating
                         WHERE g.game_id = %s AND r.required_age <= %s;
                         """
-                    , [game_id, age])
-                    return cursor.fetchone()
+                    , [game_id, age], dictionary=True)
+                    return rows[0] if rows else None
                 except mysql.connector.Error as e:
                     logger.error("Query to select game by game_id [%s] for user with age [%s] failed :: %s", game_id, age, e.msg)
         
     def games_in_user_inventory(self, user_id):
-        if self.cnx and self.cnx.is_connected():
-            with self.cnx.cursor() as cursor:
+        with self.connection() as cnx:
+            if cnx:
+                with cnx.cursor() as cursor:
+                    try:
+                        cursor.execute(
+                            """
+                            SELECT g.*, quantity_in_inventory
+                            FROM Games g INNER JOIN User_Game ug ON g.game_id = ug.game_fk
+                            WHERE user_fk = %s
+                            ORDER BY g.name DESC;
+                            """
+                        , [user_id])
+                        rows = cursor.fetchall()
+                        games = []
+                        for row in rows:
+                            for i in range(row[-1]):
+                                games.append(Game(*row[0:-1]))
+                        return games
+                    except mysql.connector.Error as e:
+                        logger.error("Query to select user_id [%s] games in inventory failed :: %s", user_id, e.msg)
+
+    def user_inventory(self, user_id) -> list[InventoryEntry]:
+        """Returns one entry per title in a user's inventory, with the number of copies they hold."""
+        with self.connection() as cnx:
+            if cnx:
+                with cnx.cursor(dictionary=True) as cursor:
+                    try:
+                        cursor.execute(
+                            """
+                            SELECT g.*, quantity_in_inventory
+                            FROM Games g INNER JOIN User_Game ug ON g.game_id = ug.game_fk
+                            WHERE user_fk = %s
+                            ORDER BY g.game_id;
+                            """
+                        , [user_id])
+                        entries = []
+                        for row in cursor.fetchall():
+                            quantity = row.pop('quantity_in_inventory')
+                            entries.append(InventoryEntry(Game(**row), quantity))
+                        return entries
+                    except mysql.connector.Error as e:
+                        logger.error("Query to select user_id [%s] inventory failed :: %s", user_id, e.msg)
+
+    def user_game_quantities(self, user_id) -> dict[int, int]:
+        """Returns how many copies of each game_id a user holds."""
+        with self.connection() as cnx:
+            if cnx:
                 try:
-                    cursor.execute(
-                        """
-                        SELECT g.*, quantity_in_inventory
-                        FROM Games g INNER JOIN User_Game ug ON g.game_id = ug.game_fk
-                        WHERE user_fk = %s
-                        ORDER BY g.name DESC;
-                        """
+                    rows = self._prepared_query(cnx,
+                        "SELECT game_fk, quantity_in_inventory FROM User_Game WHERE user_fk = %s AND quantity_in_inventory > 0;"
                     , [user_id])
-                    rows = cursor.fetchall()
-                    games = []
-                    for row in rows:
-                        for i in range(row[-1]):
-                            games.append(Game(*row[0:-1]))
-                    return games
+                    return dict(rows)
                 except mysql.connector.Error as e:
-                    logger.error("Query to select user_id [%s] games in inventory failed :: %s", user_id, e.msg)
+                    logger.error("Query to select user_id [%s] game quantities failed :: %s", user_id, e.msg)
+
+    def co_purchase_baskets(self, add_basket, chunk_size=10000):
+        """Streams every order, then every user's inventory, in primary key order, calling add_basket
+        with the game_ids of each one. Returns True if both tables were read in full.
+        """
+        with self.connection() as cnx:
+            if cnx:
+                with cnx.cursor() as cursor:
+                    try:
+                        for query in ("SELECT order_fk, game_fk FROM OrderDetails ORDER BY order_fk;",
+                                      "SELECT user_fk, game_fk FROM User_Game WHERE quantity_in_inventory > 0 ORDER BY user_fk;"):
+                            cursor.execute(query)
+                            key, basket = None, []
+                            while rows := cursor.fetchmany(chunk_size):
+                                for basket_key, game_fk in rows:
+                                    if basket_key != key:
+                                        if basket:
+                                            add_basket(basket)
+                                        key, basket = basket_key, []
+                                    basket.append(game_fk)
+                            if basket:
+                                add_basket(basket)
+                        return True
+                    except mysql.connector.Error as e:
+                        logger.error("Query to stream co-purchase baskets failed :: %s", e.msg)
+        return False
 
     def insert_game(self, game:Game):
-        if self.cnx and self.cnx.is_connected():
-            with self.cnx.cursor() as cursor:
-                try:
-                    insert_query = "INSERT INTO Games (name, price, rating, description, developer, publisher, release_date) VALUES (%s, %s, %s, %s, %s, %s, %s)"
-                    cursor.execute(insert_query, (game.name, game.price, game.rating, game.description, game.developer, game.publisher, game.release_date))
-                    new_game_id = cursor._last_insert_id
-
-                    cursor.execute("SELECT LOWER(genre) FROM Genres;")
-                    existing_genres = [genre[0].lower() for genre in cursor.fetchall()]
-                    add_genres = [genre for genre in game.genres if genre.lower() not in existing_genres]
-
-                    cursor.execute("SELECT LOWER(category) FROM Categories;")
-                    existing_categories = [category[0].lower() for category in cursor.fetchall()]
-                    add_categories = [category for category in game.categories if category.lower() not in existing_categories]
-
-                    for genre in add_genres:
-                        cursor.execute("INSERT INTO Genres (genre) VALUES (%s);", (genre,))
-
-                    for category in add_categories:
-                        cursor.execute("INSERT INTO Categories (category) VALUES (%s);", (category,))
+        with self.connection() as cnx:
+            if cnx:
+                with cnx.cursor() as cursor:
+                    try:
+                        insert_query = "INSERT INTO Games (name, price, rating, description, developer, publisher, release_date) VALUES (%s, %s, %s, %s, %s, %s, %s)"
+                        cursor.execute(insert_query, (game.name, game.price, game.rating, game.description, game.developer, game.publisher, game.release_date))
+                        new_game_id = cursor.lastrowid
+                        self._insert_tags(cursor, {new_game_id: game})
+                        cnx.commit()
+                        logger.info("Inserted game [%s] into db", game.name)
+                        return True
+                    except mysql.connector.Error as e:
+                        logger.error("Failed to insert game [%s] :: %s", game.name, e.msg)
+        return False
 
-                    for genre in game.genres:
-                        cursor.execute("INSERT INTO Game_Genre (game_fk, genre) VALUES (%s, %s);", (new_game_id, genre,))
-                    for category in game.categories:
-                        cursor.execute("INSERT INTO Game_Category (game_fk, category) VALUES (%s, %s);", (new_game_id, category,))
+    def _insert_tags(self, cursor, games_by_id:dict[int, Game], genres=None, categories=None):
+        """Links each game to its genres and categories, adding the tags the store does not have yet.
+        genres and categories, if given, map each known tag in lowercase to its stored spelling. Only tags
+        missing from them are inserted, and they are updated with those tags. Otherwise every tag is offered
+        to INSERT IGNORE, which skips the ones that exist.
+        """
+        for table, link_table, column, attribute, known in (("Genres", "Game_Genre", "genre", "genres", genres),
+                                                             ("Categories", "Game_Category", "category", "categories", categories)):
+            known = {} if known is None else known
+            new_tags = {}
+            links = []
+            for game_id, game in games_by_id.items():
+                for tag in dict.fromkeys(getattr(game, attribute)):
+                    spelling = known.get(tag.lower()) or new_tags.setdefault(tag.lower(), tag)
+                    links.extend((game_id, spelling))
+            if new_tags:
+                cursor.execute(f"INSERT IGNORE INTO {table} ({column}) VALUES {value_rows(len(new_tags), 1)};", list(new_tags.values()))
+                known.update(new_tags)
+            if links:
+                cursor.execute(f"INSERT IGNORE INTO {link_table} (game_fk, {column}) VALUES {value_rows(len(links) // 2, 2)};", links)
+
+    def import_games(self, games:list[Game], batch_size=1000, progress=None):
+        """Inserts games batch_size at a time, committing each batch as one transaction.
+        Games whose name and developer (ignoring case) are already in the store, or earlier in games, are skipped.
+        Existing genres, categories and game keys are read once and cached for the whole import.
+        progress, if given, is called after each batch with the number of games read, inserted and skipped so far.
+        A failed batch stops the import. Returns the number of games inserted, skipped and not imported because
+        of a failure, or None if the import could not start.
+        """
+        with self.connection() as cnx:
+            if cnx:
+                with cnx.cursor() as cursor:
+                    try:
+                        # Lowered here rather than by MySQL, so keys match the games' own str.lower() exactly.
+                        cursor.execute("SELECT name, developer FROM Games;")
+                        seen = {(name.lower(), developer.lower()) for name, developer in cursor.fetchall()}
+                        cursor.execute("SELECT genre FROM Genres;")
+                        genres = {genre.lower(): genre for (genre,) in cursor.fetchall()}
+                        cursor.execute("SELECT category FROM Categories;")
+                        categories = {category.lower(): category for (category,) in cursor.fetchall()}
+                    except mysql.connector.Error as e:
+                        logger.error("Failed to read existing games and tags for import :: %s", e.msg)
+                        return None
 
-                    self.cnx.commit()
-                    logger.info("Inserted game [%s] into db", game.name)
-                    return True
-                except mysql.connector.Error as e:
-                    logger.error("Failed to insert game [%s] :: %s", game.name, e.msg)
-        return False
+                    read, inserted, skipped, failed = 0, 0, 0, 0
+                    for start in range(0, len(games), batch_size):
+                        batch = []
+                        for game in games[start:start + batch_size]:
+                            key = (game.name.lower(), game.developer.lower())
+                            if key in seen:
+                                skipped += 1
+                            else:
+                                seen.add(key)
+                                batch.append(game)
+                        read = min(start + batch_size, len(games))
+                        if batch:
+                            batch_genres, batch_categories = dict(genres), dict(categories)
+                            try:
+                                params = []
+                                for game in batch:
+                                    params.extend((game.name, game.price, game.rating, game.description, game.developer,
+                                                   game.publisher, game.recommendations, game.release_date, game.metacritic))
+                                cursor.execute(
+                                    "INSERT INTO Games (name, price, rating, description, developer, publisher, recommendations, release_date, metacritic) "
+                                    f"VALUES {value_rows(len(batch), 9)};"
+                                , params)
+                                games_by_id = self._imported_game_ids(cursor, batch)
+                                if games_by_id is None:
+                                    cnx.rollback()
+                                    logger.error("Failed to import games %s to %s, stopping the import :: could not read back their ids", start + 1, read)
+                                    failed = len(batch) + len(games) - read
+                                    break
+                                self._insert_tags(cursor, games_by_id, batch_genres, batch_categories)
+                                cnx.commit()
+                            except mysql.connector.Error as e:
+                                cnx.rollback()
+                                logger.error("Failed to import games %s to %s, stopping the import :: %s", start + 1, read, e.msg)
+                                failed = len(batch) + len(games) - read
+                                break
+                            genres, categories = batch_genres, batch_categories
+                            inserted += len(batch)
+                        if progress:
+                            progress(read, inserted, skipped)
+                    logger.info("Imported %s games, skipped %s duplicates, %s not imported", inserted, skipped, failed)
+                    return inserted, skipped, failed
     
+    def _imported_game_ids(self, cursor, batch:list[Game]) -> dict[int, Game]:
+        """Reads back the ids of a batch of games just inserted in this transaction, by name and developer.
+        Auto-increment ids of a multi-row INSERT need not be consecutive, so they cannot be derived from lastrowid,
+        but none is below it, which keeps the lookup to a primary key range.
+        Returns None if any game of the batch is not found.
+        """
+        params = [cursor.lastrowid]
+        for game in batch:
+            params.extend((game.name, game.developer))
+        cursor.execute(
+            "SELECT game_id, name, developer FROM Games "
+            f"WHERE game_id >= %s AND (name, developer) IN ({value_rows(len(batch), 2)}) ORDER BY game_id;"
+        , params)
+        # Later rows win, so a game committed under the same key by someone else mid-import yields to ours.
+        ids = {(name.lower(), developer.lower()): game_id for game_id, name, developer in cursor.fetchall()}
+        games_by_id = {}
+        for game in batch:
+            game_id = ids.get((game.name.lower(), game.developer.lower()))
+            if game_id is None:
+                return None
+            games_by_id[game_id] = game
+        return games_by_id
+
     def games_ordered_by_date(self):
-        if self.cnx and self.cnx.is_connected():
-            with self.cnx.cursor(dictionary=True) as cursor:
-                try:
-                    cursor.execute("SELECT * FROM Games ORDER BY release_date DESC, game_id DESC;")
-                    games = cursor.fetchall()
-                    genres = self.all_game_genres()
-                    categories = self.all_game_categories()
-                    for game in games:
-                        game['genres'] = [genre['genre'] for genre in genres if genre['game_id'] == game['game_id']]
-                        game['categories'] = [category['category'] for category in categories if category['game_id'] == game['game_id']]
-
-                    return [Game(**game) for game in games]
-                except mysql.connector.Error as e:
-                    logger.error("Query to select games ordered by release date failed :: %s", (e.msg))
+        with self.connection() as cnx:
+            if cnx:
+                with cnx.cursor(dictionary=True) as cursor:
+                    try:
+                        cursor.execute("SELECT * FROM Games ORDER BY release_date DESC, game_id DESC;")
+                        return self.assemble_games(cursor.fetchall())
+                    except mysql.connector.Error as e:
+                        logger.error("Query to select games ordered by release date failed :: %s", (e.msg))
 
     def games_ordered_by_metacritic(self):
-        if self.cnx and self.cnx.is_connected():
-            with self.cnx.cursor(dictionary=True) as cursor:
-                try:
-                    cursor.execute("SELECT * FROM Games WHERE metacritic IS NOT null ORDER BY metacritic DESC, game_id DESC;")
-                    games = cursor.fetchall()
-                    genres = self.all_game_genres()
-                    categories = self.all_game_categories()
-                    for game in games:
-                        game['genres'] = [genre['genre'] for genre in genres if genre['game_id'] == game['game_id']]
-                        game['categories'] = [category['category'] for category in categories if category['game_id'] == game['game_id']]
-
-                    return [Game(**game) for game in games]
-                except mysql.connector.Error as e:
-                    logger.error("Query to select games ordered by Metacritic failed :: %s", (e.msg))
\ No newline at end of file
+        with self.connection() as cnx:
+            if cnx:
+                with cnx.cursor(dictionary=True) as cursor:
+                    try:
+                        cursor.execute("SELECT * FROM Games WHERE metacritic IS NOT null ORDER BY metacritic DESC, game_id DESC;")
+                        return self.assemble_games(cursor.fetchall())
+                    except mysql.connector.Error as e:
+                        logger.error("Query to select games ordered by Metacritic failed :: %s", (e.msg))
@@ -0,0 +1,51 @@
+"""In-memory age checks, deciding which games a buyer is old enough for without querying the database.
+
+Ratings is a small fixed table, so the age each rating requires is read once and every game's rating
+comes from the catalog. Buyers fall into brackets at each distinct required age, and each bracket holds
+the set of game_ids open to it, so checking a cart or filtering a page to what a buyer may purchase
+takes only set lookups.
+"""
+
+from entities import Game
+from bisect import bisect_right
+
+class AgeEligibility():
+    """The games each age bracket may buy, from each game's rating and the age each rating requires.
+    Games with a rating missing from ratings are never eligible, matching the join against Ratings.
+    """
+    def __init__(self, games:list[Game], ratings:dict[str, int]):
+        self.ratings = ratings
+        self.brackets = sorted(set(ratings.values()))
+        by_required_age = {}
+        for game in games:
+            required_age = ratings.get(game.rating)
+            if required_age is not None:
+                by_required_age.setdefault(required_age, []).append(game.game_id)
+
+        # Each bracket may buy everything the brackets below it may, plus the games rated for its age.
+        self.eligible = []
+        cumulative = set()
+        for required_age in self.brackets:
+            cumulative.update(by_required_age.get(required_age, ()))
+            self.eligible.append(frozenset(cumulative))
+
+    def eligible_ids(self, age) -> frozenset:
+        """Returns the game_ids a buyer of the given age may buy."""
+        i = bisect_right(self.brackets, age)
+        return self.eligible[i - 1] if i else frozenset()
+
+    def may_buy(self, age, game:Game):
+        """Returns True if a buyer of the given age is old enough for game.
+        Works from the game's own rating, so games added since the catalog was loaded are checked too.
+        """
+        required_age = self.ratings.get(game.rating)
+        return required_age is not None and required_age <= age
+
+    def first_ineligible(self, age, games:list[Game]) -> Game:
+        """Returns the first of games a buyer of the given age is too young for, or None if they may buy them all."""
+        return next((game for game in games if not self.may_buy(age, game)), None)
+
+    def filter(self, age, games:list[Game]) -> list[Game]:
+        """Returns the games a buyer of the given age may buy, in their given order."""
+        eligible = self.eligible_ids(age)
+        return [game for game in games if game.game_id in eligible]
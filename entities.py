@@ -2,13 +2,21 @@
 
 from decimal import Decimal
 from exceptions import (InvalidInputError)
+import sys
+
+def intern_all(strings):
+    """Returns the strings as a tuple of interned strings, so each distinct tag is stored once however many games share it."""
+    return tuple(sys.intern(string) for string in strings) if strings else ()
 
 class Game():
-    def __init__(self, game_id, name, price, rating, description, developer, publisher, recommendations, release_date, metacritic=None, discount_percent=0.00, genres=[], categories=[]):
+    __slots__ = ('game_id', 'name', 'price', 'rating', 'description', 'developer', 'publisher',
+                 'recommendations', 'release_date', 'metacritic', 'discount_percent', 'genres', 'categories')
+
+    def __init__(self, game_id, name, price, rating, description, developer, publisher, recommendations, release_date, metacritic=None, discount_percent=0.00, genres=None, categories=None):
         self.game_id = game_id
         self.name = name
-        self.price = Decimal(price)
-        self.rating = rating
+        self.price = price if isinstance(price, Decimal) else Decimal(price)
+        self.rating = sys.intern(rating) if rating else rating
         self.description =  description
         self.developer = developer
         self.publisher = publisher
@@ -16,8 +24,8 @@ class Game():
         self.release_date = release_date
         self.metacritic = metacritic
         self.discount_percent = discount_percent
-        self.genres = genres
-        self.categories = categories
+        self.genres = intern_all(genres)
+        self.categories = intern_all(categories)
 
     def __eq__(self, other):
         return self.game_id == other.game_id
@@ -57,8 +65,18 @@ class Game():
                             metacritic=f"{self.metacritic}/100" if self.metacritic else 'NA',
                             discount_percent=f"{self.discount_percent*100}%"))
 
+class InventoryEntry():
+    """One title in a user's inventory and how many copies of it they hold."""
+    __slots__ = ('game', 'quantity')
+
+    def __init__(self, game:Game, quantity:int):
+        self.game = game
+        self.quantity = quantity
+
 class Cart():
     """Defines a Cart which holds multiple products and carries a total of their prices."""
+    __slots__ = ('games', 'total')
+
     def __init__(self, games: list[Game]=None, total=Decimal(0.00)):
         self.games = [] if games == None else games
         self.total= total
@@ -87,6 +105,8 @@ class Cart():
 
 class User():
     """Defines a User. Password, not included."""
+    __slots__ = ('user_id', 'username', 'date_of_birth', 'wallet', 'cart')
+
     def __init__(self, user_id, username="", date_of_birth="", wallet=0.00):
         self.user_id=user_id
         self.username = username
@@ -131,7 +151,10 @@ class User():
         print(out)
 
 class Order():
-    def __init__(self, order_id, user_fk, order_date, total_cost, quantities_by_game:list[dict[str:int]]=None):
+    """Defines an Order. quantities_by_game holds a (game name, quantity) pair per line, and is empty for wallet top-ups."""
+    __slots__ = ('order_id', 'user_id', 'order_date', 'total_cost', 'quantities_by_game')
+
+    def __init__(self, order_id, user_fk, order_date, total_cost, quantities_by_game:list[tuple[str, int]]=None):
         self.order_id = order_id
         self.user_id = user_fk
         self.order_date = order_date
@@ -145,9 +168,8 @@ class Order():
         out1 = f"{order.order_id}".ljust(10, ' ') + f"{order.order_date}".ljust(25, ' ') + f"${order.total_cost}".ljust(14, ' ') + "\n"
         out2 = ""
         if order.quantities_by_game:
-            for qty_by_game in order.quantities_by_game:
-                for game in qty_by_game:
-                    out2 += "".ljust(len(header[:header.find("Title")]) - 1, ' ') + f"{game[:30]}".ljust(30, ' ') + f"\tx{qty_by_game[game]}\n"
+            for game, quantity in order.quantities_by_game:
+                out2 += "".ljust(len(header[:header.find("Title")]) - 1, ' ') + f"{game[:30]}".ljust(30, ' ') + f"\tx{quantity}\n"
         else:
             out2 = "".ljust(len(header[:header.find("Title")]) - 1, ' ') + "Added to Wallet\n"
         if include_header:
@@ -9,6 +9,9 @@ class ExistenceError(Exception):
 class InvalidCredentialsError(Exception):
     pass
 
+class InsufficientFundsError(Exception):
+    pass
+
 class InvalidInputError(Exception):
     def __init__(self, valid_keys: list[str], message=""):
         self.valid_keys = valid_keys
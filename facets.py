@@ -0,0 +1,100 @@
+"""Faceted filtering of the store catalog by genre, category, maturity rating and price.
+
+Every facet value has a bitmap of the games it applies to, held as a Python int where bit i stands
+for the i-th game of the catalog. A filter is the AND of the selected bitmaps, and a facet count is
+the number of bits the filter shares with that facet's bitmap, so no query runs per facet.
+"""
+
+from entities import Game
+from bisect import bisect_right
+from decimal import Decimal
+
+class FacetResult():
+    """One page of filtered games, the total number of matches, and the match counts of every facet value."""
+    __slots__ = ('total', 'games', 'counts')
+
+    def __init__(self, total, games:list[Game], counts:dict[str, dict[str, int]]):
+        self.total = total
+        self.games = games
+        self.counts = counts
+
+class FacetIndex():
+    """Bitmaps over a list of games, for every genre, category and rating, and for each price ceiling.
+    ratings maps each rating to its required age and orders ratings for max_rating filters.
+    """
+    def __init__(self, games:list[Game], ratings:dict[str, int]):
+        self.games = list(games)
+        self.ratings = ratings
+        self.all = (1 << len(self.games)) - 1
+        genres, categories, by_rating, by_price = {}, {}, {}, {}
+        for i, game in enumerate(self.games):
+            for genre in game.genres:
+                genres.setdefault(genre, []).append(i)
+            for category in game.categories:
+                categories.setdefault(category, []).append(i)
+            by_rating.setdefault(game.rating, []).append(i)
+            by_price.setdefault(game.price, []).append(i)
+        self.genres = {genre: self.bitmap_of(rows) for genre, rows in genres.items()}
+        self.categories = {category: self.bitmap_of(rows) for category, rows in categories.items()}
+        self.by_rating = {rating: self.bitmap_of(rows) for rating, rows in by_rating.items()}
+
+        # A bitmap of every game at or under each distinct price, so a price ceiling is one lookup.
+        self.prices = sorted(by_price)
+        self.at_or_under_price = []
+        cumulative = 0
+        for price in self.prices:
+            cumulative |= self.bitmap_of(by_price[price])
+            self.at_or_under_price.append(cumulative)
+
+    def bitmap_of(self, rows) -> int:
+        """Returns a bitmap with the bits of the given row indices set."""
+        bits = bytearray((len(self.games) + 7) // 8)
+        for i in rows:
+            bits[i >> 3] |= 1 << (i & 7)
+        return int.from_bytes(bits, 'little')
+
+    def match(self, genres=(), categories=(), max_rating=None, max_price=None):
+        """Returns the bitmap of games that have every given genre and category (ignoring case),
+        a rating whose required age is no higher than max_rating's, and a price no higher than max_price.
+        Rating pending games need no particular age, the same as at checkout.
+        """
+        bitmap = self.all
+        for genre in genres:
+            bitmap &= self.lookup(self.genres, genre)
+        for category in categories:
+            bitmap &= self.lookup(self.categories, category)
+        if max_rating is not None:
+            max_age = self.ratings.get(max_rating.lower(), -1)
+            allowed = 0
+            for rating, required_age in self.ratings.items():
+                if required_age <= max_age:
+                    allowed |= self.by_rating.get(rating, 0)
+            bitmap &= allowed
+        if max_price is not None:
+            i = bisect_right(self.prices, Decimal(max_price))
+            bitmap &= self.at_or_under_price[i - 1] if i else 0
+        return bitmap
+
+    def lookup(self, bitmaps, value):
+        bitmap = bitmaps.get(value)
+        if bitmap is None:
+            value = value.lower()
+            bitmap = next((bitmap for key, bitmap in bitmaps.items() if key.lower() == value), 0)
+        return bitmap
+
+    def counts(self, bitmap):
+        """Returns how many of the matched games have each genre, category and rating, leaving out zero counts."""
+        def count(bitmaps):
+            counts = {value: (bitmap & value_bitmap).bit_count() for value, value_bitmap in bitmaps.items()}
+            return {value: n for value, n in sorted(counts.items(), key=lambda item: -item[1]) if n}
+        return {'genres': count(self.genres), 'categories': count(self.categories), 'ratings': count(self.by_rating)}
+
+    def positions(self, bitmap) -> list[int]:
+        """Returns the indices of the set bits of bitmap, in increasing order."""
+        bits = bin(bitmap)[:1:-1]
+        positions = []
+        i = bits.find('1')
+        while i != -1:
+            positions.append(i)
+            i = bits.find('1', i + 1)
+        return positions
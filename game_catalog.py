@@ -0,0 +1,119 @@
+"""Columnar storage for whole catalogs of games.
+
+A GameCatalog keeps one compact array per column instead of one object per game. Tags are stored
+once in a vocabulary and referenced by small integer ids, so a million-game catalog can be held and
+sorted in a fraction of the memory of a list of Games. Games are only built when a row is read.
+"""
+
+from entities import (Game, intern_all)
+from array import array
+from decimal import Decimal
+import datetime as dt
+import sys
+
+class TagVocabulary():
+    """Maps each distinct tag to a small integer id and back."""
+    def __init__(self):
+        self.tags = []
+        self.ids = {}
+
+    def id(self, tag):
+        tag_id = self.ids.get(tag)
+        if tag_id is None:
+            tag_id = self.ids[tag] = len(self.tags)
+            self.tags.append(sys.intern(tag))
+        return tag_id
+
+class TagColumn():
+    """Each row's tag ids, stored back to back with an offset array marking where each row's tags start."""
+    def __init__(self, vocabulary:TagVocabulary):
+        self.vocabulary = vocabulary
+        self.offsets = array('I', [0])
+        self.tag_ids = array('H')
+
+    def append(self, tags):
+        self.tag_ids.extend(self.vocabulary.id(tag) for tag in tags)
+        self.offsets.append(len(self.tag_ids))
+
+    def row(self, i):
+        return [self.vocabulary.tags[tag_id] for tag_id in self.tag_ids[self.offsets[i]:self.offsets[i + 1]]]
+
+class GameCatalog():
+    """Games held as parallel column arrays. Rows are in the order games were appended.
+    Prices are kept in cents, dates as ordinals and a missing Metacritic score as -1.
+    """
+    def __init__(self):
+        self.game_ids = array('i')
+        self.prices = array('q')
+        self.discounts = array('H')
+        self.release_dates = array('i')
+        self.metacritics = array('h')
+        self.recommendations = array('i')
+        self.names = []
+        self.ratings = []
+        self.descriptions = []
+        self.developers = []
+        self.publishers = []
+        self.genres = TagColumn(TagVocabulary())
+        self.categories = TagColumn(TagVocabulary())
+        self.rows_by_id = {}
+
+    def from_games(games:list[Game]):
+        catalog = GameCatalog()
+        for game in games:
+            catalog.append(game)
+        return catalog
+
+    def __len__(self):
+        return len(self.game_ids)
+
+    def append(self, game:Game):
+        release_date = game.release_date
+        if isinstance(release_date, str):
+            release_date = dt.date.fromisoformat(release_date)
+        self.rows_by_id[game.game_id] = len(self.game_ids)
+        self.game_ids.append(game.game_id)
+        self.prices.append(int(Decimal(game.price) * 100))
+        self.discounts.append(int(Decimal(game.discount_percent or 0) * 100))
+        self.release_dates.append(release_date.toordinal())
+        self.metacritics.append(-1 if game.metacritic is None else game.metacritic)
+        self.recommendations.append(game.recommendations or 0)
+        self.names.append(game.name)
+        self.ratings.append(sys.intern(game.rating) if game.rating else game.rating)
+        self.descriptions.append(game.description)
+        self.developers.append(sys.intern(game.developer))
+        self.publishers.append(sys.intern(game.publisher))
+        self.genres.append(game.genres)
+        self.categories.append(game.categories)
+
+    def game(self, row) -> Game:
+        """Builds the Game stored in the given row."""
+        metacritic = self.metacritics[row]
+        return Game(game_id=self.game_ids[row], name=self.names[row], price=Decimal(self.prices[row]) / 100,
+                    rating=self.ratings[row], description=self.descriptions[row], developer=self.developers[row],
+                    publisher=self.publishers[row], recommendations=self.recommendations[row],
+                    release_date=dt.date.fromordinal(self.release_dates[row]),
+                    metacritic=None if metacritic < 0 else metacritic,
+                    discount_percent=Decimal(self.discounts[row]) / 100,
+                    genres=intern_all(self.genres.row(row)), categories=intern_all(self.categories.row(row)))
+
+    def game_by_id(self, game_id) -> Game:
+        row = self.rows_by_id.get(game_id)
+        return None if row is None else self.game(row)
+
+    def games(self, rows) -> list[Game]:
+        return [self.game(row) for row in rows]
+
+    def sorted_rows(self, sort='date'):
+        """Returns row indices ordered like the store's listings: newest first for 'date',
+        best first for 'metacritic' (skipping unscored games), cheapest first for 'price', or by game_id for 'all'.
+        """
+        rows = range(len(self.game_ids))
+        if sort == 'date':
+            return array('I', sorted(rows, key=lambda i: (self.release_dates[i], self.game_ids[i]), reverse=True))
+        elif sort == 'metacritic':
+            return array('I', sorted((i for i in rows if self.metacritics[i] >= 0),
+                                     key=lambda i: (self.metacritics[i], self.game_ids[i]), reverse=True))
+        elif sort == 'price':
+            return array('I', sorted(rows, key=lambda i: (self.prices[i], self.game_ids[i])))
+        return array('I', sorted(rows, key=lambda i: self.game_ids[i]))
@@ -0,0 +1,137 @@
+"""Generates a synthetic store of any size for testing how the database scales.
+
+Games are scaled up from the templates in init_data.json. Users, orders and inventories are then
+seeded directly into the p1 database, with game popularity and buyer activity following a Zipf-like
+distribution so a few titles and customers account for most sales, as in a real store.
+"""
+
+from init_database import (init_database, insert_batched, load_data)
+from connection import connect_to_mysql
+from migrations import rebuild_sales_summaries
+from collections import Counter
+from decimal import Decimal
+import datetime as dt
+import argparse
+import json
+import random
+import logging
+
+def main():
+    parser = argparse.ArgumentParser(description="Reset the p1 database with a synthetic store.")
+    parser.add_argument('--games', type=int, default=10000, help="number of games")
+    parser.add_argument('--users', type=int, default=1000, help="number of users")
+    parser.add_argument('--orders', type=int, default=10000, help="number of orders")
+    parser.add_argument('--seed', type=int, default=0, help="random seed, for repeatable datasets")
+    parser.add_argument('--batch-size', type=int, default=1000, help="rows per insert and commit")
+    parser.add_argument('--output', default='generated_data.json', help="where to write the generated games")
+    parser.add_argument('--workers', type=int, default=1, help="processes loading the games in parallel")
+    args = parser.parse_args()
+    generate_store(args.games, args.users, args.orders, args.seed, args.batch_size, args.output, args.workers)
+
+def generate_store(n_games, n_users, n_orders, seed=0, batch_size=1000, output='generated_data.json', workers=1):
+    """Resets the database with n_games generated games, then seeds n_users users and n_orders orders."""
+    rng = random.Random(seed)
+    games = generate_games(n_games, rng)
+    with open(output, 'w') as outfile:
+        json.dump(games, outfile)
+    init_database(abort_if_exists=False, data_path=output, bulk=True, batch_size=batch_size, workers=workers)
+
+    cnx = connect_to_mysql()
+    if cnx is None:
+        return
+    cursor = cnx.cursor()
+    seed_users(cnx, cursor, n_users, rng, batch_size)
+    seed_orders(cnx, cursor, games, n_users, n_orders, rng, batch_size)
+    # The orders were inserted around the Dao, so the sales summaries are refilled from them.
+    rebuild_sales_summaries(cnx)
+    cursor.close()
+    cnx.close()
+
+def generate_games(n_games, rng:random.Random) -> list[dict]:
+    """Returns n_games game records shaped like those in init_data.json, varied from its templates."""
+    templates = load_data()
+    games = []
+    for i in range(n_games):
+        template = templates[i % len(templates)]
+        release_date = dt.date(2000, 1, 1) + dt.timedelta(days=rng.randrange(9000))
+        metacritic = template['metacritic']
+        if metacritic is not None:
+            metacritic = min(100, max(20, metacritic + rng.randint(-10, 10)))
+        games.append({
+            'name': template['name'] if i < len(templates) else f"{template['name']} {i // len(templates) + 1}",
+            'price': str(Decimal(rng.choice([0, 499, 999, 1499, 1999, 2999, 3999, 5999, 6999])) / 100),
+            'rating': template['rating'],
+            'description': template['description'],
+            'developer': template['developer'],
+            'publisher': template['publisher'],
+            'recommendations': rng.randrange(100000),
+            'release_date': release_date.strftime('%b %d, %Y'),
+            'metacritic': metacritic,
+            'genres': template['genres'],
+            'categories': template['categories']
+        })
+    return games
+
+def zipf_weights(n, s):
+    """Returns cumulative weights where the item at rank k is picked in proportion to 1/k^s."""
+    weights = []
+    total = 0.0
+    for rank in range(1, n + 1):
+        total += 1 / rank ** s
+        weights.append(total)
+    return weights
+
+def seed_users(cnx, cursor, n_users, rng:random.Random, batch_size=1000):
+    """Inserts n_users users with ids 1..n_users. Every user's password is 'password'."""
+    today = dt.date.today()
+    def users():
+        for user_id in range(1, n_users + 1):
+            date_of_birth = today - dt.timedelta(days=rng.randrange(13 * 366, 70 * 365))
+            yield (user_id, f"user{user_id}", "password", date_of_birth, Decimal(rng.randrange(0, 20000)) / 100)
+    insert_batched(cnx, cursor, "INSERT INTO Users (user_id, username, password, date_of_birth, wallet) VALUES (%s, %s, %s, %s, %s);",
+                   users(), batch_size, "Users", n_users)
+
+def seed_orders(cnx, cursor, games, n_users, n_orders, rng:random.Random, batch_size=1000):
+    """Inserts n_orders orders with their details, then fills User_Game with what each user bought.
+    About one in ten orders is a wallet top-up with no details.
+    """
+    game_weights = zipf_weights(len(games), 1.1)
+    user_weights = zipf_weights(n_users, 0.8)
+    game_ranks = list(range(len(games)))
+    rng.shuffle(game_ranks)
+    prices = [Decimal(game['price']) for game in games]
+    now = dt.datetime.now()
+
+    orders, details = [], []
+    inventory = Counter()
+    for order_id in range(1, n_orders + 1):
+        user_id = rng.choices(range(1, n_users + 1), cum_weights=user_weights)[0]
+        order_date = now - dt.timedelta(seconds=rng.randrange(3 * 365 * 24 * 3600))
+        if rng.random() < 0.1:
+            orders.append((order_id, user_id, order_date, Decimal(rng.choice([5, 10, 20, 50, 100]))))
+            continue
+
+        lines = Counter()
+        for rank in rng.choices(game_ranks, cum_weights=game_weights, k=rng.choice([1, 1, 1, 2, 2, 3, 5])):
+            lines[rank + 1] += 1
+        total_cost = Decimal(0)
+        for game_id, quantity in lines.items():
+            total_cost += prices[game_id - 1] * quantity
+            details.append((order_id, game_id, quantity))
+            inventory[(user_id, game_id)] += quantity
+        orders.append((order_id, user_id, order_date, total_cost))
+
+    insert_batched(cnx, cursor, "INSERT INTO Orders (order_id, user_fk, order_date, total_cost) VALUES (%s, %s, %s, %s);",
+                   orders, batch_size, "Orders", len(orders))
+    insert_batched(cnx, cursor, "INSERT INTO OrderDetails (order_fk, game_fk, quantity) VALUES (%s, %s, %s);",
+                   details, batch_size, "OrderDetails", len(details))
+    insert_batched(cnx, cursor, "INSERT INTO User_Game (user_fk, game_fk, quantity_in_inventory) VALUES (%s, %s, %s);",
+                   ((user_id, game_id, quantity) for (user_id, game_id), quantity in inventory.items()),
+                   batch_size, "User_Game", len(inventory))
+
+
+if __name__ == "__main__":
+    logging.basicConfig(filename="logs/p1.log",
+                level=logging.INFO,
+                format='%(asctime)s :: %(levelname)s :: %(message)s')
+    main()
@@ -5,8 +5,18 @@ Useful for initializing the database for the first time, or for resetting the da
 import mysql.connector
 import mysql.connector.cursor 
 import mysql_config as config
+from migrations import migrate
+from connection import connect_to_mysql
+from concurrent.futures import (ProcessPoolExecutor, wait, FIRST_COMPLETED)
 import datetime as dt
+from itertools import islice
+import multiprocessing
+import argparse
 import json
+import queue
+import re
+import threading
+import time
 import logging
 
 logger = None
@@ -14,11 +24,27 @@ if __name__ != "__main__":
     logger = logging.getLogger(__name__)
 
 def main():
-    init_database(abort_if_exists=False)
+    parser = argparse.ArgumentParser(description="Reset the p1 database with baked-in game data.")
+    parser.add_argument('--data', default='init_data.json', help="JSON file of games to load")
+    parser.add_argument('--bulk', action='store_true', help="stream the file and load it with batched multi-row inserts")
+    parser.add_argument('--batch-size', type=int, default=1000, help="rows per insert and commit in bulk mode")
+    parser.add_argument('--workers', type=int, default=1, help="processes loading in parallel in bulk mode, each with its own connection")
+    parser.add_argument('--compare', action='store_true', help="load with one connection first, then with --workers, and report the speedup")
+    args = parser.parse_args()
+    if args.compare:
+        single = init_database(abort_if_exists=False, data_path=args.data, bulk=True, batch_size=args.batch_size)
+        parallel = init_database(abort_if_exists=False, data_path=args.data, bulk=True, batch_size=args.batch_size, workers=args.workers)
+        if single and parallel:
+            print(f"One connection: {single:.2f}s, {args.workers} workers: {parallel:.2f}s, speedup {single / parallel:.2f}x")
+    else:
+        init_database(abort_if_exists=False, data_path=args.data, bulk=args.bulk, batch_size=args.batch_size, workers=args.workers)
 
-def init_database(abort_if_exists=True):
+def init_database(abort_if_exists=True, data_path='init_data.json', bulk=False, batch_size=1000, workers=1):
     """Initializes/Resets database with baked in game data.
     Set abort_if_exists to True stop the database from being reset if it already exists.
+    Set bulk to True to load with multi-row inserts committed every batch_size rows, which is much faster for large datasets.
+    Set workers above 1 with bulk to split the load across that many processes, each with its own connection.
+    Returns how many seconds loading the data took, or None if the database was not reset.
     """
     # Connect to the MySQL database.
     try:
@@ -39,6 +65,11 @@ def init_database(abort_if_exists=True):
     if abort_if_exists:
         cursor.execute("SHOW DATABASES LIKE 'p1';")
         if cursor.fetchall():
+            # Bring an existing database up to the current schema instead of resetting it.
+            cursor.execute("USE p1;")
+            migrate(cnx)
+            cursor.close()
+            cnx.close()
             return
     
     logger.warning("Resetting database")
@@ -48,7 +79,17 @@ def init_database(abort_if_exists=True):
     cursor.execute("USE p1;")
     drop_tables(cursor)
     create_tables(cursor)
-    insert_data(cursor)
+    start = time.perf_counter()
+    if bulk and workers > 1:
+        parallel_insert_data(cnx, cursor, data_path, batch_size, workers)
+    elif bulk:
+        bulk_insert_data(cnx, cursor, data_path, batch_size)
+    else:
+        insert_data(cursor, data_path)
+    cnx.commit()
+    load_seconds = time.perf_counter() - start
+    # Indexes are built once the data is in, which is faster than maintaining them row by row.
+    migrate(cnx)
 
     # Close cursor and database connection.
     cursor.close()
@@ -58,9 +99,14 @@ def init_database(abort_if_exists=True):
 
     cnx.close()
     logger.info("Closed connection")
+    return load_seconds
 
 def drop_tables(cursor):
     """Drop all tables in the database."""
+    cursor.execute("DROP TABLE IF EXISTS SalesTotals;")
+    cursor.execute("DROP TABLE IF EXISTS GameSales;")
+    cursor.execute("DROP TABLE IF EXISTS UserSpend;")
+    cursor.execute("DROP TABLE IF EXISTS DailySales;")
     cursor.execute("DROP TABLE IF EXISTS User_Game;")
     cursor.execute("DROP TABLE IF EXISTS Game_Category;")
     cursor.execute("DROP TABLE IF EXISTS Game_Genre;")
@@ -71,6 +117,7 @@ def drop_tables(cursor):
     cursor.execute("DROP TABLE IF EXISTS Genres;")
     cursor.execute("DROP TABLE IF EXISTS Categories;")
     cursor.execute("DROP TABLE IF EXISTS Ratings;")
+    cursor.execute("DROP TABLE IF EXISTS SchemaVersion;")
 
 def create_tables(cursor):
     """Build the structure of the database."""
@@ -197,51 +244,41 @@ def create_tables(cursor):
         """
     )
 
-def insert_data(cursor):
-    # Load baked-in data that will be inserted into the database.
-    with open('init_data.json') as infile:
-        data = json.load(infile)
+def load_data(data_path='init_data.json'):
+    """Loads baked-in data that will be inserted into the database."""
+    with open(data_path) as infile:
+        return json.load(infile)
 
-    # First, insert data into parent tables.
+def game_values(game):
+    """Returns the Games column values for a game record, in the order used by the insert queries."""
+    release_date = dt.datetime.strptime(game['release_date'], '%b %d, %Y')
+    return [game['name'], game['price'], game['rating'], game['description'], game['developer'],
+            game['publisher'], game['recommendations'], str(release_date.date()), game['metacritic']]
+
+def insert_ratings(cursor):
     insert_query = """INSERT INTO Ratings (rating, required_age) 
                 VALUES ('e', 0), ('e10', 10), ('t', 13), ('m', 17), ('ao', 18), ('rp', 0);"""
     cursor.execute(insert_query)
 
+def insert_data(cursor, data_path='init_data.json'):
+    data = load_data(data_path)
+
+    # First, insert data into parent tables.
+    insert_ratings(cursor)
+
     unique_genres = list({genre for game in data for genre in game['genres']})
-    insert_query = "INSERT INTO Genres (genre) VALUES "
-    for genre in unique_genres:
-        if unique_genres.index(genre) == len(unique_genres) - 1:
-            insert_query += "(%s);"
-        else:
-            insert_query += "(%s), "
+    insert_query = "INSERT INTO Genres (genre) VALUES " + ", ".join(["(%s)"] * len(unique_genres)) + ";"
     cursor.execute(insert_query, unique_genres)
 
     unique_categories = list({category for game in data for category in game['categories']})
-    insert_query = "INSERT INTO Categories (category) VALUES "
-    for category in unique_categories:
-        if unique_categories.index(category) == len(unique_categories) - 1:
-            insert_query += "(%s);"
-        else:
-            insert_query += "(%s), "
+    insert_query = "INSERT INTO Categories (category) VALUES " + ", ".join(["(%s)"] * len(unique_categories)) + ";"
     cursor.execute(insert_query, unique_categories)
 
     insert_query = ("INSERT INTO Games "
                 "(name, price, rating, description, developer, publisher, recommendations, release_date, metacritic) "
                 "VALUES (%s, %s, %s, %s, %s, %s, %s, %s, %s);")
     for game in data:
-        release_date = dt.datetime.strptime(game['release_date'], '%b %d, %Y')
-        insert_data = {
-            'name': game['name'],
-            'price': game['price'],
-            'rating': game['rating'],
-            'description': game['description'],
-            'developer': game['developer'],
-            'publisher': game['publisher'],
-            'recommendations': game['recommendations'],
-            'release_date': str(release_date.date()),
-            'metacritic': game['metacritic']
-        }
-        cursor.execute(insert_query, list(insert_data.values()))
+        cursor.execute(insert_query, game_values(game))
     
     # Then, insert data into child tables.
     insert_query = "INSERT INTO Game_Genre (game_fk, genre) VALUES (%s, %s);"
@@ -257,6 +294,271 @@ def insert_data(cursor):
         for category in game['categories']:
             cursor.execute(insert_query, (game_id, category))
         game_id += 1
+
+def bulk_insert_data(cnx, cursor, data_path='init_data.json', batch_size=1000):
+    """Inserts baked-in data with multi-row inserts, committing and printing progress every batch_size games.
+    The file is streamed: a reader thread parses games while this thread writes the previous batch, and
+    only a few batches are held in memory however large the file is. Each batch inserts the genres and
+    categories not seen before, then its games and their links, so the tag tables never need the whole file.
+    Game ids are assigned explicitly so the link tables do not depend on auto-increment behavior.
+    """
+    insert_ratings(cursor)
+    cnx.commit()
+
+    genres, categories = set(), set()
+    game_id = 0
+    start = time.perf_counter()
+    for batch in read_batches(data_path, batch_size):
+        game_rows, genre_rows, category_rows, new_genres, new_categories = batch_rows(batch, game_id + 1, genres, categories)
+        game_id += len(batch)
+        insert_tags(cursor, new_genres, new_categories)
+        insert_game_rows(cursor, game_rows, genre_rows, category_rows)
+        cnx.commit()
+        rate = game_id / max(time.perf_counter() - start, 1e-9)
+        print(f"\rGames: {game_id} games ({rate:,.0f} games/sec)", end="", flush=True)
+    print(f"\rGames: {game_id} games, {len(genres)} genres and {len(categories)} categories in {time.perf_counter() - start:.2f}s".ljust(60))
+    logger.info("Bulk inserted %s games", game_id)
+
+def parallel_insert_data(cnx, cursor, data_path='init_data.json', batch_size=1000, workers=4):
+    """Inserts baked-in data like bulk_insert_data, but hands each batch of games and links to one of
+    workers processes, each writing through its own connection with foreign key and unique checks off.
+    This process streams the file and inserts the tags. Once every batch is in, the relationships the
+    skipped checks would have enforced are verified, and any violations are reported.
+    """
+    insert_ratings(cursor)
+    cnx.commit()
+
+    genres, categories = set(), set()
+    game_id = 0
+    pending = set()
+    start = time.perf_counter()
+    # Workers are spawned rather than forked, since the file reader thread is already running.
+    with ProcessPoolExecutor(max_workers=workers, initializer=init_worker, mp_context=multiprocessing.get_context('spawn')) as executor:
+        for batch in read_batches(data_path, batch_size):
+            game_rows, genre_rows, category_rows, new_genres, new_categories = batch_rows(batch, game_id + 1, genres, categories)
+            game_id += len(batch)
+            if new_genres or new_categories:
+                insert_tags(cursor, new_genres, new_categories)
+                cnx.commit()
+            pending.add(executor.submit(load_rows, game_rows, genre_rows, category_rows))
+            # Keep only a couple of batches per worker in flight, so memory stays bounded by the batch size.
+            if len(pending) >= workers * 2:
+                done, pending = wait(pending, return_when=FIRST_COMPLETED)
+                for future in done:
+                    future.result()
+            rate = game_id / max(time.perf_counter() - start, 1e-9)
+            print(f"\rGames: {game_id} games ({rate:,.0f} games/sec, {workers} workers)", end="", flush=True)
+        for future in pending:
+            future.result()
+    print(f"\rGames: {game_id} games, {len(genres)} genres and {len(categories)} categories "
+          f"in {time.perf_counter() - start:.2f}s with {workers} workers".ljust(60))
+    logger.info("Parallel inserted %s games with %s workers", game_id, workers)
+
+    violations = check_constraints(cursor)
+    for description, count in violations:
+        print(f"Constraint check failed: {count} {description}")
+        logger.error("Constraint check failed after parallel load :: %s %s", count, description)
+    if not violations:
+        print("Constraint checks passed")
+
+def batch_rows(batch, first_game_id, genres:set, categories:set):
+    """Returns the Games, Game_Genre and Game_Category rows for a batch of game records, numbered from first_game_id,
+    and the genre and category rows not already in genres and categories, which are updated with them.
+    Tags are compared ignoring case, as the tag tables do.
+    """
+    game_rows, genre_rows, category_rows, new_genres, new_categories = [], [], [], [], []
+    for game_id, game in enumerate(batch, start=first_game_id):
+        game_rows.append([game_id] + game_values(game))
+        for genre in game['genres']:
+            if genre.lower() not in genres:
+                genres.add(genre.lower())
+                new_genres.append((genre,))
+            genre_rows.append((game_id, genre))
+        for category in game['categories']:
+            if category.lower() not in categories:
+                categories.add(category.lower())
+                new_categories.append((category,))
+            category_rows.append((game_id, category))
+    return game_rows, genre_rows, category_rows, new_genres, new_categories
+
+def insert_tags(cursor, genre_rows, category_rows):
+    if genre_rows:
+        cursor.executemany("INSERT IGNORE INTO Genres (genre) VALUES (%s);", genre_rows)
+    if category_rows:
+        cursor.executemany("INSERT IGNORE INTO Categories (category) VALUES (%s);", category_rows)
+
+def insert_game_rows(cursor, game_rows, genre_rows, category_rows):
+    cursor.executemany("INSERT INTO Games "
+                "(game_id, name, price, rating, description, developer, publisher, recommendations, release_date, metacritic) "
+                "VALUES (%s, %s, %s, %s, %s, %s, %s, %s, %s, %s);", game_rows)
+    if genre_rows:
+        cursor.executemany("INSERT IGNORE INTO Game_Genre (game_fk, genre) VALUES (%s, %s);", genre_rows)
+    if category_rows:
+        cursor.executemany("INSERT IGNORE INTO Game_Category (game_fk, category) VALUES (%s, %s);", category_rows)
+
+# The connection of a parallel load worker process, opened by init_worker.
+worker_cnx = None
+
+def init_worker():
+    """Opens this worker process's connection, with foreign key and unique checks off for the length of the load."""
+    global worker_cnx
+    worker_cnx = connect_to_mysql()
+    if worker_cnx:
+        with worker_cnx.cursor() as cursor:
+            cursor.execute("SET SESSION foreign_key_checks = 0;")
+            cursor.execute("SET SESSION unique_checks = 0;")
+
+def load_rows(game_rows, genre_rows, category_rows):
+    """Inserts one batch of games and their links through this worker's connection, as one transaction."""
+    if worker_cnx is None:
+        raise RuntimeError("Parallel load worker could not connect to MySQL")
+    with worker_cnx.cursor() as cursor:
+        insert_game_rows(cursor, game_rows, genre_rows, category_rows)
+    worker_cnx.commit()
+    return len(game_rows)
+
+# Each query counts the rows breaking a relationship that foreign key checks would have enforced.
+CONSTRAINT_CHECKS = [
+    ("games with an unknown rating",
+     "SELECT COUNT(*) FROM Games g LEFT JOIN Ratings r ON g.rating = r.rating WHERE g.rating IS NOT NULL AND r.rating IS NULL;"),
+    ("Game_Genre rows with no game",
+     "SELECT COUNT(*) FROM Game_Genre gg LEFT JOIN Games g ON gg.game_fk = g.game_id WHERE g.game_id IS NULL;"),
+    ("Game_Genre rows with an unknown genre",
+     "SELECT COUNT(*) FROM Game_Genre gg LEFT JOIN Genres g ON gg.genre = g.genre WHERE g.genre IS NULL;"),
+    ("Game_Category rows with no game",
+     "SELECT COUNT(*) FROM Game_Category gc LEFT JOIN Games g ON gc.game_fk = g.game_id WHERE g.game_id IS NULL;"),
+    ("Game_Category rows with an unknown category",
+     "SELECT COUNT(*) FROM Game_Category gc LEFT JOIN Categories c ON gc.category = c.category WHERE c.category IS NULL;")
+]
+
+def check_constraints(cursor):
+    """Returns a (description, count) for every relationship in CONSTRAINT_CHECKS that some rows break."""
+    violations = []
+    for description, query in CONSTRAINT_CHECKS:
+        cursor.execute(query)
+        count = cursor.fetchone()[0]
+        if count:
+            violations.append((description, count))
+    return violations
+
+def read_batches(data_path, batch_size, depth=2):
+    """Yields lists of up to batch_size game records from the JSON array in data_path.
+    Parsing runs on its own thread, at most depth batches ahead of the caller, so reading the file
+    overlaps with writing to the database and memory is bounded by the batch size, not the file size.
+    """
+    batches = queue.Queue(maxsize=depth)
+    stop = threading.Event()
+
+    def put(item):
+        while not stop.is_set():
+            try:
+                batches.put(item, timeout=0.1)
+                return
+            except queue.Full:
+                pass
+
+    def produce():
+        try:
+            records = iter_json_array(data_path)
+            while not stop.is_set():
+                batch = list(islice(records, batch_size))
+                put(batch)
+                if not batch:
+                    return
+        except Exception as e:
+            put(e)
+
+    reader = threading.Thread(target=produce, name="json-reader", daemon=True)
+    reader.start()
+    try:
+        while True:
+            batch = batches.get()
+            if isinstance(batch, Exception):
+                raise batch
+            if not batch:
+                return
+            yield batch
+    finally:
+        stop.set()
+        reader.join()
+
+# Characters that may continue a JSON number.
+NUMBER_TAIL = re.compile(r"[0-9+\-.eE]*")
+
+def iter_json_array(path, chunk_size=1 << 20):
+    """Yields the items of the JSON array in the file at path one at a time.
+    The file is read chunk_size characters at a time, so memory holds about one chunk and one item.
+    Raises ValueError if the file is not a well-formed JSON array.
+    """
+    decoder = json.JSONDecoder()
+    with open(path) as infile:
+        buffer, pos = "", 0
+        state = 'start'
+        while True:
+            while pos < len(buffer) and buffer[pos].isspace():
+                pos += 1
+            if pos == len(buffer):
+                chunk = infile.read(chunk_size)
+                if not chunk:
+                    raise ValueError(f"Unexpected end of the JSON array in [{path}]")
+                buffer, pos = buffer[pos:] + chunk, 0
+                continue
+
+            char = buffer[pos]
+            if state == 'start':
+                if char != '[':
+                    raise ValueError(f"[{path}] does not hold a JSON array")
+                pos += 1
+                state = 'first'
+            elif char == ']' and state in ('first', 'separator'):
+                return
+            elif state == 'separator':
+                if char != ',':
+                    raise ValueError(f"Expected ',' or ']' between the items of the JSON array in [{path}]")
+                pos += 1
+                state = 'item'
+            else:
+                try:
+                    item, end = decoder.raw_decode(buffer, pos)
+                    # A number, true, false or null is only known to be whole once a character that cannot
+                    # continue it follows. If only number characters are left, it may go on in the next chunk.
+                    complete = isinstance(item, (dict, list, str)) or NUMBER_TAIL.match(buffer, end).end() < len(buffer)
+                except json.JSONDecodeError:
+                    complete = False
+                if not complete:
+                    chunk = infile.read(chunk_size)
+                    if chunk:
+                        buffer, pos = buffer[pos:] + chunk, 0
+                        continue
+                    item, end = decoder.raw_decode(buffer, pos)
+                yield item
+                pos = end
+                state = 'separator'
+                # Drop what has been parsed so the buffer does not grow with the file.
+                if pos > chunk_size:
+                    buffer, pos = buffer[pos:], 0
+
+def insert_batched(cnx, cursor, insert_query, rows, batch_size, label, total=None):
+    """Inserts rows batch_size at a time, committing after each batch and printing rows/sec progress.
+    executemany rewrites a single-row INSERT into one multi-row INSERT per batch.
+    Returns the number of rows inserted.
+    """
+    rows = iter(rows)
+    inserted = 0
+    start = time.perf_counter()
+    while True:
+        batch = list(islice(rows, batch_size))
+        if not batch:
+            break
+        cursor.executemany(insert_query, batch)
+        cnx.commit()
+        inserted += len(batch)
+        rate = inserted / max(time.perf_counter() - start, 1e-9)
+        progress = f"{inserted}/{total}" if total else f"{inserted}"
+        print(f"\r{label}: {progress} rows ({rate:,.0f} rows/sec)", end="", flush=True)
+    print(f"\r{label}: {inserted} rows in {time.perf_counter() - start:.2f}s".ljust(60))
+    logger.info("Bulk inserted %s rows into %s", inserted, label)
+    return inserted
     
 
 if __name__ == "__main__":
@@ -0,0 +1,135 @@
+"""Load generator for the store API.
+
+Simulates concurrent shoppers against a running api.py, each logged in as one of the users seeded by
+generate_data.py (user1, user2, ..., all with the password 'password'). Each shopper browses, searches,
+views games, checks their inventory and orders, and now and then tops up their wallet and checks out.
+Reports requests/sec and latency percentiles overall and per endpoint as JSON.
+
+    python api.py &
+    python loadtest.py --shoppers 50 --seconds 30
+"""
+
+from benchmark import percentile
+from urllib.request import (Request, urlopen)
+from urllib.error import HTTPError
+import argparse
+import json
+import random
+import threading
+import time
+
+def main():
+    parser = argparse.ArgumentParser(description="Load test the store API.")
+    parser.add_argument('--url', default='http://127.0.0.1:8000', help="base URL of the running API")
+    parser.add_argument('--shoppers', type=int, default=20, help="concurrent simulated shoppers")
+    parser.add_argument('--seconds', type=float, default=30, help="how long to run")
+    parser.add_argument('--users', type=int, default=1000, help="number of seeded users to log in as")
+    parser.add_argument('--seed', type=int, default=0, help="random seed, for repeatable runs")
+    parser.add_argument('--output', help="file to write the JSON report to, default stdout")
+    args = parser.parse_args()
+
+    report = run_load_test(args.url, args.shoppers, args.seconds, args.users, args.seed)
+    if args.output:
+        with open(args.output, 'w') as outfile:
+            json.dump(report, outfile, indent=2)
+    else:
+        print(json.dumps(report, indent=2))
+
+class Client():
+    """Calls the API for one shopper, recording the latency and status of every request."""
+    def __init__(self, base_url, results, results_lock):
+        self.base_url = base_url
+        self.results = results
+        self.results_lock = results_lock
+        self.token = None
+
+    def call(self, method, path, body=None, endpoint=None):
+        data = json.dumps(body).encode() if body is not None else None
+        request = Request(self.base_url + path, data=data, method=method)
+        request.add_header('Content-Type', 'application/json')
+        if self.token:
+            request.add_header('Authorization', f"Bearer {self.token}")
+
+        start = time.perf_counter()
+        try:
+            with urlopen(request) as response:
+                status, payload = response.status, json.loads(response.read())
+        except HTTPError as e:
+            status, payload = e.code, json.loads(e.read() or b"{}")
+        except OSError:
+            status, payload = 0, {}
+        elapsed = time.perf_counter() - start
+
+        with self.results_lock:
+            self.results.setdefault(endpoint or f"{method} {path}", []).append((elapsed, status))
+        return status, payload
+
+def shop(client:Client, username, deadline, rng:random.Random):
+    """Runs one shopper's session until deadline."""
+    status, payload = client.call('POST', "/login", {'username': username, 'password': "password"}, "POST /login")
+    if status != 200:
+        return
+    client.token = payload['token']
+
+    while time.perf_counter() < deadline:
+        sort = rng.choice(['all', 'date', 'metacritic'])
+        _, payload = client.call('GET', f"/games?sort={sort}&limit=5", endpoint="GET /games")
+        games = payload.get('games', [])
+        if rng.random() < 0.3:
+            client.call('GET', f"/games/search?q={rng.choice(['action', 'adventure', 'puzzle', 'war', 'space'])}",
+                        endpoint="GET /games/search")
+        if games:
+            game = rng.choice(games)
+            client.call('GET', f"/games/{game['game_id']}", endpoint="GET /games/{gID}")
+            if rng.random() < 0.2:
+                client.call('POST', "/cart", {'game_id': game['game_id']}, "POST /cart")
+                client.call('POST', "/wallet", {'amount': "50"}, "POST /wallet")
+                client.call('POST', "/checkout", {}, "POST /checkout")
+        if rng.random() < 0.2:
+            client.call('GET', "/inventory", endpoint="GET /inventory")
+        if rng.random() < 0.2:
+            client.call('GET', "/orders", endpoint="GET /orders")
+
+    client.call('POST', "/logout", {}, "POST /logout")
+
+def run_load_test(base_url, shoppers=20, seconds=30, users=1000, seed=0):
+    """Runs shoppers concurrent sessions for the given number of seconds and returns the report."""
+    results = {}
+    results_lock = threading.Lock()
+    deadline = time.perf_counter() + seconds
+    threads = []
+    for i in range(shoppers):
+        client = Client(base_url, results, results_lock)
+        rng = random.Random(seed + i)
+        thread = threading.Thread(target=shop, args=(client, f"user{rng.randint(1, users)}", deadline, rng))
+        threads.append(thread)
+
+    start = time.perf_counter()
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    elapsed = time.perf_counter() - start
+
+    all_latencies = sorted(latency for calls in results.values() for latency, _ in calls)
+    return {
+        'meta': {'url': base_url, 'shoppers': shoppers, 'seconds': round(elapsed, 3), 'seed': seed},
+        'overall': summarize(all_latencies, sum(1 for calls in results.values() for _, status in calls if status >= 500 or status == 0), elapsed),
+        'endpoints': {endpoint: summarize(sorted(latency for latency, _ in calls),
+                                          sum(1 for _, status in calls if status >= 500 or status == 0), elapsed)
+                      for endpoint, calls in sorted(results.items())}
+    }
+
+def summarize(sorted_latencies, errors, elapsed):
+    return {
+        'requests': len(sorted_latencies),
+        'errors': errors,
+        'requests_per_sec': len(sorted_latencies) / elapsed if elapsed else 0.0,
+        'p50_ms': percentile(sorted_latencies, 50) * 1000,
+        'p95_ms': percentile(sorted_latencies, 95) * 1000,
+        'p99_ms': percentile(sorted_latencies, 99) * 1000
+    }
+
+
+if __name__ == "__main__":
+    main()
@@ -104,29 +104,20 @@ def user_mode(user:User):
             print(e)
 
 def user_order_history(user_id):
-    recent_orders = service.get_recent_orders_by_user(user_id)
-    if not recent_orders: 
-        recent_orders = []
-
     print(f"Orders by uID [{user_id}]\n")
-    start = 0
-    end = 5 if len(recent_orders) >= 5 else len(recent_orders)
-    while end <= len(recent_orders):
-        for i in range(start, end):
-            if i < len(recent_orders):
-                if i == start:
-                    recent_orders[i].show(include_header=True)
-                else:
-                    recent_orders[i].show()
-        else:
-            option = input("What would you like to do?\n" +
-                    "[Enter] to load more orders\n"
-                    "[B]ack\n" +
-                    ">> ").upper()
-            if option == 'B':
-                break
-        start = end
-        end = end + 5 if end + 5 <= len(recent_orders) else len(recent_orders)
+    page_orders(service.iter_order_pages(user_id))
+
+def page_orders(pages):
+    """View pages of orders, loading the next page only when asked."""
+    for page in pages:
+        for i, order in enumerate(page):
+            order.show(include_header=(i == 0))
+        option = input("What would you like to do?\n" +
+                "[Enter] to load more orders\n"
+                "[B]ack\n" +
+                ">> ").upper()
+        if option == 'B':
+            break
 
 def view_user_inventory(user:User):
     while True:
@@ -134,10 +125,9 @@ def view_user_inventory(user:User):
             print()
             print(f"{user.username}'s Inventory".center(30, '='))
             print("gID\t" + "Qty\t" + "Title")
-            games = service.get_games_in_user_inventory(user)
-            unique_games = sorted(set(games), key=lambda game: game.game_id)
-            for game in unique_games:
-                print(f"{game.game_id}\t" + f"{[game.game_id for game in games].count(game.game_id)}\t" + f"{game.name}")
+            inventory = service.get_user_inventory(user) or []
+            for entry in inventory:
+                print(f"{entry.game.game_id}\t" + f"{entry.quantity}\t" + f"{entry.game.name}")
 
             option = input("\nWhat would you like to do?\n" +
                             "Gift game to user -> (gID) (username)\n"
@@ -145,7 +135,9 @@ def view_user_inventory(user:User):
                             ">> ")
             option_parts = option.split(' ')
             if len(option_parts) == 2 and option_parts[0].isnumeric():
-                if service.gift_game_to_user(option_parts[0], user.user_id, option_parts[1]):
+                if option_parts[0] not in {str(entry.game.game_id) for entry in inventory}:
+                    print("You do not have that game.")
+                elif service.gift_game_to_user(option_parts[0], user.user_id, option_parts[1]):
                     print("\nGift received!")
             elif option.upper() == 'B':
                 break
@@ -184,66 +176,99 @@ def browse_store(user:User):
     while True:
         try:
             option = input("\nSearch Filter\n"
+                        "[S]earch by keyword\n"
+                        "[F]ilter by genre, category, rating and price\n"
                         "Get [A]ll games\n"
                         "Games by Release [D]ate\n"
                         "Games by [M]etacritic score\n"
                         "[B]ack\n"
                         ">> ").upper()
-            if option == 'A':
-                games = service.get_all_games()
+            if option == 'S':
+                query = input("\nEnter keywords\n" + ">> ")
+                pages = service.iter_search_pages(query, page_size=5)
+                break
+            elif option == 'F':
+                pages = filter_store()
+                break
+            elif option == 'A':
+                pages = service.iter_games_pages('all', page_size=5)
                 break
             elif option == 'D':
-                games = service.get_games_ordered_by_date()
+                pages = service.iter_games_pages('date', page_size=5)
                 break
             elif option == 'M':
-                games = service.get_games_ordered_by_metacritic()
+                pages = service.iter_games_pages('metacritic', page_size=5)
                 break
             elif option == 'B':
                 return
             else:
-                raise InvalidInputError(['a', 'd', 'm', 'b'])
+                raise InvalidInputError(['s', 'f', 'a', 'd', 'm', 'b'])
         except InvalidInputError as e:
             print(e)
 
-    # View 5 games at a time.
-    start = 0
-    end = 5 if len(games) >= 5 else len(games)
-    while end <= len(games):
-        for i in range(start, end):
-            if i < len(games):
-                game = games[i]
+    # View 5 games at a time, loading each page only when asked.
+    for page in pages:
+        page_ids = {str(game.game_id) for game in page}
+        while True:
+            for game in page:
                 game.show_truncated()
-        else:
             option = input("[Game ID] to view more details\n"
                 "[Enter] to load more games\n"
                 "[B]ack\n"
                 ">> ").upper()
             print()
-            if option in [str(game.game_id) for game in games]:
+            if option in page_ids:
                 view_game(option, user)
                 continue
-            elif option == 'B':
-                break
-        start = end
-        end = end + 5 if end + 5 <= len(games) else len(games)
+            break
+        if option == 'B':
+            break
+
+def filter_store():
+    """Ask for filters, show how many games match each facet, and return the pages of matching games."""
+    def split(option):
+        return [value.strip() for value in option.split(',') if value.strip()]
+
+    genres = split(input("\nGenres to include \t [genre1, genre2, ...]\n" + "[Enter] for any\n" + ">> "))
+    categories = split(input("\nCategories to include \t [category1, category2, ...]\n" + "[Enter] for any\n" + ">> "))
+    max_rating = input("\nHighest maturity rating \t [e, e10, t, m, ao]\n" + "[Enter] for any\n" + ">> ").strip().lower() or None
+    max_price = input("\nHighest price\n" + "[Enter] for any\n" + ">> $").strip()
+    max_price = max_price if max_price.replace('.', '', 1).isnumeric() else None
+
+    result = service.filter_games(genres, categories, max_rating, max_price, limit=0)
+    print(f"\n{result.total} games match")
+    for facet, counts in result.counts.items():
+        if counts:
+            print(f"{facet.capitalize()}: " + ", ".join(f"{value} ({count})" for value, count in list(counts.items())[:8]))
+    print()
+    return service.iter_filter_pages(genres, categories, max_rating, max_price, page_size=5)
 
 def view_game(game_id, user:User):
     """Display detailed information about the given game and provide the option to buy it"""
     game = service.get_game_by_id(game_id)
     if game:
+        also_bought = service.eligible_games(user, service.get_recommendations(game.game_id, k=5))
+        also_bought_ids = {str(other.game_id) for other in also_bought}
         while True:
             try:
                 game.show_detailed()
+                if also_bought:
+                    print("Customers also bought:")
+                    for other in also_bought:
+                        print(f"\t[{other.game_id}] {other.name} - ${other.price}")
+                    print()
                 user.show_wallet()
                 option = input(f"[A]dd {game.name} to cart?\n"
+                            + ("[Game ID] to view a game customers also bought\n" if also_bought else "") +
                             "[B]ack\n"
                             ">> ").upper()
-                if option == 'A':
+                if option in also_bought_ids:
+                    view_game(option, user)
+                elif option == 'A':
                     user.cart.add(game, game.price)
                     if user.will_purchase():
                         if service.purchase_games(user, user.cart.games):
                             print("\nPurchase successful!")
-                            service.add_games_to_user(user, user.cart.games)
                             user.cart.empty()
                     else:
                         continue
@@ -276,6 +301,8 @@ def admin_mode():
                         "View [U]sers\n" +
                         "View [O]rders\n" +
                         "Add [G]ame to store inventory\n" +
+                        "Sales [R]eport\n" +
+                        "Query [S]tats\n" +
                         "[L]og out\n" +
                         ">> ").upper()
             if option == 'U':
@@ -284,12 +311,16 @@ def admin_mode():
                 admin_view_orders()
             elif option == 'G':
                 admin_add_game()
+            elif option == 'R':
+                admin_view_sales_report()
+            elif option == 'S':
+                admin_view_query_stats()
             elif option == 'L':
                 print("Logging out...")
                 logger.info("Admin logged out")
                 break
             else:
-                raise InvalidInputError(valid_keys=['u', 'o', 'g', 'l'])
+                raise InvalidInputError(valid_keys=['u', 'o', 'g', 'r', 's', 'l'])
         except InvalidInputError as e:
             print(e)
 
@@ -336,26 +367,65 @@ def admin_view_users():
         end = end + 5 if end + 5 <= len(users) else len(users)
 
 def admin_view_orders():
-    recent_orders = service.get_recent_orders()
-    start = 0
-    end = 5 if len(recent_orders) >= 5 else len(recent_orders)
-    while end <= len(recent_orders):
-        for i in range(start, end):
-            if i < len(recent_orders):
-                if i == start:
-                    recent_orders[i].show(include_header=True)
-                else:
-                    recent_orders[i].show()
-        else:
-            option = input("What would you like to do?\n" +
-                    "[Enter] to load more orders\n"
-                    "[B]ack\n" +
-                    ">> ").upper()
-            if option == 'B':
-                break
-        start = end
-        end = end + 5 if end + 5 <= len(recent_orders) else len(recent_orders)
+    page_orders(service.iter_order_pages())
     
+def admin_view_sales_report():
+    """View the best-selling games, recent daily sales, the biggest spenders and the all-time totals."""
+    report = service.get_sales_report(limit=10, days=14)
+    if report is None:
+        print("Could not load the sales report.")
+        return
+    totals = report['totals']
+    print(f"\nAll time: {totals['orders']} orders, ${totals['revenue']:.2f} revenue, "
+          f"{totals['top_ups']} wallet top-ups worth ${totals['top_up_volume']:.2f}")
+
+    print("\nTop selling games\n" + "Units".ljust(10) + "Revenue".ljust(14) + "Game")
+    for game in report['top_games']:
+        print(f"{game['units']}".ljust(10) + f"${game['revenue']:.2f}".ljust(14) + f"[{game['game_id']}] {game['name'][:60]}")
+
+    print("\nDaily sales\n" + "Day".ljust(14) + "Orders".ljust(10) + "Revenue".ljust(14) + "Top-ups".ljust(10) + "Top-up volume")
+    for day in report['daily']:
+        print(f"{day['day']}".ljust(14) + f"{day['orders']}".ljust(10) + f"${day['revenue']:.2f}".ljust(14)
+              + f"{day['top_ups']}".ljust(10) + f"${day['top_up_volume']:.2f}")
+
+    print("\nTop spenders\n" + "Spend".ljust(14) + "Orders".ljust(10) + "Top-ups".ljust(14) + "User")
+    for user in report['top_spenders']:
+        print(f"${user['spend']:.2f}".ljust(14) + f"{user['orders']}".ljust(10) + f"${user['top_up_volume']:.2f}".ljust(14)
+              + f"[{user['user_id']}] {user['username']}")
+    input("\n[Enter] to go back\n>> ")
+
+def admin_view_query_stats():
+    """View the busiest queries since the stats were last reset, and dump them all as JSON."""
+    while True:
+        try:
+            stats = service.get_query_stats()
+            print(f"\nQueries since {stats['since']}, busiest first (slow >= {stats['slow_ms']} ms)")
+            prepared = stats['prepared_statements']
+            print(f"Prepared statements reused {prepared['hits']} times, prepared {prepared['misses']} times\n")
+            print("Calls".ljust(10) + "Rows".ljust(12) + "Total ms".ljust(12) + "Mean ms".ljust(10)
+                  + "Max ms".ljust(10) + "Slow".ljust(6) + "Query")
+            for query in stats['queries'][:15]:
+                print(f"{query['calls']}".ljust(10) + f"{query['rows']}".ljust(12) + f"{query['total_ms']:.1f}".ljust(12)
+                      + f"{query['mean_ms']:.2f}".ljust(10) + f"{query['max_ms']:.1f}".ljust(10)
+                      + f"{len(query['slow_samples'])}".ljust(6) + f"{query['fingerprint'][:80]}")
+
+            option = input("\nWhat would you like to do?\n" +
+                        "[D]ump all stats to logs/query_stats.json\n" +
+                        "[R]eset stats\n" +
+                        "[B]ack\n" +
+                        ">> ").upper()
+            if option == 'D':
+                service.dump_query_stats("logs/query_stats.json")
+                print("Dumped query stats to logs/query_stats.json")
+            elif option == 'R':
+                service.reset_query_stats()
+            elif option == 'B':
+                break
+            else:
+                raise InvalidInputError(['d', 'r', 'b'])
+        except InvalidInputError as e:
+            print(e)
+
 def admin_add_game():
     name, rating, description, developer, publisher = "","","","",""
     price = 0.00
@@ -0,0 +1,251 @@
+"""Versioned schema migrations for the p1 database.
+
+Each migration upgrades the schema in place and is recorded in the SchemaVersion table, so running
+this module only applies the migrations a database is missing. init_database applies them all after a reset.
+Run with --check to EXPLAIN the Dao's queries and fail if any of them scans a whole table.
+"""
+
+from connection import connect_to_mysql
+import argparse
+import sys
+import logging
+
+logger = logging.getLogger(__name__)
+
+# Refill the sales summary tables from Orders and OrderDetails. An order with details is a game purchase,
+# and one without is a wallet top-up. Game revenue is estimated at each game's current price and discount.
+SALES_SUMMARY_BACKFILL = [
+    """INSERT INTO GameSales (game_fk, units, revenue)
+       SELECT od.game_fk, SUM(od.quantity), SUM(od.quantity * (g.price - g.price * g.discount_percent))
+       FROM OrderDetails od INNER JOIN Games g ON g.game_id = od.game_fk
+       GROUP BY od.game_fk;""",
+    """INSERT INTO DailySales (day, orders, revenue, top_ups, top_up_volume)
+       SELECT DATE(o.order_date), SUM(d.order_fk IS NOT NULL), SUM(IF(d.order_fk IS NOT NULL, o.total_cost, 0)),
+              SUM(d.order_fk IS NULL), SUM(IF(d.order_fk IS NULL, o.total_cost, 0))
+       FROM Orders o LEFT JOIN (SELECT DISTINCT order_fk FROM OrderDetails) d ON d.order_fk = o.order_id
+       GROUP BY DATE(o.order_date);""",
+    """INSERT INTO UserSpend (user_fk, orders, spend, top_ups, top_up_volume)
+       SELECT o.user_fk, SUM(d.order_fk IS NOT NULL), SUM(IF(d.order_fk IS NOT NULL, o.total_cost, 0)),
+              SUM(d.order_fk IS NULL), SUM(IF(d.order_fk IS NULL, o.total_cost, 0))
+       FROM Orders o LEFT JOIN (SELECT DISTINCT order_fk FROM OrderDetails) d ON d.order_fk = o.order_id
+       WHERE o.user_fk IS NOT NULL
+       GROUP BY o.user_fk;"""
+]
+
+# Refill the all-time sales totals from DailySales, which SALES_SUMMARY_BACKFILL fills first.
+SALES_TOTALS_BACKFILL = [
+    """INSERT INTO SalesTotals (totals_id, orders, revenue, top_ups, top_up_volume)
+       SELECT 1, COALESCE(SUM(orders), 0), COALESCE(SUM(revenue), 0), COALESCE(SUM(top_ups), 0), COALESCE(SUM(top_up_volume), 0)
+       FROM DailySales;"""
+]
+
+# (version, description, statements). Append new migrations; never edit one that has shipped.
+MIGRATIONS = [
+    (1, "Index each user's orders by date for order history", [
+        "CREATE INDEX idx_orders_user_date ON Orders (user_fk, order_date, order_id);"
+    ]),
+    (2, "Index all orders by date for the admin order history", [
+        "CREATE INDEX idx_orders_date ON Orders (order_date, order_id);"
+    ]),
+    (3, "Index games by release date and Metacritic score for browsing", [
+        "CREATE INDEX idx_games_release_date ON Games (release_date, game_id);",
+        "CREATE INDEX idx_games_metacritic ON Games (metacritic, game_id);"
+    ]),
+    (4, "Add sales summary tables kept up to date by each order", [
+        """CREATE TABLE GameSales(
+            game_fk INT PRIMARY KEY,
+            units INT NOT NULL DEFAULT 0,
+            revenue DECIMAL(12,2) NOT NULL DEFAULT 0.00,
+            INDEX idx_game_sales_units (units, game_fk),
+            FOREIGN KEY (game_fk) REFERENCES Games(game_id)
+        );""",
+        """CREATE TABLE DailySales(
+            day DATE PRIMARY KEY,
+            orders INT NOT NULL DEFAULT 0,
+            revenue DECIMAL(12,2) NOT NULL DEFAULT 0.00,
+            top_ups INT NOT NULL DEFAULT 0,
+            top_up_volume DECIMAL(12,2) NOT NULL DEFAULT 0.00
+        );""",
+        """CREATE TABLE UserSpend(
+            user_fk INT PRIMARY KEY,
+            orders INT NOT NULL DEFAULT 0,
+            spend DECIMAL(12,2) NOT NULL DEFAULT 0.00,
+            top_ups INT NOT NULL DEFAULT 0,
+            top_up_volume DECIMAL(12,2) NOT NULL DEFAULT 0.00,
+            INDEX idx_user_spend_spend (spend, user_fk),
+            FOREIGN KEY (user_fk) REFERENCES Users(user_id) ON DELETE CASCADE
+        );"""
+    ] + SALES_SUMMARY_BACKFILL),
+    (5, "Add an all-time sales totals row kept up to date by each order", [
+        """CREATE TABLE SalesTotals(
+            totals_id TINYINT PRIMARY KEY CHECK (totals_id = 1),
+            orders INT NOT NULL DEFAULT 0,
+            revenue DECIMAL(14,2) NOT NULL DEFAULT 0.00,
+            top_ups INT NOT NULL DEFAULT 0,
+            top_up_volume DECIMAL(14,2) NOT NULL DEFAULT 0.00
+        );"""
+    ] + SALES_TOTALS_BACKFILL),
+]
+
+# Representative forms of the Dao's queries, as (name, query, params, may_scan).
+# may_scan marks queries that read a whole table by design, such as listing every user.
+EXPLAIN_QUERIES = [
+    ("all_users", "SELECT user_id, username, date_of_birth, wallet FROM Users ORDER BY user_id DESC;", [], True),
+    ("user_by_id", "SELECT user_id, username, date_of_birth, wallet FROM Users WHERE user_id=%s", [1], False),
+    ("user_by_username", "SELECT user_id, username, date_of_birth, wallet FROM Users WHERE username=%s", ["user1"], False),
+    ("user_by_username_password", "SELECT * FROM Users WHERE username=%s AND password=%s;", ["user1", "password"], False),
+    ("user_game", "SELECT * FROM User_Game WHERE user_fk=%s AND game_fk=%s;", [1, 1], False),
+    ("update_username", "UPDATE Users SET username=%s WHERE username=%s;", ["user1", "user1"], False),
+    ("delete_user", "DELETE FROM Users WHERE user_id=%s;", [0], False),
+    ("checkout_wallet_debit", "UPDATE Users SET wallet = wallet - %s WHERE user_id=%s AND wallet >= %s;", [0, 1, 0], False),
+    ("recent_orders_by_user",
+     """SELECT o.*
+        FROM Users u LEFT JOIN Orders o ON o.user_fk = u.user_id
+        WHERE u.user_id=%s
+        ORDER BY o.order_date DESC, o.order_id DESC;""", [1], False),
+    ("recent_orders", "SELECT * FROM Orders ORDER BY order_date DESC, order_id DESC;", [], True),
+    ("orders_page_by_user",
+     "SELECT * FROM Orders WHERE user_fk=%s AND (order_date, order_id) < (NOW(), %s) ORDER BY order_date DESC, order_id DESC LIMIT 5;",
+     [1, 2 ** 31 - 1], False),
+    ("orders_page", "SELECT * FROM Orders ORDER BY order_date DESC, order_id DESC LIMIT 5;", [], False),
+    ("order_details",
+     """SELECT g.name, od.quantity, od.order_fk
+        FROM OrderDetails od INNER JOIN Games g ON g.game_id = od.game_fk
+        WHERE od.order_fk IN (%s, %s, %s);""", [1, 2, 3], False),
+    ("all_games", "SELECT * FROM Games;", [], True),
+    ("all_game_genres", "SELECT game_fk AS game_id, genre FROM Game_Genre;", [], True),
+    ("all_game_categories", "SELECT game_fk AS game_id, category FROM Game_Category;", [], True),
+    ("games_ordered_by_date", "SELECT * FROM Games ORDER BY release_date DESC, game_id DESC;", [], True),
+    ("games_ordered_by_metacritic", "SELECT * FROM Games WHERE metacritic IS NOT null ORDER BY metacritic DESC, game_id DESC;", [], True),
+    ("game_by_id", "SELECT * FROM Games WHERE game_id=%s;", [1], False),
+    ("imported_game_ids",
+     "SELECT game_id, name, developer FROM Games WHERE game_id >= %s AND (name, developer) IN ((%s, %s)) ORDER BY game_id;",
+     [2 ** 31 - 1, "name", "developer"], False),
+    ("game_genres",
+     """SELECT gen.genre
+        FROM Games gam INNER JOIN Game_Genre gen ON gam.game_id = gen.game_fk
+        WHERE gen.game_fk = %s;""", [1], False),
+    ("game_categories",
+     """SELECT cat.category
+        FROM Games gam INNER JOIN Game_Category cat ON gam.game_id = cat.game_fk
+        WHERE cat.game_fk = %s;""", [1], False),
+    ("game_if_of_age",
+     """SELECT g.*
+        FROM Games g INNER JOIN Ratings r ON g.rating = r.rating
+        WHERE g.game_id = %s AND r.required_age <= %s;""", [1, 18], False),
+    ("checkout_age_check",
+     """SELECT g.game_id
+        FROM Games g INNER JOIN Ratings r ON g.rating = r.rating
+        WHERE g.game_id IN (%s, %s, %s) AND r.required_age <= %s;""", [1, 2, 3, 18], False),
+    ("games_in_user_inventory",
+     """SELECT g.*, quantity_in_inventory
+        FROM Games g INNER JOIN User_Game ug ON g.game_id = ug.game_fk
+        WHERE user_fk = %s
+        ORDER BY g.name DESC;""", [1], False),
+    ("user_game_quantities",
+     "SELECT game_fk, quantity_in_inventory FROM User_Game WHERE user_fk = %s AND quantity_in_inventory > 0;", [1], False),
+    ("co_purchase_orders", "SELECT order_fk, game_fk FROM OrderDetails ORDER BY order_fk;", [], True),
+    ("co_purchase_inventories",
+     "SELECT user_fk, game_fk FROM User_Game WHERE quantity_in_inventory > 0 ORDER BY user_fk;", [], True),
+    ("top_selling_games",
+     """SELECT g.game_id, g.name, s.units, s.revenue
+        FROM GameSales s INNER JOIN Games g ON g.game_id = s.game_fk
+        ORDER BY s.units DESC, s.game_fk DESC LIMIT 10;""", [], False),
+    ("daily_sales", "SELECT * FROM DailySales ORDER BY day DESC LIMIT 14;", [], False),
+    ("sales_totals", "SELECT orders, revenue, top_ups, top_up_volume FROM SalesTotals WHERE totals_id = 1;", [], False),
+    ("top_spenders",
+     """SELECT u.user_id, u.username, s.orders, s.spend, s.top_ups, s.top_up_volume
+        FROM UserSpend s INNER JOIN Users u ON u.user_id = s.user_fk
+        ORDER BY s.spend DESC, s.user_fk DESC LIMIT 10;""", [], False),
+]
+
+# Tables this small, such as Ratings, are cheaper to scan than to index, so scans of them are allowed.
+SMALL_TABLE_ROWS = 100
+
+def main():
+    parser = argparse.ArgumentParser(description="Upgrade the p1 database schema in place.")
+    parser.add_argument('--check', action='store_true', help="EXPLAIN the Dao's queries and fail on full table scans")
+    args = parser.parse_args()
+
+    cnx = connect_to_mysql()
+    if cnx is None:
+        sys.exit("Could not connect to the p1 database.")
+    migrate(cnx)
+    if args.check:
+        failures = check_query_plans(cnx)
+        for name, table, rows in failures:
+            print(f"FAIL {name}: full scan of {table} (~{rows} rows)")
+        print(f"{len(EXPLAIN_QUERIES) - len(failures)}/{len(EXPLAIN_QUERIES)} query plans OK")
+        if failures:
+            cnx.close()
+            sys.exit(1)
+    cnx.close()
+
+def current_version(cnx):
+    """Returns the version of the newest migration applied to the database, or 0 if there is none."""
+    with cnx.cursor() as cursor:
+        cursor.execute(
+            """
+            CREATE TABLE IF NOT EXISTS SchemaVersion(
+                version INT PRIMARY KEY,
+                description VARCHAR(256) NOT NULL,
+                applied_at DATETIME NOT NULL
+            );
+            """
+        )
+        cursor.execute("SELECT COALESCE(MAX(version), 0) FROM SchemaVersion;")
+        return cursor.fetchone()[0]
+
+def migrate(cnx, target=None):
+    """Applies every migration newer than the database's version, up to target if given.
+    MySQL commits DDL implicitly, so each migration is recorded as soon as its statements succeed.
+    Returns the version the database is at afterwards.
+    """
+    version = current_version(cnx)
+    with cnx.cursor() as cursor:
+        for migration_version, description, statements in MIGRATIONS:
+            if migration_version <= version or (target is not None and migration_version > target):
+                continue
+            for statement in statements:
+                cursor.execute(statement)
+            cursor.execute("INSERT INTO SchemaVersion (version, description, applied_at) VALUES (%s, %s, NOW());",
+                           (migration_version, description))
+            cnx.commit()
+            version = migration_version
+            logger.info("Applied migration [%s] :: %s", migration_version, description)
+    return version
+
+def rebuild_sales_summaries(cnx):
+    """Empties the sales summary tables and refills them from Orders and OrderDetails.
+    Needed after orders are loaded around the Dao, as generate_data.py does.
+    """
+    with cnx.cursor() as cursor:
+        for table in ("GameSales", "DailySales", "UserSpend", "SalesTotals"):
+            cursor.execute(f"DELETE FROM {table};")
+        for statement in SALES_SUMMARY_BACKFILL + SALES_TOTALS_BACKFILL:
+            cursor.execute(statement)
+    cnx.commit()
+    logger.info("Rebuilt sales summaries")
+
+def check_query_plans(cnx):
+    """EXPLAINs each of the Dao's queries and returns a (name, table, rows) for every full table scan
+    of a table larger than SMALL_TABLE_ROWS, skipping queries that read a whole table by design.
+    Only meaningful on a large seeded database, since the optimizer will scan small tables regardless.
+    """
+    failures = []
+    with cnx.cursor(dictionary=True) as cursor:
+        for name, query, params, may_scan in EXPLAIN_QUERIES:
+            if may_scan:
+                continue
+            cursor.execute("EXPLAIN " + query, params)
+            for step in cursor.fetchall():
+                if step['type'] == 'ALL' and (step['rows'] or 0) > SMALL_TABLE_ROWS:
+                    failures.append((name, step['table'], step['rows']))
+    return failures
+
+
+if __name__ == "__main__":
+    logging.basicConfig(filename="logs/p1.log",
+                level=logging.INFO,
+                format='%(asctime)s :: %(levelname)s :: %(message)s')
+    main()
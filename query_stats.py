@@ -0,0 +1,180 @@
+"""Records how often each query runs, how many rows it returns and how long it takes."""
+
+from collections import deque
+import datetime as dt
+import json
+import re
+import threading
+import time
+import logging
+
+logger = logging.getLogger(__name__)
+
+# Upper bounds, in milliseconds, of the latency histogram buckets. The last bucket catches everything slower.
+BUCKETS_MS = [1, 2, 5, 10, 20, 50, 100, 200, 500, 1000, 2000, float('inf')]
+
+def fingerprint(sql:str):
+    """Normalizes a query so every execution of the same statement shares one fingerprint.
+    Literals become ?, runs of placeholders such as IN lists collapse, and whitespace is squeezed.
+    """
+    sql = re.sub(r"'(?:[^'\\]|\\.)*'", "?", sql)
+    sql = re.sub(r"\b\d+\b", "?", sql)
+    sql = sql.replace("%s", "?")
+    sql = re.sub(r"\(\s*\?(?:\s*,\s*\?)+\s*\)", "(?+)", sql)
+    sql = re.sub(r"\(\?\+\)(?:\s*,\s*\(\?\+\))+", "(?+), ...", sql)
+    return re.sub(r"\s+", " ", sql).strip().rstrip(';')
+
+class QueryStat():
+    """Running totals for one query fingerprint."""
+    def __init__(self, max_samples):
+        self.calls = 0
+        self.rows = 0
+        self.total_ms = 0.0
+        self.max_ms = 0.0
+        self.histogram = [0] * len(BUCKETS_MS)
+        self.slow_samples = deque(maxlen=max_samples)
+
+    def to_dict(self):
+        return {
+            'calls': self.calls,
+            'rows': self.rows,
+            'total_ms': round(self.total_ms, 3),
+            'mean_ms': round(self.total_ms / self.calls, 3) if self.calls else 0.0,
+            'max_ms': round(self.max_ms, 3),
+            'histogram_ms': {('inf' if bound == float('inf') else str(bound)): count
+                             for bound, count in zip(BUCKETS_MS, self.histogram)},
+            'slow_samples': list(self.slow_samples)
+        }
+
+class QueryStats():
+    """Query statistics keyed by fingerprint. Executions slower than slow_ms are logged and sampled."""
+    def __init__(self, slow_ms=100, max_samples=20):
+        self.slow_ms = slow_ms
+        self.max_samples = max_samples
+        self.started_at = dt.datetime.now()
+        self.prepared_hits = 0
+        self.prepared_misses = 0
+        self._stats = {}
+        self._lock = threading.Lock()
+
+    def record(self, sql, params, elapsed_ms):
+        key = fingerprint(sql)
+        with self._lock:
+            stat = self._stats.get(key)
+            if stat is None:
+                stat = self._stats[key] = QueryStat(self.max_samples)
+            stat.calls += 1
+            stat.total_ms += elapsed_ms
+            stat.max_ms = max(stat.max_ms, elapsed_ms)
+            for i, bound in enumerate(BUCKETS_MS):
+                if elapsed_ms <= bound:
+                    stat.histogram[i] += 1
+                    break
+            if elapsed_ms >= self.slow_ms:
+                stat.slow_samples.append({
+                    'at': dt.datetime.now().isoformat(timespec='seconds'),
+                    'ms': round(elapsed_ms, 3),
+                    'params': repr(params)[:200]
+                })
+        if elapsed_ms >= self.slow_ms:
+            logger.warning("Slow query (%.1f ms) :: %s", elapsed_ms, key)
+        return key
+
+    def record_prepared(self, hit):
+        """Counts a hot query that reused a prepared statement (a hit) or had to prepare one (a miss)."""
+        with self._lock:
+            if hit:
+                self.prepared_hits += 1
+            else:
+                self.prepared_misses += 1
+
+    def add_rows(self, key, rows):
+        with self._lock:
+            stat = self._stats.get(key)
+            if stat and rows > 0:
+                stat.rows += rows
+
+    def reset(self):
+        with self._lock:
+            self._stats = {}
+            self.prepared_hits = 0
+            self.prepared_misses = 0
+            self.started_at = dt.datetime.now()
+
+    def to_dict(self):
+        """Returns every fingerprint's statistics, busiest first by total time."""
+        with self._lock:
+            queries = sorted(self._stats.items(), key=lambda item: item[1].total_ms, reverse=True)
+            return {
+                'since': self.started_at.isoformat(timespec='seconds'),
+                'slow_ms': self.slow_ms,
+                'prepared_statements': {'hits': self.prepared_hits, 'misses': self.prepared_misses},
+                'queries': [dict(fingerprint=key, **stat.to_dict()) for key, stat in queries]
+            }
+
+    def dump(self, path):
+        """Writes the statistics to path as JSON."""
+        with open(path, 'w') as outfile:
+            json.dump(self.to_dict(), outfile, indent=2)
+        logger.info("Dumped query stats to [%s]", path)
+
+class InstrumentedCursor():
+    """Wraps a MySQL cursor, timing every execute and counting the rows fetched or affected."""
+    def __init__(self, cursor, stats:QueryStats):
+        self._cursor = cursor
+        self._stats = stats
+        self._key = None
+
+    def execute(self, operation, params=None):
+        start = time.perf_counter()
+        try:
+            return self._cursor.execute(operation, params)
+        finally:
+            self._key = self._stats.record(operation, params, (time.perf_counter() - start) * 1000)
+            if not self._cursor.with_rows:
+                self._stats.add_rows(self._key, self._cursor.rowcount)
+
+    def executemany(self, operation, seq_params):
+        start = time.perf_counter()
+        try:
+            return self._cursor.executemany(operation, seq_params)
+        finally:
+            self._key = self._stats.record(operation, None, (time.perf_counter() - start) * 1000)
+            self._stats.add_rows(self._key, self._cursor.rowcount)
+
+    def fetchone(self):
+        row = self._cursor.fetchone()
+        if row is not None:
+            self._stats.add_rows(self._key, 1)
+        return row
+
+    def fetchmany(self, size=1):
+        rows = self._cursor.fetchmany(size)
+        self._stats.add_rows(self._key, len(rows))
+        return rows
+
+    def fetchall(self):
+        rows = self._cursor.fetchall()
+        self._stats.add_rows(self._key, len(rows))
+        return rows
+
+    def __getattr__(self, name):
+        return getattr(self._cursor, name)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self._cursor.close()
+
+class InstrumentedConnection():
+    """Wraps a MySQL connection so every cursor it opens is an InstrumentedCursor."""
+    def __init__(self, cnx, stats:QueryStats):
+        self._cnx = cnx
+        self._stats = stats
+
+    def cursor(self, *args, **kwargs):
+        return InstrumentedCursor(self._cnx.cursor(*args, **kwargs), self._stats)
+
+    def __getattr__(self, name):
+        return getattr(self._cnx, name)
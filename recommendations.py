@@ -0,0 +1,155 @@
+"""Item-to-item "Customers also bought" recommendations from co-purchase counts.
+
+Every order is a basket of games, and so is every user's inventory. For each pair of games that share
+a basket, CoPurchaseIndex keeps a count in a sparse dict of Counters. The Service updates the counts with
+each purchase and serves each game's top-K neighbors from precomputed lists in memory. Counts drift slightly
+as inventories shrink through gifts, so the index can be rebuilt from the database at any time. Run this module to
+rebuild it and report how long that takes and how fast lookups are.
+
+    python recommendations.py
+"""
+
+from collections import Counter
+import heapq
+import math
+import random
+import threading
+import time
+import logging
+
+logger = logging.getLogger(__name__)
+
+# Baskets with more distinct games than this are skipped. Pair counting is quadratic in basket size,
+# and huge inventories say little about which games go together, so this bounds the rebuild time.
+MAX_BASKET = 50
+
+# Added to the denominator of every similarity, so pairs seen only once or twice rank below well-supported ones.
+SHRINKAGE = 5
+
+# How many similar games each game's cached top list holds.
+TOP_K = 10
+
+# How many of a game's most co-purchased games are scored when its top list is computed.
+CANDIDATES = 200
+
+# How many seconds a game's cached top list may lag behind the counts before it is recomputed.
+MAX_STALENESS = 60
+
+def main():
+    # Imported here, so the index itself can be used without a database configuration.
+    from dao import Dao
+    dao = Dao()
+    index = CoPurchaseIndex()
+    start = time.perf_counter()
+    if not dao.co_purchase_baskets(index.add_basket):
+        print("Rebuild failed, see logs/p1.log")
+        return
+    index.refresh()
+    build_seconds = time.perf_counter() - start
+    stats = index.stats()
+    print(f"Built from {stats['baskets']} baskets in {build_seconds:.2f}s: "
+          f"{stats['games']} games, {stats['pairs']} pairs, {stats['skipped']} oversized baskets skipped")
+
+    game_ids = list(index.pairs)
+    if game_ids:
+        rng = random.Random(0)
+        latencies = []
+        for game_id in (rng.choice(game_ids) for _ in range(10000)):
+            start = time.perf_counter()
+            index.top(game_id, 5)
+            latencies.append(time.perf_counter() - start)
+        latencies.sort()
+        p50, p99 = latencies[len(latencies) // 2], latencies[len(latencies) * 99 // 100]
+        print(f"top(5) latency: p50 {p50 * 1e6:.1f} us, p99 {p99 * 1e6:.1f} us")
+
+class CoPurchaseIndex():
+    """Sparse co-purchase counts between games, and each game's most similar games.
+    Similarity is the co-purchase count over the geometric mean of how many baskets hold each game,
+    so best sellers do not crowd out everything else. Safe to update and read from several threads.
+    """
+    def __init__(self, max_basket=MAX_BASKET, max_staleness=MAX_STALENESS):
+        self.max_basket = max_basket
+        self.max_staleness = max_staleness
+        self.pairs = {}
+        self.baskets = {}
+        self.basket_count = 0
+        self.skipped = 0
+        self._top = {}
+        self._stale = set()
+        self._lock = threading.Lock()
+
+    def add_basket(self, game_ids):
+        """Records a whole basket of games, such as an order."""
+        self.add_to_basket((), game_ids)
+
+    def add_to_basket(self, existing, added):
+        """Records games added to a basket that already held the existing games, such as a purchase
+        into an inventory. Pairs each added game with every other game in the basket.
+        """
+        existing = set(existing)
+        added = set(added) - existing
+        if not added:
+            return
+        basket = list(added | existing)
+        with self._lock:
+            if not existing:
+                self.basket_count += 1
+            if len(basket) > self.max_basket:
+                self.skipped += 1
+                return
+            for game in added:
+                self.baskets[game] = self.baskets.get(game, 0) + 1
+                counts = self.pairs.get(game)
+                if counts is None:
+                    counts = self.pairs[game] = Counter()
+                counts.update(basket)
+                del counts[game]
+            for other in existing:
+                counts = self.pairs.get(other)
+                if counts is None:
+                    counts = self.pairs[other] = Counter()
+                counts.update(added)
+            self._stale.update(basket)
+
+    def top(self, game_id, k=TOP_K) -> list[int]:
+        """Returns up to k game_ids most similar to game_id, most similar first.
+        Served from a cached list, recomputed only when it is stale and more than max_staleness seconds old.
+        """
+        cached = self._top.get(game_id)
+        if cached and cached[1] >= k and (game_id not in self._stale or time.monotonic() - cached[0] < self.max_staleness):
+            return cached[2][:k]
+        with self._lock:
+            return self._refresh(game_id, max(k, TOP_K))[:k]
+
+    def refresh(self):
+        """Computes every game's top list, so lookups start warm. Called after a rebuild."""
+        with self._lock:
+            for game_id in self.pairs:
+                self._refresh(game_id, TOP_K)
+
+    def _refresh(self, game_id, width) -> list[int]:
+        counts = self.pairs.get(game_id)
+        if not counts:
+            return []
+        # Only the most co-purchased games are scored, since shrinkage keeps rarely paired games from ranking high anyway.
+        # A game paired only as an existing game of some basket may not have been counted in one yet.
+        baskets = self.baskets
+        root = math.sqrt(baskets.get(game_id, 1))
+        best = heapq.nlargest(width, counts.most_common(CANDIDATES),
+                              key=lambda item: item[1] / (root * math.sqrt(baskets.get(item[0], 1)) + SHRINKAGE))
+        self._stale.discard(game_id)
+        top = [other for other, _ in best]
+        self._top[game_id] = (time.monotonic(), width, top)
+        return top
+
+    def stats(self):
+        """Returns the number of baskets recorded and skipped as oversized, and the games and distinct pairs indexed."""
+        return {'baskets': self.basket_count, 'games': len(self.pairs), 'skipped': self.skipped,
+                'pairs': sum(len(counts) for counts in self.pairs.values()) // 2}
+
+
+if __name__ == "__main__":
+    logging.basicConfig(filename="logs/p1.log",
+                level=logging.INFO,
+                format='%(asctime)s :: %(levelname)s :: %(message)s')
+    main()
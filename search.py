@@ -0,0 +1,71 @@
+"""Ranked full-text search over the store catalog, backed by an in-memory inverted index."""
+
+from entities import Game
+from bisect import bisect_left
+import math
+import re
+
+# How much a match in each field counts toward a game's score.
+FIELD_WEIGHTS = {'name': 3.0, 'genres': 2.0, 'developer': 1.5, 'publisher': 1.5, 'description': 1.0}
+
+STOPWORDS = {'a', 'an', 'and', 'are', 'as', 'at', 'be', 'by', 'for', 'from', 'in', 'into', 'is', 'it',
+             'its', 'of', 'on', 'or', 'the', 'to', 'with', 'you', 'your'}
+
+def tokenize(text):
+    """Splits text into lowercase words, dropping stopwords."""
+    return [token for token in re.findall(r"[a-z0-9]+", text.lower()) if token not in STOPWORDS]
+
+class SearchIndex():
+    """Maps each term to the games it appears in, with a weight for how strongly it appears.
+    Searches score games by the sum over query terms of the term's weight in the game times its
+    inverse document frequency, so rare terms and matches in the name count most.
+    The last query term of three or more letters also matches as a prefix, so partial words still find results.
+    """
+    def __init__(self, games:list[Game]):
+        self.postings = {}
+        for game in games:
+            weights = {}
+            for field, weight in FIELD_WEIGHTS.items():
+                value = getattr(game, field)
+                text = " ".join(value) if field == 'genres' else value
+                tokens = tokenize(text or "")
+                if not tokens:
+                    continue
+                # Dampen long fields, so a description that repeats a word does not outrank a name that has it once.
+                per_token = weight / math.sqrt(len(tokens))
+                for token in tokens:
+                    weights[token] = weights.get(token, 0.0) + per_token
+            for token, weight in weights.items():
+                self.postings.setdefault(token, {})[game.game_id] = weight
+
+        self.game_count = max(len(games), 1)
+        self.terms = sorted(self.postings)
+
+    def search(self, query) -> list[int]:
+        """Returns the ids of every game matching any term in query, best match first."""
+        tokens = tokenize(query)
+        if not tokens:
+            return []
+
+        scores = {}
+        for i, token in enumerate(tokens):
+            terms = self._prefix_terms(token) if i == len(tokens) - 1 else [token]
+            for term in terms:
+                postings = self.postings.get(term)
+                if not postings:
+                    continue
+                idf = math.log(1 + self.game_count / len(postings))
+                for game_id, weight in postings.items():
+                    scores[game_id] = scores.get(game_id, 0.0) + weight * idf
+        return sorted(scores, key=lambda game_id: (-scores[game_id], game_id))
+
+    def _prefix_terms(self, prefix):
+        # Very short prefixes would expand to most of the vocabulary, so they only match whole words.
+        if len(prefix) < 3:
+            return [prefix]
+        terms = []
+        i = bisect_left(self.terms, prefix)
+        while i < len(self.terms) and self.terms[i].startswith(prefix):
+            terms.append(self.terms[i])
+            i += 1
+        return terms
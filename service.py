@@ -1,17 +1,27 @@
 """Service Layer for verifying incoming/outgoing requests to the database."""
 
-from entities import (User, Game, Order)
+from entities import (User, Game, Order, InventoryEntry)
 from dao import Dao
+from catalog_cache import CatalogCache
+from facets import FacetResult
+from eligibility import AgeEligibility
+from recommendations import CoPurchaseIndex
+from collections import Counter
 import datetime as dt
 from decimal import (Decimal, InvalidOperation)
-from exceptions import (UnderAgeError, ExistenceError, InvalidCredentialsError)
+from exceptions import (UnderAgeError, ExistenceError, InvalidCredentialsError, InsufficientFundsError)
+import threading
 import logging
 
 logger = logging.getLogger(__name__)
 
 class Service():
-    def __init__(self):
-        self.dao = Dao()
+    def __init__(self, dao:Dao=None, catalog_ttl=300):
+        self.dao = Dao() if dao is None else dao
+        self.catalog = CatalogCache(self.dao.all_games, catalog_ttl)
+        self._ratings = None
+        self._recommendations = None
+        self._recommendations_lock = threading.Lock()
 
     """USERS"""
     def create_user(self, username, password, date_of_birth):
@@ -26,13 +36,10 @@ class Service():
                 raise ValueError("Password must be at least 6 characters long.")
             if Service.years_since_date(date_of_birth) < 13:
                 raise UnderAgeError("Must be 13 years of age or older.")
-            if self.dao.user_by_username(username):    
-                raise ExistenceError("A user with that username already exists.")
+            return self.dao.insert_user(username, password, date_of_birth)
         except (ValueError, UnderAgeError, ExistenceError) as e:
             print(e)
             return False
-        else:
-            return self.dao.insert_user(username, password, date_of_birth)
         
     def login(self, username, password):
         """If given username and password matches a user in the database, return the User. If no match, return None."""
@@ -56,36 +63,33 @@ class Service():
         try:
             if not new_username:
                 raise ValueError("Username must not be empty.")
-            elif not self.dao.user_by_username(current_username):
-                raise ExistenceError("User does not exist.")
-            else:
-                return self.dao.update_username(current_username, new_username)
+            return self.dao.update_username(current_username, new_username)
         except (ValueError, ExistenceError) as e:
             print(e)
             return False
         
     def remove_user(self, user_id):
         try:
-            if not self.dao.user_by_id(user_id):
-                raise ExistenceError("User does not exist.")
-            else:
-                return self.dao.delete_user(user_id)
+            return self.dao.delete_user(user_id)
         except ExistenceError as e:
             print(e)
             return False
         
     def purchase_wallet_funds(self, user:User, amount):
-        """Purchases wallet funds for a given user."""
+        """Purchases wallet funds for a given user, refreshing user.wallet with the balance the database holds."""
         try:
             amount = Decimal(amount)
             if amount <= Decimal(0.00):
                 raise ValueError
             else:
-                if self.dao.insert_order(user.user_id, dt.datetime.now(), amount):
-                    new_amount = user.wallet + amount
-                    return self.update_wallet_funds(user, new_amount)
+                balance = self.dao.top_up_wallet(user.user_id, dt.datetime.now(), amount)
+                if balance is not None:
+                    user.wallet = balance
+                    return True
         except (ValueError, InvalidOperation) as e:
             print("Please enter a positive monetary value.")
+        except ExistenceError as e:
+            print(e)
     
     def update_wallet_funds(self, user:User, amount:Decimal):
         """Update a user's wallet funds."""
@@ -100,59 +104,92 @@ class Service():
     """ORDERS"""
     def get_recent_orders_by_user(self, user_id) -> list[Order]:
         try:
-            if not self.dao.user_by_id(user_id):
-                raise ExistenceError("User does not exist.")
             return self.dao.recent_orders_by_user(user_id)
         except ExistenceError as e:
             print(e)
     
     def get_recent_orders(self) -> list[Order]:
         return self.dao.recent_orders()
+
+    def get_orders_page(self, user_id=None, after=None, page_size=5) -> list[Order]:
+        """Gets one page of orders, newest first. Pass the (order_date, order_id) of the last order
+        on the previous page as after to get the next one. Orders by every user if user_id is None.
+        """
+        return self.dao.orders_page(user_id, after, page_size)
+
+    def iter_order_pages(self, user_id=None, page_size=5):
+        """Yields pages of orders, newest first, fetching each page only when it is asked for."""
+        after = None
+        while True:
+            page = self.get_orders_page(user_id, after, page_size)
+            if not page:
+                return
+            yield page
+            if len(page) < page_size:
+                return
+            after = (page[-1].order_date, page[-1].order_id)
         
     """GAMES"""
     def get_all_games(self):
-        return self.dao.all_games()
+        catalog = self.catalog.get()
+        return list(catalog.games) if catalog else None
     
     def get_game_by_id(self, game_id):
-        return self.dao.game_by_id(game_id)
+        catalog = self.catalog.get()
+        return catalog.game(game_id) if catalog else self.dao.game_by_id(game_id)
 
     def get_games_in_user_inventory(self, user:User) -> list[Game]:
         """Gets games that a user has purchased."""
         return self.dao.games_in_user_inventory(user.user_id)
 
+    def get_user_inventory(self, user:User) -> list[InventoryEntry]:
+        """Gets each title a user has, with how many copies they hold."""
+        return self.dao.user_inventory(user.user_id)
+
     def purchase_games(self, user:User, games: list[Game]):
-        """Makes a purchase.
+        """Makes a purchase, adding the games to the user's inventory.
+        The age check, wallet debit, order and inventory update all happen in one transaction, which also
+        decides whether the user can afford it, and user.wallet is refreshed with the balance the database holds.
         Returns True if the purchase could be completed, False otherwise.
         """
         try:
             if len(games) == 0:
                 raise ValueError("There must be games in the order to make a purchase.")
-            for game in games:
-                if not self.of_age_for_game(user, game):
-                    raise UnderAgeError(f"You are not of age to buy {game.name}.")
             total_cost = Decimal(0.00)
             for game in games:
                 total_cost += game.price - (game.price * game.discount_percent)
-                if user.wallet < total_cost:
-                    raise ValueError("You don't have enough funds!")
-                
-            if self.dao.insert_order(user.user_id, dt.datetime.now(), total_cost, games):
-                new_wallet = user.wallet - total_cost
-                if self.update_wallet_funds(user, new_wallet):
-                    return True
-        except (ValueError, UnderAgeError) as e:
+
+            age = Service.years_since_date(user.date_of_birth)
+            eligibility = self.get_eligibility()
+            if eligibility:
+                game = eligibility.first_ineligible(age, games)
+                if game:
+                    raise UnderAgeError(f"You are not of age to buy {game.name}.")
+            balance = self.dao.checkout(user.user_id, age, dt.datetime.now(), total_cost, games)
+            if balance is not None:
+                user.wallet = balance
+                self._record_co_purchases(user, games, order=True)
+                return True
+            return False
+        except (ValueError, UnderAgeError, InsufficientFundsError) as e:
             print(e)
             return False
         
     def add_game_to_store(self, game:Game):
-        try:
-            if self.get_game_by_id(game.game_id):
-                raise ExistenceError("That game already exists.")
-            else:
-                return self.dao.insert_game(game)
-        except ExistenceError as e:
-            print(e)
+        if self.dao.insert_game(game):
+            self.catalog.invalidate()
+            return True
+        else:
             return False
+
+    def import_games(self, games:list[Game], batch_size=1000, progress=None):
+        """Bulk inserts games, skipping those already in the store by name and developer.
+        Returns the number of games inserted, skipped and not imported after a failed batch, or None if the import failed to start.
+        """
+        result = self.dao.import_games(games, batch_size, progress)
+        if result and result[0]:
+            self.catalog.invalidate()
+        return result
     
     def add_games_to_user(self, user:User, games:list[Game]):
         try:
@@ -162,18 +199,39 @@ class Service():
                 if not self.of_age_for_game(user, game):
                     raise UnderAgeError(f"You are not of age to buy {game.name}.")
             else:
-                self.dao.insert_user_games(user.user_id, games)
+                if self.dao.insert_user_games(user.user_id, games):
+                    self._record_co_purchases(user, games)
                 return True
         except (ValueError, UnderAgeError) as e:
             print(e)
             return False
         
     def of_age_for_game(self, user:User, game:Game):
-        age = Service.years_since_date(user.date_of_birth.__str__())
+        """Returns True if the user is old enough for game. Checked in memory unless the catalog cannot be loaded."""
+        age = Service.years_since_date(user.date_of_birth)
+        eligibility = self.get_eligibility()
+        if eligibility:
+            return eligibility.may_buy(age, game)
         if self.dao.game_if_of_age(game.game_id, age):
             return True
         else:
             return False
+
+    def get_eligibility(self) -> AgeEligibility:
+        """Gets the age brackets over the cached catalog, or None if the catalog or ratings could not be loaded."""
+        catalog = self.catalog.get()
+        ratings = self.get_ratings()
+        if not catalog or ratings is None:
+            return None
+        return catalog.eligibility(ratings)
+
+    def eligible_games(self, user:User, games:list[Game]) -> list[Game]:
+        """Filters games down to those the user is old enough to buy, keeping their order."""
+        age = Service.years_since_date(user.date_of_birth)
+        eligibility = self.get_eligibility()
+        if eligibility:
+            return eligibility.filter(age, games)
+        return [game for game in games if self.dao.game_if_of_age(game.game_id, age)]
     
     def gift_game_to_user(self, game_id, from_id, to_username):
         try:
@@ -183,36 +241,170 @@ class Service():
                 raise ExistenceError("The user you are gifting to does not exist.")
             elif not user_game:
                 raise ExistenceError("You do not have that game.")
-            elif not self.dao.game_if_of_age(user_game['game_fk'], Service.years_since_date(to.date_of_birth.__str__())):
+            game = self.get_game_by_id(user_game['game_fk'])
+            if not game:
+                raise ExistenceError("That game does not exist.")
+            elif not self.of_age_for_game(to, game):
                 raise UnderAgeError("The user you are gifting to is not old enough to play that game.")
             else:
                 curr_quantity = user_game['quantity_in_inventory']
-                game = self.dao.game_by_id(user_game['game_fk'])
                 if self.add_games_to_user(to, [game]):
                     return self.dao.update_user_game(from_id, game_id, curr_quantity - 1)
         except (ExistenceError, UnderAgeError) as e:
             print(e)
             return False        
         
+    def get_recommendations(self, game_id, k=5) -> list[Game]:
+        """Gets up to k games most often bought alongside the given one, most similar first.
+        The co-purchase index is built the first time it is needed, then kept up to date by each purchase.
+        """
+        index = self._recommendations or self.rebuild_recommendations(if_missing=True)
+        catalog = self.catalog.get()
+        if not index or not catalog:
+            return []
+        return [catalog.by_id[other] for other in index.top(int(game_id), k) if other in catalog.by_id]
+
+    def rebuild_recommendations(self, if_missing=False) -> CoPurchaseIndex:
+        """Rebuilds the co-purchase index from every order and inventory, then swaps it in.
+        Purchases made during the rebuild may be missed until the next one. Returns the index, or None if the rebuild failed.
+        """
+        with self._recommendations_lock:
+            if if_missing and self._recommendations:
+                return self._recommendations
+            index = CoPurchaseIndex()
+            if not self.dao.co_purchase_baskets(index.add_basket):
+                return None
+            index.refresh()
+            self._recommendations = index
+            logger.info("Rebuilt co-purchase index :: %s", index.stats())
+            return index
+
+    def _record_co_purchases(self, user:User, games:list[Game], order=False):
+        """Adds games just added to a user's inventory to the co-purchase index, if it has been built,
+        and the games as a basket of their own if they were an order.
+        """
+        index = self._recommendations
+        if not index:
+            return
+        if order:
+            index.add_basket(game.game_id for game in games)
+        owned = self.dao.user_game_quantities(user.user_id)
+        if owned is not None:
+            added = Counter(game.game_id for game in games)
+            index.add_to_basket([game_id for game_id, quantity in owned.items() if quantity > added[game_id]], added)
+
     def get_games_ordered_by_date(self):
-        return self.dao.games_ordered_by_date()
+        catalog = self.catalog.get()
+        return list(catalog.by_date) if catalog else None
     
     def get_games_ordered_by_metacritic(self):
-        return self.dao.games_ordered_by_metacritic()
+        catalog = self.catalog.get()
+        return list(catalog.by_metacritic) if catalog else None
+
+    def get_games_page(self, sort='all', after:Game=None, page_size=5) -> list[Game]:
+        """Gets the page of games that follows the game after in the given sort order ('all', 'date' or 'metacritic').
+        Served from the catalog cache if it is warm, otherwise one page is read from the database.
+        """
+        catalog = self.catalog.peek()
+        if catalog:
+            page = catalog.page(sort, after.game_id if after else None, page_size)
+            if page is not None:
+                return page
+        return self.dao.games_page(sort, Dao.game_sort_key(sort, after) if after else None, page_size)
+
+    def iter_games_pages(self, sort='all', page_size=5):
+        """Yields pages of games in the given sort order, fetching each page only when it is asked for."""
+        after = None
+        while True:
+            page = self.get_games_page(sort, after, page_size)
+            if not page:
+                return
+            yield page
+            if len(page) < page_size:
+                return
+            after = page[-1]
+
+    def search_games(self, query, offset=0, limit=5):
+        """Searches game names, descriptions, developers, publishers and genres.
+        Returns the total number of matches and the page of up to limit games starting at offset, best match first.
+        """
+        catalog = self.catalog.get()
+        if not catalog:
+            return 0, []
+        game_ids = catalog.search_index().search(query)
+        return len(game_ids), [catalog.by_id[game_id] for game_id in game_ids[offset:offset + limit]]
+
+    def iter_search_pages(self, query, page_size=5):
+        """Yields pages of search results, best match first. The search runs once, and each page is a slice of its results."""
+        catalog = self.catalog.get()
+        if not catalog:
+            return
+        game_ids = catalog.search_index().search(query)
+        for offset in range(0, len(game_ids), page_size):
+            yield [catalog.by_id[game_id] for game_id in game_ids[offset:offset + page_size]]
+
+    def get_ratings(self) -> dict[str, int]:
+        """Gets the age required for each maturity rating. Ratings are fixed, so they are only read once."""
+        if self._ratings is None:
+            self._ratings = self.dao.ratings()
+        return self._ratings
+
+    def filter_games(self, genres=(), categories=(), max_rating=None, max_price=None, sort='all', offset=0, limit=5) -> FacetResult:
+        """Filters the catalog to games with every given genre and category, rated max_rating or lower
+        and priced at most max_price, in the given sort order ('all', 'date' or 'metacritic').
+        Returns the page of up to limit games starting at offset, with the total and every facet's count of matches.
+        """
+        catalog = self.catalog.get()
+        ratings = self.get_ratings()
+        if not catalog or ratings is None:
+            return FacetResult(0, [], {})
+        facets = catalog.facet_index(ratings)
+        bitmap = facets.match(genres, categories, max_rating, max_price)
+        positions = catalog.sort_positions(sort, facets.positions(bitmap))
+        return FacetResult(len(positions), [catalog.games[i] for i in positions[offset:offset + limit]], facets.counts(bitmap))
+
+    def iter_filter_pages(self, genres=(), categories=(), max_rating=None, max_price=None, sort='all', page_size=5):
+        """Yields pages of filtered games, fetching each page only when it is asked for."""
+        offset = 0
+        while True:
+            result = self.filter_games(genres, categories, max_rating, max_price, sort, offset, page_size)
+            if not result.games:
+                return
+            yield result.games
+            offset += page_size
+            if offset >= result.total:
+                return
+
+    def get_catalog_cache_stats(self):
+        return self.catalog.stats()
+
+    """ADMIN"""
+    def get_sales_report(self, limit=10, days=14):
+        return self.dao.sales_report(limit, days)
+
+    def get_query_stats(self):
+        return self.dao.stats.to_dict()
+
+    def dump_query_stats(self, path):
+        self.dao.stats.dump(path)
+
+    def reset_query_stats(self):
+        self.dao.stats.reset()
     
     """HELPER"""
     # TODO: Move years_since_date to more appropriate, reusable location.
-    def years_since_date(date:str):
-        """Returns the number of years since the given date."""
+    def years_since_date(date):
+        """Returns the number of years since the given date, a date or a (YYYY-MM-DD) string."""
         try:
-            then = dt.datetime.strptime(date, '%Y-%m-%d')
-            now = dt.datetime.now()
-            years = now.year - then.year
-            if now.month < then.month:
-                years -= 1
-            elif now.month == then.month and now.day < then.day:
-                years -= 1
-            return years
+            if isinstance(date, str):
+                try:
+                    then = dt.date.fromisoformat(date)
+                except ValueError:
+                    then = dt.datetime.strptime(date, '%Y-%m-%d')
+            else:
+                then = date
+            now = dt.date.today()
+            return now.year - then.year - ((now.month, now.day) < (then.month, then.day))
         except ValueError:
             raise ValueError("Wrong date format. Use (YYYY-MM-DD)")
 
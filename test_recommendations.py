@@ -0,0 +1,45 @@
+"""Unit tests for the in-memory co-purchase index. Run with: python -m pytest test_recommendations.py"""
+
+from recommendations import CoPurchaseIndex
+
+def test_orders_pair_every_game_both_ways():
+    index = CoPurchaseIndex()
+    index.add_basket([1, 2, 3])
+    index.add_basket([1, 2])
+    assert index.pairs[1] == {2: 2, 3: 1}
+    assert index.pairs[3] == {1: 1, 2: 1}
+    assert index.baskets == {1: 2, 2: 2, 3: 1}
+    assert index.top(1, 2) == [2, 3]
+
+def test_games_added_to_a_basket_pair_with_the_existing_games():
+    index = CoPurchaseIndex()
+    index.add_basket([1, 2])
+    index.add_to_basket([1, 2], [3, 2])
+    assert index.pairs[3] == {1: 1, 2: 1}
+    assert index.pairs[1] == {2: 1, 3: 1}
+    assert index.baskets[2] == 1
+    assert index.basket_count == 1
+
+def test_top_of_a_game_only_ever_existing_in_a_basket():
+    index = CoPurchaseIndex()
+    index.add_to_basket([99], [1])
+    assert index.top(99) == [1]
+    assert index.top(1) == [99]
+
+def test_oversized_baskets_are_skipped():
+    index = CoPurchaseIndex(max_basket=3)
+    index.add_basket([1, 2, 3, 4])
+    assert index.pairs == {}
+    assert index.stats()['skipped'] == 1
+    assert index.top(1) == []
+
+def test_stale_top_lists_are_served_until_max_staleness():
+    index = CoPurchaseIndex(max_staleness=3600)
+    index.add_basket([1, 2])
+    assert index.top(1) == [2]
+    index.add_basket([1, 3])
+    index.add_basket([1, 3])
+    assert index.top(1) == [2]
+
+    index.max_staleness = 0
+    assert index.top(1) == [3, 2]